@@ -0,0 +1,60 @@
+"""
+Benchmark of username completion with the in-memory prefix index and with LIKE queries.
+
+Usage: python -m benchmarks.bench_autocomplete [number_of_users]
+"""
+import random
+import string
+import sys
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, User
+from src.services.autocomplete import PrefixIndex
+
+
+def measure(run, prefixes: list[str]) -> float:
+    start = time.perf_counter()
+    for prefix in prefixes:
+        run(prefix)
+    return (time.perf_counter() - start) / len(prefixes)
+
+
+def main(size: int = 1_000_000, queries: int = 200) -> None:
+    rnd = random.Random(0)
+    names = ["".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 12))) + str(i) for i in range(size)]
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, size, 100_000):
+            connection.execute(insert(User), [
+                {"id": i + 1, "username": names[i], "email": f"user{i}@example.com", "password": "x",
+                 "followers_count": int(rnd.paretovariate(1.2))}
+                for i in range(offset, min(offset + 100_000, size))
+            ])
+    print(f"created {size} users in {time.perf_counter() - start:.1f}s")
+
+    db = sessionmaker(bind=engine)()
+    index = PrefixIndex()
+    start = time.perf_counter()
+    index.load(db.query(User.id, User.username, User.followers_count))
+    print(f"loaded the prefix index in {time.perf_counter() - start:.1f}s")
+
+    def like(prefix: str):
+        return db.query(User.id, User.username, User.followers_count).filter(
+            User.username.ilike(f"{prefix}%")
+        ).order_by(User.followers_count.desc(), User.username).limit(10).all()
+
+    for length in (1, 2, 3, 5):
+        prefixes = [name[:length] for name in rnd.sample(names, queries)]
+        first = measure(lambda prefix: index.complete(prefix, 10), prefixes)
+        again = measure(lambda prefix: index.complete(prefix, 10), prefixes)
+        sql = measure(like, prefixes[:10])
+        print(f"prefix of {length}: sql {sql * 1000:8.3f} ms, index {first * 1000:8.3f} ms first, {again * 1000:.3f} ms again")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
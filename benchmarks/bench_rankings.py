@@ -0,0 +1,69 @@
+"""
+Benchmark of the top rated leaderboard read from post_rankings and computed from the ratings on request.
+
+Usage: python -m benchmarks.bench_rankings [number_of_posts]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Post, Rating, User
+from src.repository.ratings import get_leaderboard
+from src.services.rankings import refresh_rankings
+
+
+# raw averages of every post sorted on request, what the leaderboard would cost without the ranking table
+SQL_TOP = """
+SELECT image_id, avg(rating) AS average FROM ratings
+GROUP BY image_id ORDER BY average DESC, image_id DESC LIMIT 20
+"""
+
+
+def main(size: int = 1_000_000, ratings_per_post: int = 5, raters: int = 10_000, queries: int = 200) -> None:
+    rnd = random.Random(0)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [
+            {"id": i + 1, "username": f"user{i}", "email": f"user{i}@example.com", "password": "x"}
+            for i in range(raters)
+        ])
+        for offset in range(0, size, 100_000):
+            post_ids = range(offset + 1, min(offset + 100_000, size) + 1)
+            connection.execute(insert(Post), [
+                {"id": post_id, "author_id": 1, "description": "", "image_url": "http://test_url.com"}
+                for post_id in post_ids
+            ])
+            connection.execute(insert(Rating), [
+                {"image_id": post_id, "user_id": rnd.randint(1, raters), "rating": rnd.randint(1, 5)}
+                for post_id in post_ids
+                for _ in range(rnd.randint(0, 2 * ratings_per_post))
+            ])
+    print(f"created {size} posts in {time.perf_counter() - start:.1f}s")
+
+    db = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    ranked = refresh_rankings(db)
+    print(f"ranked {ranked} posts in {time.perf_counter() - start:.1f}s")
+
+    for kind in ("top", "hot"):
+        cursor = None
+        start = time.perf_counter()
+        for _ in range(queries):
+            cursor = asyncio.run(get_leaderboard(kind, 20, cursor, db))["next_cursor"]
+        print(f"{kind}: {(time.perf_counter() - start) / queries * 1000:.3f} ms/page")
+
+    db.execute(text("CREATE INDEX ix_bench_ratings_image ON ratings (image_id, rating)"))
+    start = time.perf_counter()
+    for _ in range(5):
+        db.execute(text(SQL_TOP)).all()
+    print(f"sql: {(time.perf_counter() - start) / 5 * 1000:.3f} ms/page, with an index on ratings")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,70 @@
+"""
+Benchmark of related posts with the in-memory tag matrix and with a self-join of post_hashtags.
+
+Usage: python -m benchmarks.bench_related [number_of_posts]
+"""
+import random
+import sys
+import time
+from itertools import accumulate
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Hashtag, Post, User, post_hashtags
+from src.services.related import load_tag_matrix
+
+
+# the same overlap without idf weights and ratings, helped by indexes the application tables don't have
+SQL_RELATED = """
+SELECT other.post_id, count(*) AS shared
+FROM post_hashtags own JOIN post_hashtags other ON other.hashtag_id = own.hashtag_id
+WHERE own.post_id = :post_id AND other.post_id != :post_id
+GROUP BY other.post_id ORDER BY shared DESC, other.post_id DESC LIMIT 10
+"""
+
+
+def main(size: int = 1_000_000, tags: int = 10_000, tags_per_post: int = 3, queries: int = 200) -> None:
+    rnd = random.Random(0)
+    # tag popularity follows Zipf's law
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(tags)))
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "username": "user", "email": "user@example.com", "password": "x"}])
+        connection.execute(insert(Hashtag), [{"id": i + 1, "name": f"tag{i}"} for i in range(tags)])
+        for offset in range(0, size, 100_000):
+            post_ids = range(offset + 1, min(offset + 100_000, size) + 1)
+            connection.execute(insert(Post), [
+                {"id": post_id, "author_id": 1, "description": "", "image_url": "http://test_url.com"}
+                for post_id in post_ids
+            ])
+            connection.execute(insert(post_hashtags), [
+                {"post_id": post_id, "hashtag_id": tag + 1}
+                for post_id in post_ids
+                for tag in set(rnd.choices(range(tags), cum_weights=cum_weights, k=tags_per_post))
+            ])
+    print(f"created {size} posts in {time.perf_counter() - start:.1f}s")
+
+    db = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    matrix = load_tag_matrix(db)
+    print(f"built the tag matrix in {time.perf_counter() - start:.1f}s")
+
+    targets = [rnd.randint(1, size) for _ in range(queries)]
+    start = time.perf_counter()
+    for post_id in targets:
+        matrix.related(post_id, [], 10, 0.5)
+    print(f"matrix: {(time.perf_counter() - start) / queries * 1000:.3f} ms/query")
+
+    db.execute(text("CREATE INDEX ix_bench_post_hashtags_post ON post_hashtags (post_id)"))
+    db.execute(text("CREATE INDEX ix_bench_post_hashtags_tag ON post_hashtags (hashtag_id, post_id)"))
+    start = time.perf_counter()
+    for post_id in targets[:20]:
+        db.execute(text(SQL_RELATED), {"post_id": post_id}).all()
+    print(f"sql:    {(time.perf_counter() - start) / 20 * 1000:.3f} ms/query, with indexes on post_hashtags")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
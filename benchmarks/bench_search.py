@@ -0,0 +1,61 @@
+"""
+Benchmark of the full-text search over posts, on SQLite FTS5.
+
+Usage: python -m benchmarks.bench_search [number_of_posts]
+"""
+import random
+import sys
+import time
+from itertools import accumulate
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Post, User
+from src.services.search import refresh_search_documents, search_post_ids
+
+
+def main(size: int = 1_000_000, queries: int = 100, vocabulary: int = 20_000) -> None:
+    rnd = random.Random(0)
+    words = [f"word{i}" for i in range(vocabulary)]
+    # word frequencies follow Zipf's law, like real text
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(vocabulary)))
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "username": "user", "email": "user@example.com", "password": "x"}])
+        for offset in range(0, size, 100_000):
+            connection.execute(insert(Post), [
+                {"id": post_id, "author_id": 1, "image_url": "http://test_url.com",
+                 "description": " ".join(rnd.choices(words, cum_weights=cum_weights, k=8))}
+                for post_id in range(offset + 1, min(offset + 100_000, size) + 1)
+            ])
+    print(f"created {size} posts in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        refresh_search_documents(connection)
+    print(f"indexed {size} posts in {time.perf_counter() - start:.1f}s")
+
+    db = sessionmaker(bind=engine)()
+    cases = {
+        "common word": lambda: words[rnd.randrange(10)],
+        "medium word": lambda: words[rnd.randrange(100, 1000)],
+        "rare word": lambda: words[rnd.randrange(10_000, vocabulary)],
+        "two words": lambda: f"{words[rnd.randrange(100)]} {words[rnd.randrange(100, 1000)]}",
+    }
+    for name, make_query in cases.items():
+        targets = [make_query() for _ in range(queries)]
+        start = time.perf_counter()
+        found = 0
+        for target in targets:
+            hits = search_post_ids(db, target, 20)
+            found += len(hits)
+        elapsed = (time.perf_counter() - start) / queries
+        print(f"{name:12}: {elapsed * 1000:.3f} ms/query, {found / queries:.1f} results/page")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,37 @@
+"""
+Benchmark of the perceptual hash similarity index.
+
+Usage: python -m benchmarks.bench_similarity [number_of_images]
+"""
+import random
+import sys
+import time
+
+from src.services.similarity import SimilarityIndex
+
+
+def main(size: int = 1_000_000, queries: int = 1000) -> None:
+    rnd = random.Random(0)
+    index = SimilarityIndex()
+    hashes = [rnd.getrandbits(64) for _ in range(size)]
+
+    start = time.perf_counter()
+    for post_id, value in enumerate(hashes):
+        index.add(post_id, f"{value:016x}")
+    print(f"indexed {size} hashes in {time.perf_counter() - start:.1f}s")
+
+    for max_distance in (0, 4, 8, 12):
+        targets = []
+        for _ in range(queries):
+            value = hashes[rnd.randrange(size)]
+            for bit in rnd.sample(range(64), max_distance // 2):
+                value ^= 1 << bit
+            targets.append(f"{value:016x}")
+        start = time.perf_counter()
+        found = sum(len(index.search(target, max_distance)) for target in targets)
+        elapsed = (time.perf_counter() - start) / queries
+        print(f"max_distance={max_distance:2}: {elapsed * 1000:.3f} ms/query, {found / queries:.1f} matches/query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
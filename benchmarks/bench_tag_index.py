@@ -0,0 +1,89 @@
+"""
+Benchmark of multi-tag queries on the in-memory bitmap index and on the post_hashtags table.
+
+Usage: python -m benchmarks.bench_tag_index [number_of_posts]
+"""
+import random
+import sys
+import time
+from itertools import accumulate, islice
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Hashtag, Post, User, post_hashtags
+from src.services.tag_index import TagIndex
+
+
+# the same queries as compound selects, each tag is "SELECT post_id FROM post_hashtags WHERE hashtag_id = ..."
+CASES = {
+    "a AND b": ("tag0 AND tag1", "{0} INTERSECT {1}"),
+    "a AND b NOT c": ("tag0 AND tag1 NOT tag2", "{0} INTERSECT {1} EXCEPT {2}"),
+    "a OR b": ("tag3 OR tag4", "{3} UNION {4}"),
+    "rare AND common": ("tag900 AND tag0", "{900} INTERSECT {0}"),
+    "NOT a": ("NOT tag0", "SELECT id FROM posts EXCEPT {0}"),
+}
+
+
+def sql_query(db, compound: str) -> tuple[int, list[int]]:
+    compound = compound.format(*(f"SELECT post_id FROM post_hashtags WHERE hashtag_id = {i + 1}" for i in range(1000)))
+    count = db.execute(text(f"SELECT count(*) FROM ({compound})")).scalar()
+    page = db.execute(text(f"SELECT * FROM ({compound}) ORDER BY 1 DESC LIMIT 20")).scalars().all()
+    return count, page
+
+
+def bitmap_query(index: TagIndex, query: str) -> tuple[int, list[int]]:
+    matches = index.query(query)
+    return len(matches), list(islice(matches.descending(), 20))
+
+
+def measure(run, queries: int) -> float:
+    start = time.perf_counter()
+    for _ in range(queries):
+        run()
+    return (time.perf_counter() - start) / queries
+
+
+def main(size: int = 1_000_000, tags: int = 1000, tags_per_post: int = 3, queries: int = 20) -> None:
+    rnd = random.Random(0)
+    # tag popularity follows Zipf's law
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(tags)))
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "username": "user", "email": "user@example.com", "password": "x"}])
+        connection.execute(insert(Hashtag), [{"id": i + 1, "name": f"tag{i}"} for i in range(tags)])
+        for offset in range(0, size, 100_000):
+            post_ids = range(offset + 1, min(offset + 100_000, size) + 1)
+            connection.execute(insert(Post), [
+                {"id": post_id, "author_id": 1, "description": "", "image_url": "http://test_url.com"}
+                for post_id in post_ids
+            ])
+            connection.execute(insert(post_hashtags), [
+                {"post_id": post_id, "hashtag_id": tag + 1}
+                for post_id in post_ids
+                for tag in set(rnd.choices(range(tags), cum_weights=cum_weights, k=tags_per_post))
+            ])
+    print(f"created {size} posts in {time.perf_counter() - start:.1f}s")
+
+    db = sessionmaker(bind=engine)()
+    index = TagIndex()
+    start = time.perf_counter()
+    index.load(db)
+    print(f"loaded the tag index in {time.perf_counter() - start:.1f}s")
+
+    for indexed in (False, True):
+        if indexed:
+            db.execute(text("CREATE INDEX ix_bench_post_hashtags ON post_hashtags (hashtag_id, post_id)"))
+        print("post_hashtags with an index on (hashtag_id, post_id)" if indexed else "post_hashtags without index")
+        for name, (query, compound) in CASES.items():
+            expected = sql_query(db, compound)
+            assert bitmap_query(index, query) == expected, name
+            sql = measure(lambda: sql_query(db, compound), queries)
+            bitmap = measure(lambda: bitmap_query(index, query), queries)
+            print(f"  {name:16}: sql {sql * 1000:8.3f} ms, bitmap {bitmap * 1000:8.3f} ms, {expected[0]} matches")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,75 @@
+"""
+Benchmark of the home timeline read latency with fan-out-on-write and fan-out-on-read.
+
+Usage: python -m benchmarks.bench_timeline [number_of_followed_authors]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from src.database.models import Base, Follow, Post, TimelineEntry, User
+from src.repository.follows import get_home_timeline
+from src.services.timeline import fan_out
+
+
+def populate(db, followed: int, posts_per_author: int, other_authors: int) -> User:
+    rnd = random.Random(0)
+    authors = followed + other_authors
+    db.execute(insert(User), [
+        {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com", "password": "x",
+         "followers_count": 1 if user_id <= followed else 0}
+        for user_id in range(1, authors + 2)
+    ])
+    reader = authors + 1
+    db.execute(insert(Follow), [{"follower_id": reader, "followee_id": author_id} for author_id in range(1, followed + 1)])
+    posts = [rnd.randrange(1, authors + 1) for _ in range(authors * posts_per_author)]
+    db.execute(insert(Post), [
+        {"id": post_id, "author_id": author_id, "description": "", "image_url": "http://test_url.com",
+         "fanned_out": True}
+        for post_id, author_id in enumerate(posts, start=1)
+    ])
+    db.commit()
+    return db.get(User, reader)
+
+
+async def measure(db, reader: User, queries: int) -> float:
+    start = time.perf_counter()
+    for _ in range(queries):
+        page = await get_home_timeline(reader, None, 20, db)
+        await get_home_timeline(reader, page["next_cursor"], 20, db)
+    return (time.perf_counter() - start) / (queries * 2)
+
+
+def main(followed: int = 2000, posts_per_author: int = 20, other_authors: int = 5000, queries: int = 200) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+
+    start = time.perf_counter()
+    reader = populate(db, followed, posts_per_author, other_authors)
+    print(f"created {(followed + other_authors) * posts_per_author} posts in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    payloads = [{"post_id": post_id, "author_id": author_id}
+                for post_id, author_id in db.query(Post.id, Post.author_id).filter(Post.author_id <= followed)]
+    fan_out(payloads, session_factory=session_factory)
+    print(f"fanned out {len(payloads)} posts in {time.perf_counter() - start:.1f}s")
+
+    elapsed = asyncio.run(measure(db, reader, queries))
+    print(f"fan-out-on-write: {elapsed * 1000:.3f} ms/page, following {followed} authors")
+
+    # no post is fanned out anymore, so they are all read from the posts table
+    db.query(TimelineEntry).delete()
+    db.query(Post).update({Post.fanned_out: False})
+    db.commit()
+    elapsed = asyncio.run(measure(db, reader, queries))
+    print(f"fan-out-on-read:  {elapsed * 1000:.3f} ms/page, following {followed} authors")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -3,11 +3,31 @@ from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
-from src.routes import auth, users, admin, images, comments, ratings
+from src.routes import auth, users, admin, images, comments, ratings, media, tags
+from src.database.db import SessionLocal, engine
+from src.services.similarity import similarity_index
+from src.services.feed import feed_cache
+from src.services.tag_index import tag_index
+from src.services.trending import trending_tags
+from src.services.autocomplete import load_completions
+from src.services.related import related_posts
+from src.services.rankings import ranking_refresher
+from src.services.search import ensure_search_index
+from src.repository.uploads import remove_expired_upload_sessions
+from src.services.jobs import job_worker
+from src.services.email import smtp_pool
+from src.services.media_cache import media_cache
+from src.utils.request_limits import BodySizeLimitMiddleware, MULTIPART_OVERHEAD
+from src.conf.config import settings
 
 
 app = FastAPI()
 templates = Jinja2Templates(directory="src/templates")
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=settings.max_upload_bytes + MULTIPART_OVERHEAD,
+    path_limits={"/api/images/upload/bulk": settings.bulk_upload_max_bytes + MULTIPART_OVERHEAD}
+)
 
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
@@ -15,6 +35,98 @@ app.include_router(admin.router, prefix='/api')
 app.include_router(images.router, prefix='/api')
 app.include_router(comments.router, prefix='/api')
 app.include_router(ratings.router, prefix='/api')
+app.include_router(media.router, prefix='/api')
+app.include_router(tags.router, prefix='/api')
+
+
+@app.on_event("startup")
+def load_indexes():
+    """
+    The load_indexes function fills the in-memory indexes from the database when the application starts.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    db = SessionLocal()
+    try:
+        similarity_index.load(db)
+        feed_cache.load(db)
+        tag_index.load(db)
+        trending_tags.load(db)
+        load_completions(db)
+        related_posts.load(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def create_search_index():
+    """
+    The create_search_index function creates and fills the full-text search index if the database doesn't have it yet.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    ensure_search_index(engine)
+
+
+@app.on_event("startup")
+def load_media_cache():
+    """
+    The load_media_cache function indexes the images the media cache kept on disk before the restart,
+    when the media proxy is enabled.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    if settings.media_proxy_enabled:
+        media_cache.load()
+
+
+@app.on_event("startup")
+def remove_expired_uploads():
+    """
+    The remove_expired_uploads function deletes the resumable uploads that expired while the application was down.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    db = SessionLocal()
+    try:
+        remove_expired_upload_sessions(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def start_workers():
+    """
+    The start_workers function starts the background workers when the application starts.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    await job_worker.start()
+    await trending_tags.start()
+    await related_posts.start()
+    await ranking_refresher.start()
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    """
+    The stop_workers function stops the background workers when the application stops.
+    Unfinished jobs stay in the jobs table and are picked up after the restart.
+
+    :return: None
+    :doc-author: Trelent
+    """
+    await job_worker.stop()
+    await trending_tags.stop()
+    await related_posts.stop()
+    await ranking_refresher.stop()
+    await smtp_pool.close()
+    await media_cache.close()
 
 
 @app.get("/", response_class=HTMLResponse)
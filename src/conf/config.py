@@ -14,6 +14,42 @@ class Settings(BaseSettings):
     cloudinary_api_key: str
     cloudinary_api_secret: str
     cloudinary_folder_name: str
+    transformation_preview_ttl: int = 60
+    job_worker_concurrency: int = 2
+    job_poll_interval: float = 1.0
+    mail_use_tls: bool = True
+    mail_pool_size: int = 3
+    mail_batch_size: int = 50
+    upload_staging_dir: str = "uploads"
+    upload_session_ttl: int = 86400
+    upload_chunk_max_bytes: int = 8 * 1024 * 1024
+    direct_upload_ttl: int = 600
+    max_upload_bytes: int = 20 * 1024 * 1024
+    bulk_upload_concurrency: int = 4
+    bulk_upload_max_files: int = 100
+    bulk_upload_max_bytes: int = 200 * 1024 * 1024
+    max_image_pixels: int = 50_000_000
+    storage_backend: str = "cloudinary"
+    local_storage_dir: str = "media"
+    local_storage_url: str = "http://localhost:8000/api/media"
+    media_proxy_enabled: bool = False
+    media_cache_dir: str = "media_cache"
+    media_cache_max_bytes: int = 1024 * 1024 * 1024
+    feed_cache_size: int = 1000
+    search_config: str = "english"
+    timeline_size: int = 800
+    timeline_fan_out_max_followers: int = 10000
+    timeline_fan_out_batch: int = 1000
+    trending_persist_interval: int = 300
+    related_rebuild_interval: int = 600
+    related_rating_weight: float = 0.5
+    ranking_refresh_interval: int = 300
+    ranking_prior_votes: int = 5
+    image_variant_presets: dict[str, dict] = {
+        "thumb": {"width": 320, "height": 320, "crop": "fill"},
+        "medium": {"width": 800, "crop": "limit"},
+        "large": {"width": 1600, "crop": "limit"},
+    }
 
     class Config:
         extra = "ignore"
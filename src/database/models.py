@@ -10,10 +10,13 @@ from sqlalchemy import (
     func,
     Enum as SQLAEnum,
     Boolean,
-    Float)
+    Float,
+    Index,
+    JSON)
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from enum import Enum
+from datetime import datetime
 
 Base = declarative_base()
 
@@ -39,6 +42,7 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     ratings = relationship("Rating", back_populates="user")
     comments = relationship("Comments", back_populates="user")
+    followers_count = Column(Integer, default=0, nullable=False)
 
 
 post_hashtags = Table(
@@ -55,16 +59,32 @@ class Post(Base):
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String)
     image_url = Column(String)  # url to the image
+    variants = Column(JSON, nullable=True)  # preset name -> url of the resized image
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    image_format = Column(String(10), nullable=True)
+    byte_size = Column(Integer, nullable=True)
+    taken_at = Column(DateTime, nullable=True)
+    blurhash = Column(String(64), nullable=True)  # placeholder shown while the image loads
+    phash = Column(String(16), nullable=True)  # perceptual hash used to find near-duplicates
 
     author_id = Column('author_id', Integer, ForeignKey('users.id', ondelete='CASCADE'), default=None)
     author = relationship("User", back_populates="posts")
 
     hashtags = relationship("Hashtag", secondary=post_hashtags, back_populates="posts")
     qr_code_url = Column(String)
-    created_dt = Column(DateTime, default=func.now())
+    created_dt = Column(DateTime, default=func.now(), index=True)
+    # copied to the timelines of the followers, otherwise read from this table when a timeline is loaded
+    fanned_out = Column(Boolean, default=False, nullable=False)
     ratings = relationship("Rating", back_populates="image")
     comments = relationship("Comments", back_populates="image")
 
+    # posts of one author, newest first, read by the home timelines
+    __table_args__ = (
+        Index("ix_posts_author_id_id", "author_id", "id"),
+        Index("ix_posts_author_id_fanned_out_id", "author_id", "fanned_out", "id"),
+    )
+
 
 class Hashtag(Base):
     __tablename__ = "hashtags"
@@ -86,6 +106,9 @@ class Comments(Base):
     user = relationship("User", back_populates="comments")
     image = relationship("Post", back_populates="comments")
 
+    # newest comments of an image, read by the comment batches
+    __table_args__ = (Index("ix_comments_image_id_created_at", "image_id", "created_at"),)
+
 
 class Rating(Base):
     __tablename__ = "ratings"
@@ -96,3 +119,89 @@ class Rating(Base):
 
     user = relationship("User", back_populates="ratings")
     image = relationship("Post", back_populates="ratings")
+
+
+class JobStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(SQLAEnum(JobStatus), default=JobStatus.pending, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    locked_by = Column(String(36), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), nullable=False)
+    description = Column(String)
+    hashtags = Column(JSON, nullable=False, default=list)
+    total_size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)  # of the whole image, checked when the upload is completed
+    received = Column(Integer, default=0, nullable=False)  # bytes already written to the staging file
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete='SET NULL'), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class DirectUpload(Base):
+    __tablename__ = "direct_uploads"
+    # one post per image uploaded straight to cloudinary, completing the upload again finds it here
+    public_id = Column(String, primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete='CASCADE'), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Follow(Base):
+    __tablename__ = "follows"
+    follower_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), primary_key=True)
+    followee_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # followers of a user, read when their posts are fanned out
+    __table_args__ = (Index("ix_follows_followee_id_follower_id", "followee_id", "follower_id"),)
+
+
+class TimelineEntry(Base):
+    __tablename__ = "timeline_entries"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete='CASCADE'), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete='CASCADE'), primary_key=True)
+    author_id = Column(Integer, nullable=False)  # lets an unfollow remove the posts of the author
+
+
+class TagTrendBucket(Base):
+    __tablename__ = "tag_trend_buckets"
+    # number of posts created in the hour starting at bucket_start with the hashtag
+    bucket_start = Column(DateTime, primary_key=True)
+    hashtag_id = Column(Integer, ForeignKey("hashtags.id", ondelete='CASCADE'), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class PostRanking(Base):
+    __tablename__ = "post_rankings"
+    # scores of the rated posts, recomputed periodically from the ratings
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete='CASCADE'), primary_key=True)
+    rating_count = Column(Integer, nullable=False)
+    average_rating = Column(Float, nullable=False)
+    bayesian_score = Column(Float, nullable=False)
+    hot_score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_post_rankings_bayesian_score", "bayesian_score", "post_id"),
+        Index("ix_post_rankings_hot_score", "hot_score", "post_id"),
+    )
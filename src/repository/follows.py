@@ -0,0 +1,111 @@
+from fastapi import HTTPException, status
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Follow, Post, TimelineEntry, User
+from src.services.autocomplete import user_completions
+from src.services.feed import post_summary
+from src.services.timeline import trim_timelines
+
+
+async def follow_user(followee_id: int, user: User, db: Session) -> dict:
+    """
+    The follow_user function makes the user follow another user.
+    The recent fanned out posts of a followed author are copied to the timeline of the user right away,
+    later posts arrive through the fan-out. Following someone twice changes nothing.
+
+    :param followee_id: int: Id of the user to follow
+    :param user: User: The follower
+    :param db: Session: Pass the database session to the function
+    :return: A dictionary with the id and the number of followers of the followed user
+    :doc-author: Trelent
+    """
+    if followee_id == user.id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You can't follow yourself")
+    followee = db.query(User).filter(User.id == followee_id).first()
+    if followee is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    exists = db.query(Follow).filter(Follow.follower_id == user.id, Follow.followee_id == followee_id).first()
+    if exists is None:
+        db.add(Follow(follower_id=user.id, followee_id=followee_id))
+        db.query(User).filter(User.id == followee_id).update(
+            {User.followers_count: User.followers_count + 1}, synchronize_session=False
+        )
+        recent = db.query(Post.id).filter(Post.author_id == followee_id, Post.fanned_out.is_(True)) \
+            .order_by(Post.id.desc()).limit(settings.timeline_size).all()
+        if recent:
+            db.execute(insert(TimelineEntry), [
+                {"user_id": user.id, "post_id": post_id, "author_id": followee_id} for (post_id,) in recent
+            ])
+            trim_timelines(db, [user.id])
+        db.commit()
+        db.refresh(followee)
+        user_completions.set_weight(followee.id, followee.username, followee.followers_count)
+    return {"user_id": followee.id, "followers_count": followee.followers_count}
+
+
+async def unfollow_user(followee_id: int, user: User, db: Session) -> dict:
+    """
+    The unfollow_user function makes the user stop following another user
+    and removes the posts of that user from their timeline.
+
+    :param followee_id: int: Id of the followed user
+    :param user: User: The follower
+    :param db: Session: Pass the database session to the function
+    :return: A dictionary with the id and the number of followers of the unfollowed user
+    :doc-author: Trelent
+    """
+    followee = db.query(User).filter(User.id == followee_id).first()
+    if followee is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    deleted = db.query(Follow).filter(
+        Follow.follower_id == user.id, Follow.followee_id == followee_id
+    ).delete(synchronize_session=False)
+    if deleted:
+        db.query(User).filter(User.id == followee_id).update(
+            {User.followers_count: User.followers_count - 1}, synchronize_session=False
+        )
+        db.query(TimelineEntry).filter(
+            TimelineEntry.user_id == user.id, TimelineEntry.author_id == followee_id
+        ).delete(synchronize_session=False)
+        db.commit()
+        db.refresh(followee)
+        user_completions.set_weight(followee.id, followee.username, followee.followers_count)
+    return {"user_id": followee.id, "followers_count": followee.followers_count}
+
+
+async def get_home_timeline(user: User, before: int | None, limit: int, db: Session) -> dict:
+    """
+    The get_home_timeline function returns a page of the posts of the users followed by the user,
+    and of the user themselves, newest first.
+    Most posts come from the materialized timeline of the user. The posts of the user and the posts
+    of followed authors that were not fanned out are read from the posts table and merged in.
+
+    :param user: User: Owner of the timeline
+    :param before: int | None: Only return posts with a lower id, None for the first page
+    :param limit: int: Maximum number of posts
+    :param db: Session: Access the database
+    :return: A dictionary with the items of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    entries = db.query(TimelineEntry.post_id).filter(TimelineEntry.user_id == user.id)
+    if before is not None:
+        entries = entries.filter(TimelineEntry.post_id < before)
+    post_ids = {post_id for (post_id,) in entries.order_by(TimelineEntry.post_id.desc()).limit(limit)}
+
+    followed = db.query(Follow.followee_id).filter(Follow.follower_id == user.id)
+    for pulled in (
+        db.query(Post.id).filter(Post.author_id == user.id),
+        db.query(Post.id).filter(Post.author_id.in_(followed), Post.fanned_out.is_(False)),
+    ):
+        if before is not None:
+            pulled = pulled.filter(Post.id < before)
+        post_ids.update(post_id for (post_id,) in pulled.order_by(Post.id.desc()).limit(limit))
+
+    page_ids = sorted(post_ids, reverse=True)[:limit]
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(page_ids))}
+    return {
+        "items": [post_summary(posts[post_id]) for post_id in page_ids if post_id in posts],
+        "next_cursor": page_ids[-1] if len(page_ids) == limit else None,
+    }
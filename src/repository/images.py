@@ -1,24 +1,37 @@
-from typing import List
+import asyncio
+from itertools import islice
+import logging
+from typing import BinaryIO, Callable, List
 import uuid
-import cloudinary
-import cloudinary.uploader
 from fastapi import HTTPException, UploadFile, status
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
 
-from src.database.models import Post, User
+from src.database.models import Comments, DirectUpload, Post, Rating, User
+from src.schemas import DirectUploadComplete
 from src.utils.qr_code import get_qr_code_by_url
-from src.repository.tags import get_or_create_tag
+from src.utils.image_metadata import extract_image_metadata, validate_image_file
+from src.utils.image_placeholder import compute_blurhash
+from src.utils.image_hash import compute_dhash
+from src.services.similarity import similarity_index
+from src.services.feed import feed_cache, post_summary
+from src.services.tag_index import tag_index
+from src.services.trending import trending_tags
+from src.services.related import related_posts
+from src.services.timeline import schedule_fan_out
+from src.services.search import encode_cursor, search_post_ids
+from src.services.assets import schedule_asset_removal, get_public_id_from_url
+from src.services.direct_uploads import verify_upload, fetch_upload_resource, build_upload_url
+from src.services.storage import storage
+from src.repository.tags import get_or_create_tags
 from src.conf.config import settings
 from src.services.auth import check_is_admin_or_moderator
 
 
-cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
+logger = logging.getLogger(__name__)
+
 
 async def create_images_post(description: str, hashtags: List[str], user: User, db: Session, file: UploadFile)-> Post:
     """
@@ -33,23 +46,200 @@ async def create_images_post(description: str, hashtags: List[str], user: User,
     :param hashtags: List[str]: Get the hashtags from the request body
     :param user: User: Get the user id of the author
     :param db: Session: Pass the database session to the function
-    :param file: UploadFile: Upload the image to cloudinary
+    :param file: UploadFile: Upload the image to the storage
+    :return: An object of the post class
+    :doc-author: Trelent
+    """
+    return await create_post_from_file(description, hashtags, user, db, file.file)
+
+
+async def create_post_from_file(description: str, hashtags: List[str], user: User, db: Session, file: BinaryIO) -> Post:
+    """
+    The create_post_from_file function uploads the image to the storage and creates its post.
+    It is shared by the single request upload and the resumable upload.
+
+    :param description: str: Pass in the description of the post
+    :param hashtags: List[str]: Names of the tags of the post
+    :param user: User: Get the user id of the author
+    :param db: Session: Pass the database session to the function
+    :param file: BinaryIO: The image file, opened in binary mode
     :return: An object of the post class
     :doc-author: Trelent
     """
-    dbtags = []
-    for tag in hashtags:
-        dbtag = await get_or_create_tag(db, tag)
-        dbtags.append(dbtag)
+    fields = await store_image_file(file)
+    return await save_post(description, hashtags, user, db, **fields)
+
+
+async def create_images_posts(uploads: List[tuple[str, List[str], UploadFile]], user: User, db: Session) -> List[dict]:
+    """
+    The create_images_posts function creates one post per uploaded file.
+    At most settings.bulk_upload_concurrency files are processed and uploaded to the storage at the same time,
+    without touching the database. Then the tags of all files are resolved at once and all posts
+    are inserted in a single transaction. A file that fails doesn't stop the others.
+
+    :param uploads: List[tuple[str, List[str], UploadFile]]: Description, hashtags and file of every post
+    :param user: User: Get the user id of the author
+    :param db: Session: Pass the database session to the function
+    :return: A list with the filename, status and post or error of every file, in the order of the uploads
+    :doc-author: Trelent
+    """
+    semaphore = asyncio.Semaphore(settings.bulk_upload_concurrency)
+
+    async def store(file: UploadFile) -> dict:
+        async with semaphore:
+            return await store_image_file(file.file)
+
+    stored = await asyncio.gather(*(store(file) for _, _, file in uploads), return_exceptions=True)
+
+    tags = await get_or_create_tags(db, [tag for _, hashtags, _ in uploads for tag in hashtags])
+    results = []
+    posts = []
+    for (description, hashtags, file), fields in zip(uploads, stored):
+        result = {"filename": file.filename, "status": "created", "post": None, "error": None}
+        if isinstance(fields, BaseException):
+            if not isinstance(fields, HTTPException):
+                logger.warning("Upload of %s failed: %r", file.filename, fields)
+            result.update(status="failed", error=fields.detail if isinstance(fields, HTTPException) else "Upload failed")
+        else:
+            post = Post(description=description, author_id=user.id,
+                        hashtags=[tags[name] for name in dict.fromkeys(hashtags)], **fields)
+            posts.append(post)
+            result["post"] = post
+        results.append(result)
+
+    db.add_all(posts)
+    db.flush()
+    for post in posts:
+        schedule_fan_out(db, post)
+    db.commit()
+    for post in posts:
+        db.refresh(post)
+        similarity_index.add(post.id, post.phash)
+        feed_cache.add(post)
+        tag_names = [tag.name for tag in post.hashtags]
+        tag_index.add(post.id, tag_names)
+        trending_tags.add(post.created_dt, tag_names)
+    return results
+
+
+async def store_image_file(file: BinaryIO) -> dict:
+    """
+    The store_image_file function checks the image, reads its metadata and hashes, and uploads it
+    and its qr code to the storage. The database is not used, so several files can be stored concurrently.
+
+    :param file: BinaryIO: The image file, opened in binary mode
+    :return: The values of the post columns describing the image
+    :doc-author: Trelent
+    """
+    validate_image_file(file)
+    metadata = extract_image_metadata(file)
+    blurhash = await run_in_threadpool(compute_blurhash, file)
+    phash = await run_in_threadpool(compute_dhash, file)
 
     public_id = f'{settings.cloudinary_folder_name}/{uuid.uuid4()}'
-    result = cloudinary.uploader.upload(file.file, public_id=public_id)
-    url = result['secure_url']
-    qr_url = await get_qr_code_by_url(url)    
-    images = Post(description=description, author_id=user.id, image_url=url, qr_code_url=qr_url, hashtags=dbtags)
+    url = await run_in_threadpool(storage.save, file, public_id, variants=True)
+    fields = await get_delivery_fields(public_id, url)
+    return {**fields, "blurhash": blurhash, "phash": phash, **metadata}
+
+
+async def get_delivery_fields(public_id: str, url: str) -> dict:
+    """
+    The get_delivery_fields function builds the urls of a stored image:
+    the image itself, its resized variants and its qr code.
+
+    :param public_id: str: Public id of the image in the storage
+    :param url: str: Url of the image
+    :return: The image_url, variants and qr_code_url values of the post
+    :doc-author: Trelent
+    """
+    return {
+        "image_url": url,
+        "variants": storage.variant_urls(public_id),
+        "qr_code_url": await get_qr_code_by_url(url),
+    }
+
+
+async def create_direct_upload_post(body: DirectUploadComplete, user: User, db: Session) -> Post:
+    """
+    The create_direct_upload_post function creates the post of an image the client uploaded straight to cloudinary.
+    The upload is checked against its token and the signature of the cloudinary response, the image itself
+    never goes through the API. Completing the same upload twice returns the existing post: the post is
+    recorded in direct_uploads under the public id, so of two concurrent completions only one creates it.
+
+    :param body: DirectUploadComplete: Upload token and fields of the cloudinary upload response
+    :param user: User: The user completing the upload
+    :param db: Session: Pass the database session to the function
+    :return: An object of the post class
+    :doc-author: Trelent
+    """
+    claims = verify_upload(body.upload_token, body.public_id, body.version, body.signature, user)
+    existing = get_direct_upload_post(body.public_id, db)
+    if existing:
+        return existing
+    # the metadata of the response isn't signed, it is read from cloudinary
+    resource = await run_in_threadpool(fetch_upload_resource, body.public_id, body.version)
+    url = build_upload_url(body.public_id, body.version, resource["format"])
+    fields = await get_delivery_fields(body.public_id, url)
+
+    def claim_upload(post: Post) -> None:
+        db.add(DirectUpload(public_id=body.public_id, post_id=post.id))
+        db.flush()
+
+    try:
+        return await save_post(
+            claims["description"], claims["hashtags"], user, db, before_commit=claim_upload,
+            width=resource.get("width"), height=resource.get("height"),
+            image_format=resource["format"], byte_size=resource.get("bytes"), **fields
+        )
+    except IntegrityError:
+        # a concurrent completion created the post first, this one is rolled back
+        db.rollback()
+    existing = get_direct_upload_post(body.public_id, db)
+    if existing is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already completed")
+    return existing
+
+
+def get_direct_upload_post(public_id: str, db: Session) -> Post | None:
+    """
+    The get_direct_upload_post function returns the post created for an image uploaded straight to cloudinary.
+
+    :param public_id: str: Public id of the uploaded image
+    :param db: Session: Pass the database session to the function
+    :return: The post, or None if the upload wasn't completed yet
+    :doc-author: Trelent
+    """
+    return db.query(Post).join(DirectUpload, DirectUpload.post_id == Post.id) \
+        .filter(DirectUpload.public_id == public_id).first()
+
+
+async def save_post(description: str, hashtags: List[str], user: User, db: Session,
+                    before_commit: Callable[[Post], None] | None = None, **fields) -> Post:
+    """
+    The save_post function creates the post of an image already stored, with its tags.
+
+    :param description: str: Pass in the description of the post
+    :param hashtags: List[str]: Names of the tags of the post
+    :param user: User: Get the user id of the author
+    :param db: Session: Pass the database session to the function
+    :param before_commit: Callable[[Post], None] | None: Called with the flushed post, its changes are committed with it
+    :param **fields: Other columns of the post, like the urls and the image metadata
+    :return: An object of the post class
+    :doc-author: Trelent
+    """
+    tags = await get_or_create_tags(db, hashtags)
+    images = Post(description=description, author_id=user.id, hashtags=list(tags.values()), **fields)
     db.add(images)
+    db.flush()
+    schedule_fan_out(db, images)
+    if before_commit is not None:
+        before_commit(images)
     db.commit()
     db.refresh(images)
+    similarity_index.add(images.id, images.phash)
+    feed_cache.add(images)
+    tag_index.add(images.id, tags.keys())
+    trending_tags.add(images.created_dt, tags.keys())
     return images
     
 
@@ -67,6 +257,69 @@ async def get_images(user_id: int, db: Session):
     """
     return db.query(Post).filter(Post.author_id == str(user_id)).all()
 
+async def get_feed(before: int | None, limit: int, db: Session) -> dict:
+    """
+    The get_feed function returns a page of the newest posts of all users, newest first.
+    Pages are chained by post id: the next_cursor of a page is passed as before to get the next one.
+    Recent pages come from the in-memory feed cache, older ones from the database.
+
+    :param before: int | None: Only return posts with a lower id, None for the first page
+    :param limit: int: Maximum number of posts
+    :param db: Session: Access the database
+    :return: A dictionary with the items of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    items = feed_cache.page(before, limit)
+    if items is None:
+        query = db.query(Post)
+        if before is not None:
+            query = query.filter(Post.id < before)
+        items = [post_summary(post) for post in query.order_by(Post.id.desc()).limit(limit)]
+    return {"items": items, "next_cursor": items[-1]["id"] if len(items) == limit else None}
+
+async def search_images(query: str, limit: int, cursor: str | None, db: Session) -> dict:
+    """
+    The search_images function finds the posts whose description, hashtags or comments contain every word of the query.
+    The best matches come first, the next_cursor of a page is passed as cursor to get the next one.
+
+    :param query: str: Words to look for
+    :param limit: int: Maximum number of posts
+    :param cursor: str | None: Cursor of the page, None for the first page
+    :param db: Session: Access the database
+    :return: A dictionary with the items of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    hits = search_post_ids(db, query, limit, cursor)
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_([post_id for post_id, _ in hits]))}
+    return {
+        "items": [{**post_summary(posts[post_id]), "score": score} for post_id, score in hits if post_id in posts],
+        "next_cursor": encode_cursor(*hits[-1][::-1]) if len(hits) == limit else None,
+    }
+
+async def get_images_by_tags(query: str, before: int | None, limit: int, db: Session) -> dict:
+    """
+    The get_images_by_tags function finds the posts matching a query on their hashtags,
+    like "sunset AND beach NOT night", newest first.
+    The next_cursor of a page is passed as before to get the next one.
+
+    :param query: str: Tags combined with AND, OR, NOT and parentheses
+    :param before: int | None: Only return posts with a lower id, None for the first page
+    :param limit: int: Maximum number of posts
+    :param db: Session: Access the database
+    :return: A dictionary with the number of matching posts, the items of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    if not tag_index.loaded:
+        tag_index.load(db)
+    matches = tag_index.query(query)
+    post_ids = list(islice(matches.descending(before), limit))
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_(post_ids))}
+    return {
+        "count": len(matches),
+        "items": [post_summary(posts[post_id]) for post_id in post_ids if post_id in posts],
+        "next_cursor": post_ids[-1] if len(post_ids) == limit else None,
+    }
+
 async def get_image(image_id : int, user_id: User, db: Session):
     """
     The get_image function returns the image with the given id.
@@ -95,6 +348,7 @@ async def del_image(image_id:int, db: Session, current_user: User ):
     :param db: Session: Access the database
     :param current_user: User: Check if the user is authorized to delete the image
     :return: A dictionary with the key 'msg' and value 'post deleted'
+        The image and qr code assets are removed from the storage in the background.
     :doc-author: Trelent
     """
     try:
@@ -104,8 +358,19 @@ async def del_image(image_id:int, db: Session, current_user: User ):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Permission denied")
     except:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Permission denied")
+    assets = [get_public_id_from_url(image.qr_code_url)]
+    image_public_id = get_public_id_from_url(image.image_url)
+    # transformed posts point to the same asset as their original, keep it while it is still used
+    if image_public_id and not db.query(Post.id).filter(
+            Post.id != image.id, Post.image_url.contains(image_public_id)).first():
+        assets.append(image_public_id)
+    tag_names = [tag.name for tag in image.hashtags]
     db.delete(image)
+    schedule_asset_removal(db, assets)
     db.commit()
+    similarity_index.remove(image_id)
+    feed_cache.remove(image_id)
+    tag_index.remove(image_id, tag_names)
     return {'msg': 'Post deleted'}
 
 
@@ -132,4 +397,99 @@ async def put_image(image_id:int, new_description:str, current_user: User, db: S
     image.description = new_description
     db.commit()
     db.refresh(image)
+    feed_cache.add(image)
     return image
+
+
+async def get_image_detail(image_id: int, comments_limit: int, db: Session) -> dict:
+    """
+    The get_image_detail function returns everything a post page shows: the post, its author,
+    its hashtags, the number and average of its ratings, the number of its comments and the first ones.
+    It always runs four queries, the post with its author, the hashtags, the counts and the comments.
+
+    :param image_id: int: Id of the post
+    :param comments_limit: int: Maximum number of comments to return, oldest first
+    :param db: Session: Access the database
+    :return: A dictionary with the fields of the post page
+    :doc-author: Trelent
+    """
+    image = db.query(Post).options(joinedload(Post.author), selectinload(Post.hashtags)).filter(
+        Post.id == image_id
+    ).first()
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    rating_count, average_rating, comment_count = db.query(
+        select(func.count(Rating.id)).where(Rating.image_id == image_id).scalar_subquery(),
+        select(func.avg(Rating.rating)).where(Rating.image_id == image_id).scalar_subquery(),
+        select(func.count(Comments.id)).where(Comments.image_id == image_id).scalar_subquery(),
+    ).one()
+    comments = db.query(Comments).filter(Comments.image_id == image_id).order_by(Comments.id).limit(comments_limit).all()
+    return {
+        **post_summary(image),
+        "qr_code_url": image.qr_code_url,
+        "image_format": image.image_format,
+        "byte_size": image.byte_size,
+        "taken_at": image.taken_at,
+        "author": image.author,
+        "hashtags": [tag.name for tag in image.hashtags],
+        "rating": {"count": rating_count, "average": average_rating or 0.0},
+        "comment_count": comment_count,
+        "comments": comments,
+    }
+
+
+async def get_related_images(image_id: int, limit: int, db: Session) -> List[dict]:
+    """
+    The get_related_images function returns the posts sharing the most hashtags with the given post,
+    rare hashtags counting more than common ones and well rated posts ranking higher.
+    Candidates come from the in-memory tag matrix, only the related posts are loaded from the database.
+
+    :param image_id: int: Id of the post
+    :param limit: int: Maximum number of posts to return
+    :param db: Session: Access the database
+    :return: A list of posts with their score, best first
+    :doc-author: Trelent
+    """
+    image = db.query(Post).filter(Post.id == image_id).first()
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if not related_posts.loaded:
+        related_posts.load(db)
+    matrix = related_posts.matrix
+    # posts created since the matrix was built are looked up by their hashtags
+    tag_ids = [] if image_id in matrix else [tag.id for tag in image.hashtags]
+    matches = matrix.related(image_id, tag_ids, limit, settings.related_rating_weight)
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_([post_id for post_id, _ in matches]))}
+    return [{**post_summary(posts[post_id]), "score": score} for post_id, score in matches if post_id in posts]
+
+
+async def get_similar_images(image_id: int, max_distance: int, limit: int, db: Session) -> List[dict]:
+    """
+    The get_similar_images function returns the posts whose image looks like the image of the given post.
+    Candidates come from the in-memory similarity index, only the matching posts are loaded from the database.
+
+    :param image_id: int: Id of the post to compare with
+    :param max_distance: int: Maximum number of different bits between the perceptual hashes
+    :param limit: int: Maximum number of posts to return
+    :param db: Session: Access the database
+    :return: A list of posts with their distance, closest first
+    :doc-author: Trelent
+    """
+    image = db.query(Post).filter(Post.id == image_id).first()
+    if image is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    if image.phash is None:
+        return []
+    matches = [(post_id, distance) for post_id, distance in similarity_index.search(image.phash, max_distance)
+               if post_id != image_id][:limit]
+    posts = {post.id: post for post in db.query(Post).filter(Post.id.in_([post_id for post_id, _ in matches]))}
+    return [
+        {
+            "id": post_id,
+            "description": posts[post_id].description,
+            "image_url": posts[post_id].image_url,
+            "author_id": posts[post_id].author_id,
+            "distance": distance,
+        }
+        for post_id, distance in matches if post_id in posts
+    ]
@@ -1,7 +1,10 @@
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
-from src.database.models import Rating, User, Post, UserRole
+from src.database.models import Rating, User, Post, PostRanking, UserRole
+from src.services.feed import post_summary
+from src.services.search import decode_cursor, encode_cursor
 
 
 async def create_rating(db: Session, user: User, image: Post, rating_value: int) -> Rating:
@@ -80,3 +83,34 @@ def calculate_average_rating(db: Session, image_id: int) -> float:
     total_score = sum(rating.rating for rating in ratings)
     average_rating = total_score / len(ratings)
     return average_rating
+
+
+async def get_leaderboard(kind: str, limit: int, cursor: str | None, db: Session) -> dict:
+    """
+    The get_leaderboard function returns a page of the top rated or hot posts, read from the
+    post_rankings table filled by the ranking refresher, so no rating is aggregated on request.
+    The next_cursor of a page is passed as cursor to get the next one.
+
+    :param kind: str: &quot;top&quot; to sort by bayesian score, &quot;hot&quot; to sort by hot score
+    :param limit: int: Maximum number of posts
+    :param cursor: str | None: Cursor of the page, None for the first page
+    :param db: Session: Pass the database session to the function
+    :return: A dictionary with the items of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    score = PostRanking.bayesian_score if kind == "top" else PostRanking.hot_score
+    query = db.query(PostRanking, Post).join(Post, Post.id == PostRanking.post_id)
+    if cursor:
+        after_score, after_id = decode_cursor(cursor)
+        query = query.filter(or_(score < after_score, and_(score == after_score, PostRanking.post_id < after_id)))
+    rows = query.order_by(score.desc(), PostRanking.post_id.desc()).limit(limit).all()
+    items = [{
+        **post_summary(post),
+        "rating_count": ranking.rating_count,
+        "average_rating": ranking.average_rating,
+        "score": getattr(ranking, score.key),
+    } for ranking, post in rows]
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(items[-1]["score"], items[-1]["id"]) if len(items) == limit else None,
+    }
@@ -18,4 +18,27 @@ async def get_or_create_tag(db: Session, name: str):
         db.add(tag)
         db.commit()
         db.refresh(tag)
-    return tag
\ No newline at end of file
+    return tag
+
+
+async def get_or_create_tags(db: Session, names: list[str]) -> dict[str, Hashtag]:
+    """
+    The get_or_create_tags function resolves many tag names with a single query and creates the missing tags.
+    New tags are only flushed, they are committed together with the posts that use them.
+
+    :param db: Session: Pass the database session to the function
+    :param names: list[str]: Names of the tags, duplicates are ignored
+    :return: A dictionary of tags by name, in the order of the names
+    :doc-author: Trelent
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+    existing = {tag.name: tag for tag in db.query(Hashtag).filter(Hashtag.name.in_(names))}
+    tags = {}
+    for name in names:
+        tags[name] = existing.get(name) or Hashtag(name=name)
+        if name not in existing:
+            db.add(tags[name])
+    db.flush()
+    return tags
@@ -0,0 +1,266 @@
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Post, UploadSession, User
+from src.repository.images import save_post, store_image_file
+from src.schemas import UploadSessionCreate
+from src.utils.image_metadata import SIGNATURE_LENGTH, sniff_image_format
+
+
+def _check_signature(head: bytes) -> None:
+    if sniff_image_format(head) is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+
+
+def get_staging_path(upload_id: str) -> Path:
+    """
+    The get_staging_path function returns the path of the local file the chunks of the upload are written to.
+
+    :param upload_id: str: Id of the upload session
+    :return: The path of the staging file
+    :doc-author: Trelent
+    """
+    return Path(settings.upload_staging_dir) / f"{upload_id}.part"
+
+
+def _remove_staging_files(upload_id: str) -> None:
+    get_staging_path(upload_id).unlink(missing_ok=True)
+    # chunks left behind by a crash while they were received
+    for path in Path(settings.upload_staging_dir).glob(f"{upload_id}.*.chunk"):
+        path.unlink(missing_ok=True)
+
+
+def _append_chunk(path: Path, chunk_path: Path, offset: int) -> None:
+    with open(path, "r+b") as file, open(chunk_path, "rb") as chunk:
+        # drop whatever an interrupted append left after the last accepted byte
+        file.truncate(offset)
+        file.seek(offset)
+        shutil.copyfileobj(chunk, file)
+        file.flush()
+        os.fsync(file.fileno())
+    chunk_path.unlink()
+
+
+async def create_upload_session(body: UploadSessionCreate, user: User, db: Session) -> UploadSession:
+    """
+    The create_upload_session function starts a resumable upload.
+    The session is stored in the database, so the upload can be resumed after a restart of the application.
+
+    :param body: UploadSessionCreate: Description, hashtags and size of the image
+    :param user: User: The author of the future post
+    :param db: Session: Pass the database session to the function
+    :return: The new upload session
+    :doc-author: Trelent
+    """
+    if body.total_size > settings.max_upload_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+    upload = UploadSession(
+        id=str(uuid.uuid4()),
+        user_id=user.id,
+        description=body.description,
+        hashtags=body.hashtags,
+        total_size=body.total_size,
+        sha256=body.sha256.lower(),
+        expires_at=datetime.utcnow() + timedelta(seconds=settings.upload_session_ttl)
+    )
+    os.makedirs(settings.upload_staging_dir, exist_ok=True)
+    get_staging_path(upload.id).touch()
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+
+async def get_upload_session(upload_id: str, user: User, db: Session) -> UploadSession:
+    """
+    The get_upload_session function returns the upload session of the user.
+    Expired sessions that were not completed are removed together with their staging file.
+
+    :param upload_id: str: Id of the upload session
+    :param user: User: The owner of the session
+    :param db: Session: Pass the database session to the function
+    :return: The upload session
+    :doc-author: Trelent
+    """
+    upload = db.query(UploadSession).filter(
+        UploadSession.id == upload_id,
+        UploadSession.user_id == user.id
+    ).first()
+    if upload is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    if upload.post_id is None and upload.expires_at < datetime.utcnow():
+        _remove_staging_files(upload.id)
+        db.delete(upload)
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Upload expired")
+    return upload
+
+
+async def write_chunk(
+    upload_id: str,
+    offset: int,
+    checksum: str,
+    chunk: AsyncIterator[bytes],
+    user: User,
+    db: Session
+) -> UploadSession:
+    """
+    The write_chunk function streams a chunk of the image to the staging file at the given offset.
+    The offset must be the number of bytes received so far, so a client that lost the response
+    of a chunk can ask for the session and resend from there. The chunk is first written to a file
+    of its own and only accepted when its sha256 matches the checksum. It is appended to the staging
+    file once the offset was claimed in the database, so of two requests sending the same offset
+    only the one that claimed it touches the staging file. The claim is committed after the append,
+    a failed append leaves the session as it was. The files are written in the threadpool.
+
+    :param upload_id: str: Id of the upload session
+    :param offset: int: Position of the chunk in the image
+    :param checksum: str: Hex encoded sha256 of the chunk
+    :param chunk: AsyncIterator[bytes]: The body of the request
+    :param user: User: The owner of the session
+    :param db: Session: Pass the database session to the function
+    :return: The updated upload session
+    :doc-author: Trelent
+    """
+    upload = await get_upload_session(upload_id, user, db)
+    if upload.post_id is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already completed")
+    path = get_staging_path(upload.id)
+    if not path.exists():
+        # the staging file was lost, the client has to send the image again from the start
+        os.makedirs(settings.upload_staging_dir, exist_ok=True)
+        path.touch()
+        upload.received = 0
+        db.commit()
+    if offset != upload.received:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Expected offset {upload.received}")
+
+    digest = hashlib.sha256()
+    written = 0
+    head = b""
+    chunk_path = path.with_name(f"{upload.id}.{uuid.uuid4().hex}.chunk")
+    file = await run_in_threadpool(open, chunk_path, "wb")
+    try:
+        try:
+            async for data in chunk:
+                written += len(data)
+                if written > settings.upload_chunk_max_bytes or offset + written > upload.total_size:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail="Chunk is too large")
+                if offset == 0 and len(head) < SIGNATURE_LENGTH:
+                    # the first chunk must start like an image, don't wait for the rest of the file
+                    head += data[:SIGNATURE_LENGTH - len(head)]
+                    if len(head) == SIGNATURE_LENGTH:
+                        _check_signature(head)
+                digest.update(data)
+                await run_in_threadpool(file.write, data)
+        finally:
+            await run_in_threadpool(file.close)
+        if written == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Chunk is empty")
+        if offset == 0:
+            _check_signature(head)
+        if digest.hexdigest() != checksum.lower():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Checksum mismatch")
+
+        # the update locks the session until the commit, a concurrent chunk at the same offset waits
+        # and then finds nothing to claim; it is only committed once the bytes are on disk
+        claimed = db.query(UploadSession).filter(
+            UploadSession.id == upload.id,
+            UploadSession.received == offset
+        ).update({UploadSession.received: offset + written}, synchronize_session=False)
+        if not claimed:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Chunk was written concurrently")
+        await run_in_threadpool(_append_chunk, path, chunk_path, offset)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        chunk_path.unlink(missing_ok=True)
+        raise
+    db.refresh(upload)
+    return upload
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+async def complete_upload(upload_id: str, user: User, db: Session) -> Post:
+    """
+    The complete_upload function creates the post once every byte of the image was received.
+    The image must match the sha256 given when the upload was started, otherwise the received
+    bytes are dropped and the client sends the image again from the start. The post and the link
+    of the session to it are committed together, completing an upload twice returns the post
+    created the first time.
+
+    :param upload_id: str: Id of the upload session
+    :param user: User: The owner of the session
+    :param db: Session: Pass the database session to the function
+    :return: The new post
+    :doc-author: Trelent
+    """
+    upload = await get_upload_session(upload_id, user, db)
+    if upload.post_id is not None:
+        return db.query(Post).filter(Post.id == upload.post_id).first()
+    if upload.received != upload.total_size:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload is incomplete")
+
+    path = get_staging_path(upload.id)
+    if await run_in_threadpool(_file_sha256, path) != upload.sha256:
+        await run_in_threadpool(os.truncate, path, 0)
+        upload.received = 0
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image checksum mismatch")
+
+    def link_upload(post: Post) -> None:
+        # a concurrent completion already created the post, this one is rolled back
+        linked = db.query(UploadSession).filter(
+            UploadSession.id == upload.id,
+            UploadSession.post_id.is_(None)
+        ).update({UploadSession.post_id: post.id}, synchronize_session=False)
+        if not linked:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload already completed")
+
+    with open(path, "rb") as file:
+        fields = await store_image_file(file)
+    try:
+        post = await save_post(upload.description, upload.hashtags, user, db, before_commit=link_upload, **fields)
+    except HTTPException:
+        db.rollback()
+        raise
+    path.unlink(missing_ok=True)
+    return post
+
+
+def remove_expired_upload_sessions(db: Session) -> int:
+    """
+    The remove_expired_upload_sessions function deletes the sessions that expired before being completed,
+    and their staging files.
+
+    :param db: Session: Pass the database session to the function
+    :return: The number of removed sessions
+    :doc-author: Trelent
+    """
+    expired = db.query(UploadSession).filter(
+        UploadSession.post_id.is_(None),
+        UploadSession.expires_at < datetime.utcnow()
+    ).all()
+    for upload in expired:
+        _remove_staging_files(upload.id)
+        db.delete(upload)
+    db.commit()
+    return len(expired)
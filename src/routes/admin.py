@@ -4,6 +4,9 @@ from sqlalchemy.orm import Session
 from src.database.db import get_db
 from src.database.models import User
 from src.services.auth import is_admin
+from src.services.jobs import job_worker
+from src.services.email import smtp_pool
+from src.services.media_cache import media_cache
 from src.schemas import UserOut, RoleChangeRequest
 
 
@@ -91,3 +94,43 @@ async def unban_user(
     db.commit()
     db.refresh(user_to_unban)
     return user_to_unban
+
+
+@router.get("/jobs")
+async def get_job_metrics(
+        db: Session = Depends(get_db),
+        current_user: User = Depends(is_admin)
+):
+    """
+    The get_job_metrics function returns the depth of the job queue and the latency of the background jobs.
+
+    :param db: Session: Access the database
+    :param current_user: User: Ensure that the user is an admin
+    :return: A dictionary with the queue metrics
+    :doc-author: Trelent
+    """
+    return job_worker.get_metrics(db)
+
+
+@router.get("/email")
+async def get_email_metrics(current_user: User = Depends(is_admin)):
+    """
+    The get_email_metrics function returns the statistics of the SMTP connection pool.
+
+    :param current_user: User: Ensure that the user is an admin
+    :return: A dictionary with the number of sent and failed emails and the average send latency
+    :doc-author: Trelent
+    """
+    return smtp_pool.get_metrics()
+
+
+@router.get("/media-cache")
+async def get_media_cache_metrics(current_user: User = Depends(is_admin)):
+    """
+    The get_media_cache_metrics function returns the hit ratio and the size of the cloudinary proxy cache.
+
+    :param current_user: User: Ensure that the user is an admin
+    :return: A dictionary with the cache statistics
+    :doc-author: Trelent
+    """
+    return media_cache.get_metrics()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
@@ -6,21 +6,20 @@ from src.database.db import get_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail, FirstAdminModel
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.services.email import send_email
+from src.services.email import schedule_email
 
 router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, request: Request, db: Session = Depends(get_db)):
     """
     The signup function creates a new user in the database.
         It takes a UserModel object as input, and returns an HTTP response with the newly created user's information.
         If there are no users in the database, it will create an admin account instead of a regular user account.
     
     :param body: UserModel: Get the user's email and password
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base url of the application
     :param db: Session: Get a database session
     :return: A dictionary with two keys: user and detail
@@ -38,7 +37,7 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
         body.password = auth_service.get_password_hash(body.password)
         new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    schedule_email(db, new_user.email, new_user.username, request.base_url)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
@@ -116,15 +115,13 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
     return {"message": "Email confirmed"}
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: Session = Depends(get_db)):
     """
     The request_email function is used to send an email to the user with a link that they can click on
         to confirm their email address. The function takes in a RequestEmail object, which contains the user's
         email address. It then checks if there is already a confirmed account associated with that email address, and if so, returns an error message saying as much. If not, it sends an email containing a confirmation link.
     
     :param body: RequestEmail: Get the email from the request body
-    :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base_url of the application
     :param db: Session: Get the database session
     :return: A message to the user
@@ -135,5 +132,5 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        schedule_email(db, user.email, user.username, request.base_url)
     return {"message": "Check your email for confirmation."}
\ No newline at end of file
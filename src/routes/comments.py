@@ -1,12 +1,14 @@
 from datetime import datetime
 from typing import List
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased
 from src.database.db import get_db
 from src.schemas import (
     PostCommentReques,
     GetCommentResponce,
-    PutCommentReques
+    PutCommentReques,
+    ImageComments
 )
 from src.database.models import User, Post, Comments, UserRole
 from src.services.auth import auth_service
@@ -14,6 +16,9 @@ from src.services.auth import auth_service
 
 router = APIRouter(prefix='/comments', tags=["comments"])
 
+# a gallery page shows up to 50 thumbnails
+MAX_BATCH_IMAGES = 50
+
 
 @router.post(
     "/",
@@ -53,6 +58,45 @@ async def post_comment(
     return comment
 
 
+# declared before /{comment_id}, which would match "batch" as a comment id
+@router.get(
+    "/batch",
+    response_model=List[ImageComments]
+)
+async def get_comments_batch(
+    image_ids: List[int] = Query(),
+    per_image: int = Query(3, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """
+    The get_comments_batch function returns the newest comments of many images at once, for gallery grids.
+    All images are read with one query, which numbers the comments of every image with ROW_NUMBER
+    and keeps the first per_image of each. Images without comments get an empty list.
+
+    :param image_ids: List[int]: Ids of the images, repeated as image_ids=1&image_ids=2, at most MAX_BATCH_IMAGES
+    :param per_image: int: Maximum number of comments per image
+    :param db: Session: Get the database session
+    :return: The newest comments of every image, in the order of the ids
+    :doc-author: Trelent
+    """
+    image_ids = list(dict.fromkeys(image_ids))
+    if len(image_ids) > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IMAGES} images per batch"
+        )
+    position = func.row_number().over(
+        partition_by=Comments.image_id,
+        order_by=(Comments.created_at.desc(), Comments.id.desc())
+    ).label("position")
+    ranked = select(Comments, position).where(Comments.image_id.in_(image_ids)).subquery()
+    comment = aliased(Comments, ranked)
+    comments = {image_id: [] for image_id in image_ids}
+    for row in db.query(comment).filter(ranked.c.position <= per_image).order_by(ranked.c.position):
+        comments[row.image_id].append(row)
+    return [{"image_id": image_id, "comments": items} for image_id, items in comments.items()]
+
+
 @router.get(
     "/{comment_id}",
     response_model=GetCommentResponce
@@ -1,18 +1,41 @@
-from fastapi import Depends, File, HTTPException, UploadFile, APIRouter, status
+from fastapi import Depends, File, Form, Header, HTTPException, UploadFile, APIRouter, Query, Request, status
 from sqlalchemy.orm import Session
 from typing import List
 
 from src.schemas import (
     ImageResponce,
+    BulkUploadResult,
     CropImageRequest,
     RoundCornersImageRequest,
-    EffectImageRequest
+    EffectImageRequest,
+    TransformPreviewResponse,
+    CommitTransformationRequest,
+    SimilarImageResponse,
+    FeedResponse,
+    SearchResponse,
+    TagQueryResponse,
+    RelatedPost,
+    PostDetail,
+    UploadSessionCreate,
+    UploadSessionResponse,
+    DirectUploadRequest,
+    DirectUploadResponse,
+    DirectUploadComplete
 )
-from src.database.models import User
+from src.database.models import UploadSession, User
 from src.database.db import get_db
 from src.repository import images as repository_images
+from src.repository import uploads as repository_uploads
+from src.repository import follows as repository_follows
+from src.conf.config import settings
 from src.services.auth import auth_service, check_is_admin_or_moderator
-from src.utils.image_utils import transform_image
+from src.services.similarity import SimilarityIndex
+from src.services.direct_uploads import create_upload_params
+from src.utils.image_utils import (
+    transform_image,
+    preview_transform_image,
+    commit_transformed_image
+)
 
 
 router = APIRouter(prefix='/images', tags=["images"])
@@ -38,6 +61,173 @@ async def upload_file(description: str, hashtags: List[str], db: Session = Depen
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Limit of 5 tags")
     return await repository_images.create_images_post(description, tags_list, current_user, db,  file)
 
+@router.post("/upload/bulk", response_model=List[BulkUploadResult])
+async def upload_files(
+    files: List[UploadFile] = File(...),
+    descriptions: List[str] = Form(...),
+    hashtags: List[str] = Form(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The upload_files function uploads many images at once, for example a whole album.
+    Every file gets its own description and its own comma separated hashtags, given in the same order as the files.
+    The result of every file is returned, a file that fails doesn't stop the others.
+
+    :param files: List[UploadFile]: The images
+    :param descriptions: List[str]: Description of every image
+    :param hashtags: List[str]: Comma separated hashtags of every image, optional
+    :param db: Session: Access the database
+    :param current_user: User: Get the user who is currently logged in
+    :return: The filename, status and post or error of every file
+    :doc-author: Trelent
+    """
+    if len(files) > settings.bulk_upload_max_files:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Limit of {settings.bulk_upload_max_files} files")
+    hashtags = hashtags or [""] * len(files)
+    if len(descriptions) != len(files) or len(hashtags) != len(files):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Every file needs a description and hashtags")
+    tags_lists = [[tag.strip() for tag in tags.split(",") if tag.strip()] for tags in hashtags]
+    if any(len(tags) > 5 for tags in tags_lists):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Limit of 5 tags")
+    return await repository_images.create_images_posts(
+        list(zip(descriptions, tags_lists, files)), current_user, db
+    )
+
+
+def upload_session_response(upload: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=upload.id,
+        total_size=upload.total_size,
+        received=upload.received,
+        chunk_size=settings.upload_chunk_max_bytes,
+        expires_at=upload.expires_at,
+        post_id=upload.post_id
+    )
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    body: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The create_upload function starts a resumable upload of a large image.
+    The image is then sent with PUT requests of at most chunk_size bytes and the upload is completed
+    with a POST to /uploads/{upload_id}/complete.
+
+    :param body: UploadSessionCreate: Description, hashtags and size in bytes of the image
+    :param db: Session: Access the database
+    :param current_user: User: Get the user who is currently logged in
+    :return: The upload session
+    :doc-author: Trelent
+    """
+    upload = await repository_uploads.create_upload_session(body, current_user, db)
+    return upload_session_response(upload)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The get_upload function returns the state of an upload, a client resumes from the received offset.
+
+    :param upload_id: str: Id of the upload session
+    :param db: Session: Access the database
+    :param current_user: User: Get the user who is currently logged in
+    :return: The upload session
+    :doc-author: Trelent
+    """
+    upload = await repository_uploads.get_upload_session(upload_id, current_user, db)
+    return upload_session_response(upload)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(ge=0),
+    x_chunk_sha256: str = Header(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The upload_chunk function writes the body of the request at the given offset of the image.
+    The body is streamed to disk, it is never held in memory as a whole.
+
+    :param upload_id: str: Id of the upload session
+    :param request: Request: Read the chunk from the body of the request
+    :param offset: int: Position of the chunk in the image
+    :param x_chunk_sha256: str: Hex encoded sha256 of the chunk, sent in the X-Chunk-SHA256 header
+    :param db: Session: Access the database
+    :param current_user: User: Get the user who is currently logged in
+    :return: The upload session
+    :doc-author: Trelent
+    """
+    upload = await repository_uploads.write_chunk(
+        upload_id, offset, x_chunk_sha256, request.stream(), current_user, db
+    )
+    return upload_session_response(upload)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=ImageResponce)
+async def complete_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The complete_upload function creates the post once the whole image was uploaded.
+
+    :param upload_id: str: Id of the upload session
+    :param db: Session: Access the database
+    :param current_user: User: Get the user who is currently logged in
+    :return: The new post
+    :doc-author: Trelent
+    """
+    return await repository_uploads.complete_upload(upload_id, current_user, db)
+
+@router.post("/direct-uploads", response_model=DirectUploadResponse)
+async def create_direct_upload(
+    body: DirectUploadRequest,
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The create_direct_upload function returns short-lived signed parameters for uploading an image
+    straight to cloudinary. The client posts the file with the params to upload_url, then sends the
+    upload response and the upload_token to /direct-uploads/complete to create the post.
+
+    :param body: DirectUploadRequest: Description and hashtags of the future post
+    :param current_user: User: Get the user who is currently logged in
+    :return: The upload url, the signed params and the upload token
+    :doc-author: Trelent
+    """
+    return create_upload_params(current_user, body.description, body.hashtags)
+
+
+@router.post("/direct-uploads/complete", response_model=ImageResponce)
+async def complete_direct_upload(
+    body: DirectUploadComplete,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The complete_direct_upload function creates the post of an image uploaded with /direct-uploads.
+
+    :param body: DirectUploadComplete: Upload token and fields of the cloudinary upload response
+    :param db: Session: Access the database
+    :param current_user: User: Get the user who is currently logged in
+    :return: The new post
+    :doc-author: Trelent
+    """
+    return await repository_images.create_direct_upload_post(body, current_user, db)
+
 @router.get("/get_image")
 async def get_image(
     image_id : int,
@@ -82,6 +272,145 @@ async def get_images(
         return await repository_images.get_images(user_id=current_user.id, db=db)
     return await repository_images.get_images(user_id=user_id, db=db)
 
+@router.get("/feed", response_model=FeedResponse)
+async def get_feed(
+    before: int | None = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_feed function returns the newest posts of all users, newest first.
+    To get the next page pass the next_cursor of the response as before.
+
+    :param before: int | None: Cursor of the page, omitted for the first page
+    :param limit: int: Maximum number of posts to return
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The posts of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    return await repository_images.get_feed(before, limit, db)
+
+@router.get("/search", response_model=SearchResponse)
+async def search_images(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The search_images function finds posts by the words of their description, hashtags and comments.
+    To get the next page pass the next_cursor of the response as cursor.
+
+    :param q: str: Words to look for, every word must match
+    :param limit: int: Maximum number of posts to return
+    :param cursor: str | None: Cursor of the page, omitted for the first page
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The matching posts, best first, and the cursor of the next page
+    :doc-author: Trelent
+    """
+    return await repository_images.search_images(q, limit, cursor, db)
+
+@router.get("/by-tags", response_model=TagQueryResponse)
+async def get_images_by_tags(
+    q: str = Query(min_length=1, max_length=500),
+    before: int | None = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_images_by_tags function finds posts by a combination of hashtags, like "sunset AND beach NOT night".
+    Tags are combined with the upper case operators AND, OR and NOT and with parentheses,
+    adjacent tags must all match. To get the next page pass the next_cursor of the response as before.
+
+    :param q: str: The tag query
+    :param before: int | None: Cursor of the page, omitted for the first page
+    :param limit: int: Maximum number of posts to return
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The number of matching posts, the posts of the page, newest first, and the cursor of the next page
+    :doc-author: Trelent
+    """
+    return await repository_images.get_images_by_tags(q, before, limit, db)
+
+@router.get("/timeline", response_model=FeedResponse)
+async def get_timeline(
+    before: int | None = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_timeline function returns the home timeline of the current user:
+    their posts and the posts of the users they follow, newest first.
+    To get the next page pass the next_cursor of the response as before.
+
+    :param before: int | None: Cursor of the page, omitted for the first page
+    :param limit: int: Maximum number of posts to return
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The posts of the page and the cursor of the next page
+    :doc-author: Trelent
+    """
+    return await repository_follows.get_home_timeline(current_user, before, limit, db)
+
+@router.get("/{image_id}/detail", response_model=PostDetail)
+async def get_image_detail(
+    image_id: int,
+    comments_limit: int = Query(20, ge=0, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_image_detail function returns what a post page shows in one request: the post, its author,
+    its hashtags, its rating, the number of its comments and the first page of them.
+
+    :param image_id: int: Id of the post
+    :param comments_limit: int: Maximum number of comments to return, oldest first
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: The post with its author, hashtags, rating and comments
+    :doc-author: Trelent
+    """
+    return await repository_images.get_image_detail(image_id, comments_limit, db)
+
+@router.get("/{image_id}/related", response_model=List[RelatedPost])
+async def get_related_images(
+    image_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_related_images function returns posts with hashtags in common with the given post, for a "more like this" strip.
+
+    :param image_id: int: Id of the post
+    :param limit: int: Maximum number of posts to return
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A list of related posts, best first
+    :doc-author: Trelent
+    """
+    return await repository_images.get_related_images(image_id, limit, db)
+
+@router.get("/{image_id}/similar", response_model=List[SimilarImageResponse])
+async def get_similar_images(
+    image_id: int,
+    max_distance: int = Query(4, ge=0, le=SimilarityIndex.MAX_DISTANCE),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_similar_images function returns images that are near-duplicates of the given image.
+
+    :param image_id: int: Id of the image to compare with
+    :param max_distance: int: Maximum distance between the perceptual hashes
+    :param limit: int: Maximum number of images to return
+    :param db: Session: Pass the database session to the repository layer
+    :param current_user: User: Get the current user from the database
+    :return: A list of similar images, closest first
+    :doc-author: Trelent
+    """
+    return await repository_images.get_similar_images(image_id, max_distance, limit, db)
+
 @router.delete("/delete_image")
 async def delete_image(
     image_id: int,
@@ -122,10 +451,11 @@ async def put_image(image_id: int , new_description: str,
 
 @router.post(
     "/transformation/crop",
-    response_model=ImageResponce
+    response_model=ImageResponce | TransformPreviewResponse
 )
 async def crop_image_view(
     body: CropImageRequest,
+    preview: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
@@ -133,6 +463,7 @@ async def crop_image_view(
     The crop_image_view function that allows users to crop an image.
     
     :param body: CropImageRequest: Parse the request body
+    :param preview: bool: Return only the url of the transformed image without saving it
     :param db: Session: Access the database
     :param current_user: User: Get the user who is currently logged in
     :return: A cropped image
@@ -143,6 +474,13 @@ async def crop_image_view(
         "width": body.width,
         "crop": "crop"
     }
+    if preview:
+        return await preview_transform_image(
+            image_id=body.image_id,
+            transform_params=transform_params,
+            db=db,
+            current_user=current_user
+        )
     return await transform_image(
         image_id=body.image_id,
         transform_params=transform_params,
@@ -154,10 +492,11 @@ async def crop_image_view(
 
 @router.post(
     "/transformation/roundcorners",
-    response_model=ImageResponce
+    response_model=ImageResponce | TransformPreviewResponse
 )
 async def round_corners(
     body: RoundCornersImageRequest,
+    preview: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
@@ -167,12 +506,20 @@ async def round_corners(
     
     
     :param body: RoundCornersImageRequest: Parse the request body
+    :param preview: bool: Return only the url of the transformed image without saving it
     :param db: Session: Access the database
     :param current_user: User: Get the user who is logged in
     :return: A response object that contains the transformed image
     :doc-author: Trelent
     """
     transform_params = {"radius": body.radius}
+    if preview:
+        return await preview_transform_image(
+            image_id=body.image_id,
+            transform_params=transform_params,
+            db=db,
+            current_user=current_user
+        )
     return await transform_image(
         image_id=body.image_id,
         transform_params=transform_params,
@@ -184,10 +531,11 @@ async def round_corners(
 
 @router.post(
     "/transformation/grayscale",
-    response_model=ImageResponce
+    response_model=ImageResponce | TransformPreviewResponse
 )
 async def grayscale(
     body: EffectImageRequest,
+    preview: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
@@ -195,12 +543,20 @@ async def grayscale(
     The grayscale function 
     
     :param body: EffectImageRequest: Get the image_id and description from the request body
+    :param preview: bool: Return only the url of the transformed image without saving it
     :param db: Session: Get a database session
     :param current_user: User: Get the user who is logged in
     :return: A response object that contains the transformed image
     :doc-author: Trelent
     """
     transform_params = {"effect": "grayscale"}
+    if preview:
+        return await preview_transform_image(
+            image_id=body.image_id,
+            transform_params=transform_params,
+            db=db,
+            current_user=current_user
+        )
     return await transform_image(
         image_id=body.image_id,
         transform_params=transform_params,
@@ -212,10 +568,11 @@ async def grayscale(
 
 @router.post(
     "/transformation/sepia",
-    response_model=ImageResponce
+    response_model=ImageResponce | TransformPreviewResponse
 )
 async def sepia(
     body: EffectImageRequest,
+    preview: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(auth_service.get_current_user)
 ):
@@ -225,12 +582,20 @@ async def sepia(
     
     
     :param body: EffectImageRequest: Get the image_id and description from the request body
+    :param preview: bool: Return only the url of the transformed image without saving it
     :param db: Session: Get a database session
     :param current_user: User: Get the user who is logged in
     :return: A response object that contains the transformed image
     :doc-author: Trelent
     """
     transform_params = {"effect": "sepia"}
+    if preview:
+        return await preview_transform_image(
+            image_id=body.image_id,
+            transform_params=transform_params,
+            db=db,
+            current_user=current_user
+        )
     return await transform_image(
         image_id=body.image_id,
         transform_params=transform_params,
@@ -238,3 +603,31 @@ async def sepia(
         db=db,
         current_user=current_user
     )
+
+
+@router.post(
+    "/transformation/commit",
+    response_model=ImageResponce
+)
+async def commit_transformation(
+    body: CommitTransformationRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The commit_transformation function saves a version of the image that was previously
+    returned by one of the transformation routes called with preview=true.
+
+    :param body: CommitTransformationRequest: Get the image_id, the chosen url and the description
+    :param db: Session: Get a database session
+    :param current_user: User: Get the user who is logged in
+    :return: A response object that contains the saved image
+    :doc-author: Trelent
+    """
+    return await commit_transformed_image(
+        image_id=body.image_id,
+        image_url=body.image_url,
+        description=body.description,
+        db=db,
+        current_user=current_user
+    )
@@ -0,0 +1,144 @@
+import mimetypes
+import re
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from src.conf.config import settings
+from src.services.media_cache import MediaCache, get_media_cache
+from src.services.storage import LocalStorage, Storage, get_storage
+
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+READ_SIZE = 64 * 1024
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    The parse_range function reads a single byte range from a Range header.
+
+    :param header: str: Value of the Range header
+    :param size: int: Size of the file
+    :return: The first and last byte of the range, or None if the header asks for several ranges
+        Raises 416 if the range can't be satisfied
+    :doc-author: Trelent
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range, the last n bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def iter_file(path: Path, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(READ_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def send_file(request: Request, path: Path, etag: str, media_type: str,
+              background: BackgroundTask | None = None) -> Response:
+    """
+    The send_file function answers a request for a file with a strong etag.
+    If-None-Match gets 304 when nothing changed, single byte ranges get 206
+    and whole files are sent with FileResponse, which lets the server use sendfile.
+
+    :param request: Request: Read the conditional and range headers
+    :param path: Path: The file
+    :param etag: str: Strong etag of the file
+    :param media_type: str: Content type of the file
+    :param background: BackgroundTask | None: Run once the response is sent
+    :return: The response
+    :doc-author: Trelent
+    """
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "public, max-age=31536000"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers, background=background)
+
+    size = path.stat().st_size
+    byte_range = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if byte_range and (not if_range or if_range.strip() == etag):
+        parsed = parse_range(byte_range, size)
+        if parsed is not None:
+            start, end = parsed
+            headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+            return StreamingResponse(
+                iter_file(path, start, end - start + 1),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers=headers,
+                background=background
+            )
+    return FileResponse(path, media_type=media_type, headers=headers, background=background)
+
+
+@router.get("/cdn/{path:path}")
+async def get_cdn_media(path: str, request: Request, cache: MediaCache = Depends(get_media_cache)):
+    """
+    The get_cdn_media function proxies an image delivered by cloudinary through a cache on the local disk.
+    The path is the part of the cloudinary url after the cloud name, so
+    https://res.cloudinary.com/<cloud>/image/upload/v1/project_web/abc.jpg is served by
+    /api/media/cdn/image/upload/v1/project_web/abc.jpg and only downloaded from cloudinary once.
+    The proxy is only served when settings.media_proxy_enabled is set. The entry stays pinned in the cache
+    until the response is sent, so it can't be evicted in the middle of it.
+
+    :param path: str: Path of the image on cloudinary
+    :param request: Request: Read the conditional and range headers
+    :param cache: MediaCache: The media cache
+    :return: The content of the image
+    :doc-author: Trelent
+    """
+    if not settings.media_proxy_enabled or not path.startswith("image/upload/") or ".." in path.split("/"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    entry = await cache.acquire(path)
+    try:
+        return send_file(request, entry.path, entry.etag, entry.media_type, BackgroundTask(cache.release, entry))
+    except BaseException:
+        cache.release(entry)
+        raise
+
+
+@router.get("/{key:path}")
+async def get_media(key: str, request: Request, storage: Storage = Depends(get_storage)):
+    """
+    The get_media function serves a file of the local storage.
+
+    :param key: str: Public id of the asset followed by its extension
+    :param request: Request: Read the conditional and range headers
+    :param storage: Storage: The configured storage
+    :return: The content of the file
+    :doc-author: Trelent
+    """
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    path = storage.resolve(key)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    etag = await run_in_threadpool(storage.etag, path)
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return send_file(request, path, etag, media_type)
@@ -1,11 +1,11 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from src.database.db import get_db
 from src.database.models import User, Post
 from src.services.auth import auth_service
-from src.schemas import RatingCreate, RatingResponse
-from src.repository.ratings import create_rating, get_ratings, delete_rating, calculate_average_rating
+from src.schemas import LeaderboardResponse, RatingCreate, RatingResponse
+from src.repository.ratings import create_rating, get_ratings, delete_rating, calculate_average_rating, get_leaderboard
 
 
 router = APIRouter(prefix="/ratings", tags=["ratings"])
@@ -34,6 +34,31 @@ async def rate_image(
     return new_rating
 
 
+# declared before /{image_id}, which would match "leaderboard" as an image id
+@router.get("/leaderboard", response_model=LeaderboardResponse, summary="Get the top rated or hot posts")
+async def get_rating_leaderboard(
+        kind: Literal["top", "hot"] = "top",
+        limit: int = Query(20, ge=1, le=100),
+        cursor: str | None = None,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    The get_rating_leaderboard function returns the best rated posts, or the posts getting many good
+    ratings while they are new. Rankings are recomputed every few minutes, so new ratings show up late.
+    To get the next page pass the next_cursor of the response as cursor.
+
+    :param kind: str: &quot;top&quot; for the best rated posts, &quot;hot&quot; for the currently hot ones
+    :param limit: int: Maximum number of posts to return
+    :param cursor: str | None: Cursor of the page, omitted for the first page
+    :param db: Session: Pass the database session to the function
+    :param current_user: User: Get the current user
+    :return: The posts of the page, best first, and the cursor of the next page
+    :doc-author: Trelent
+    """
+    return await get_leaderboard(kind, limit, cursor, db)
+
+
 @router.get("/{image_id}", response_model=List[RatingResponse], summary="Get all ratings for an image")
 async def get_image_ratings(
         image_id: int,
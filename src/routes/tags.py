@@ -0,0 +1,52 @@
+from typing import List, Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from src.database.db import get_db
+from src.database.models import User
+from src.schemas import TagCompletion, TrendingTag
+from src.services.auth import auth_service
+from src.services.autocomplete import MAX_COMPLETIONS, load_completions, tag_completions
+from src.services.trending import MAX_TOP, trending_tags
+
+
+router = APIRouter(prefix="/tags", tags=["tags"])
+
+
+@router.get("/trending", response_model=List[TrendingTag])
+async def get_trending_tags(
+    window: Literal["1h", "24h", "7d"] = "24h",
+    limit: int = Query(10, ge=1, le=MAX_TOP),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The get_trending_tags function returns the hashtags used by the most posts created in the last hour, day or week.
+
+    :param window: str: The period, 1h, 24h or 7d
+    :param limit: int: Maximum number of hashtags to return
+    :param current_user: User: Get the current user from the database
+    :return: The hashtags with their number of posts, most used first
+    :doc-author: Trelent
+    """
+    return trending_tags.top(window, limit)
+
+
+@router.get("/autocomplete", response_model=List[TagCompletion])
+async def autocomplete_tags(
+    q: str = Query(min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=MAX_COMPLETIONS),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The autocomplete_tags function returns the hashtags starting with the typed text, ignoring case.
+
+    :param q: str: Start of the hashtag
+    :param limit: int: Maximum number of hashtags to return
+    :param db: Session: Pass the database session, used to load the index on first use
+    :param current_user: User: Get the current user from the database
+    :return: The hashtags with their number of posts, most used first
+    :doc-author: Trelent
+    """
+    if not tag_completions.loaded:
+        load_completions(db)
+    return [{"name": name, "count": count} for _, name, count in tag_completions.complete(q, limit)]
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from typing import List
+
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
+from src.repository import follows as repository_follows
 from src.services.auth import auth_service
-from src.conf.config import settings
-from src.schemas import UserDb, UserUpdate
+from src.services.assets import schedule_asset_removal, get_public_id_from_url
+from src.services.storage import storage
+from src.services.autocomplete import MAX_COMPLETIONS, load_completions, user_completions
+from src.schemas import UserDb, UserUpdate, FollowResponse, UserCompletion
 
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -33,7 +36,7 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
                              db: Session = Depends(get_db)):
     """
     The update_avatar_user function takes in a file, current_user and db as parameters.
-    The function then uploads the file to cloudinary using the username of the user as its public id.
+    The function then uploads the file to the storage using the username of the user as its public id.
     It then builds a url for that image with specific dimensions and crops it to fill those dimensions. 
     Finally, it updates the avatar field in our database with this new url.
     
@@ -43,20 +46,40 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     :return: The updated user object
     :doc-author: Trelent
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-    
-    r = cloudinary.uploader.upload(file.file, public_id=f'contacts/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'contacts/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    public_id = f'contacts/{current_user.username}'
+    old_public_id = get_public_id_from_url(current_user.avatar)
+    src_url = storage.save(file.file, public_id, transformation={"width": 250, "height": 250, "crop": "fill"})
+    if old_public_id != public_id:
+        schedule_asset_removal(db, [old_public_id])
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
 
 
+# declared before /{username}, which would match the same path
+@router.get("/autocomplete", response_model=List[UserCompletion])
+async def autocomplete_users(
+    q: str = Query(min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=MAX_COMPLETIONS),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The autocomplete_users function returns the users whose username starts with the typed text, ignoring case.
+
+    :param q: str: Start of the username
+    :param limit: int: Maximum number of users to return
+    :param db: Session: Pass the database session, used to load the index on first use
+    :param current_user: User: Get the current user from the database
+    :return: The users with their number of followers, most followed first
+    :doc-author: Trelent
+    """
+    if not user_completions.loaded:
+        load_completions(db)
+    return [
+        {"id": user_id, "username": username, "followers_count": followers_count}
+        for user_id, username, followers_count in user_completions.complete(q, limit)
+    ]
+
+
 @router.get("/{username}", response_model=UserDb)
 async def get_user_by_username(username: str, db: Session = Depends(get_db)):
     """
@@ -89,4 +112,34 @@ async def update_my_profile(user_update: UserUpdate, db: Session = Depends(get_d
     updated_user = await repository_users.update_user(current_user.id, user_update, db)
     if not updated_user:
         raise HTTPException(status_code=404, detail="User not found")
-    return updated_user
\ No newline at end of file
+    return updated_user
+
+@router.post("/{user_id}/follow", response_model=FollowResponse)
+async def follow_user(user_id: int, db: Session = Depends(get_db),
+                      current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The follow_user function makes the current user follow another user,
+    whose posts then appear in the home timeline of the current user.
+
+    :param user_id: int: Id of the user to follow
+    :param db: Session: Get the database session
+    :param current_user: User: Get the current user
+    :return: The id and the number of followers of the followed user
+    :doc-author: Trelent
+    """
+    return await repository_follows.follow_user(user_id, current_user, db)
+
+
+@router.delete("/{user_id}/follow", response_model=FollowResponse)
+async def unfollow_user(user_id: int, db: Session = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The unfollow_user function makes the current user stop following another user.
+
+    :param user_id: int: Id of the followed user
+    :param db: Session: Get the database session
+    :param current_user: User: Get the current user
+    :return: The id and the number of followers of the unfollowed user
+    :doc-author: Trelent
+    """
+    return await repository_follows.unfollow_user(user_id, current_user, db)
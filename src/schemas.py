@@ -75,6 +75,11 @@ class GetCommentResponce(BaseModel):
     user_id: int
 
 
+class ImageComments(BaseModel):
+    image_id: int
+    comments: list[GetCommentResponce]
+
+
 class PutCommentReques(BaseModel):
     comment_id: int
     new_text: str
@@ -102,6 +107,123 @@ class ImageResponce(BaseModel):
     author_id: int
     qr_code_url: str
     created_dt: datetime
+    variants: dict[str, str] | None = None
+    width: int | None = None
+    height: int | None = None
+    image_format: str | None = None
+    byte_size: int | None = None
+    taken_at: datetime | None = None
+    blurhash: str | None = None
+
+
+class BulkUploadResult(BaseModel):
+    filename: str | None
+    status: str
+    post: ImageResponce | None = None
+    error: str | None = None
+
+
+class FeedPost(BaseModel):
+    id: int
+    description: str | None
+    image_url: str
+    variants: dict[str, str] | None = None
+    blurhash: str | None = None
+    width: int | None = None
+    height: int | None = None
+    author_id: int
+    created_dt: datetime
+
+
+class FeedResponse(BaseModel):
+    items: list[FeedPost]
+    next_cursor: int | None = None
+
+
+class SearchPost(FeedPost):
+    score: float
+
+
+class PostAuthor(BaseModel):
+    id: int
+    username: str | None
+    avatar: str | None = None
+    followers_count: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+class RatingSummary(BaseModel):
+    count: int
+    average: float
+
+
+class PostDetail(FeedPost):
+    qr_code_url: str | None = None
+    image_format: str | None = None
+    byte_size: int | None = None
+    taken_at: datetime | None = None
+    author: PostAuthor | None
+    hashtags: list[str]
+    rating: RatingSummary
+    comment_count: int
+    comments: list[GetCommentResponce]
+
+
+class RelatedPost(FeedPost):
+    score: float
+
+
+class SearchResponse(BaseModel):
+    items: list[SearchPost]
+    next_cursor: str | None = None
+
+
+class TagQueryResponse(BaseModel):
+    count: int
+    items: list[FeedPost]
+    next_cursor: int | None = None
+
+
+class LeaderboardPost(FeedPost):
+    rating_count: int
+    average_rating: float
+    score: float
+
+
+class LeaderboardResponse(BaseModel):
+    items: list[LeaderboardPost]
+    next_cursor: str | None = None
+
+
+class TrendingTag(BaseModel):
+    name: str
+    count: int
+
+
+class TagCompletion(BaseModel):
+    name: str
+    count: int
+
+
+class UserCompletion(BaseModel):
+    id: int
+    username: str
+    followers_count: int
+
+
+class FollowResponse(BaseModel):
+    user_id: int
+    followers_count: int
+
+
+class SimilarImageResponse(BaseModel):
+    id: int
+    description: str | None
+    image_url: str
+    author_id: int
+    distance: int
 
 
 class CropImageRequest(BaseModel):
@@ -121,6 +243,55 @@ class EffectImageRequest(BaseModel):
     image_id: int
     description: str
 
+
+class TransformPreviewResponse(BaseModel):
+    image_id: int
+    image_url: str
+
+
+class CommitTransformationRequest(BaseModel):
+    image_id: int
+    image_url: str
+    description: str
+
+class UploadSessionCreate(BaseModel):
+    description: str
+    hashtags: list[str] = Field(default=[], max_length=5)
+    total_size: int = Field(gt=0)
+    sha256: str = Field(pattern="^[0-9a-fA-F]{64}$")
+
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    total_size: int
+    received: int
+    chunk_size: int
+    expires_at: datetime
+    post_id: int | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class DirectUploadRequest(BaseModel):
+    description: str
+    hashtags: list[str] = Field(default=[], max_length=5)
+
+
+class DirectUploadResponse(BaseModel):
+    upload_url: str
+    params: dict[str, str | int]
+    upload_token: str
+    expires_in: int
+
+
+class DirectUploadComplete(BaseModel):
+    upload_token: str
+    public_id: str
+    version: int
+    signature: str
+
+
 class FirstAdminModel(UserModel):
     id: int = 1
     role: UserRole = UserRole.admin
@@ -0,0 +1,196 @@
+"""
+Garbage collector for cloudinary assets that no post references any more.
+
+Usage: python -m src.services.asset_gc [--dry-run] [--grace-hours 24] [--rate 2]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator
+
+import cloudinary
+import cloudinary.api
+import cloudinary.search
+from sqlalchemy import func, literal_column, union
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Post
+from src.services.storage import CloudinaryStorage
+
+
+def iter_storage_assets(folder: str, page_size: int = 500, service: cloudinary = cloudinary) -> Iterator[tuple[str, datetime]]:
+    """
+    The iter_storage_assets function streams the assets of the folder sorted by public id, one page at a time.
+
+    :param folder: str: Cloudinary folder to list
+    :param page_size: int: Number of assets fetched per request
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: An iterator of (public_id, created_at) tuples
+    :doc-author: Trelent
+    """
+    cursor = None
+    while True:
+        search = service.Search().expression(f"public_id:{folder}/*").sort_by("public_id", "asc").max_results(page_size)
+        if cursor:
+            search = search.next_cursor(cursor)
+        page = search.execute()
+        for resource in page.get("resources", []):
+            created_at = datetime.fromisoformat(resource["created_at"].replace("Z", "+00:00"))
+            yield resource["public_id"], created_at
+        cursor = page.get("next_cursor")
+        if not cursor:
+            return
+
+
+def _public_id_column(column, folder: str, dialect: str):
+    marker = f"/{folder}/"
+    position = func.instr(column, marker) if dialect == "sqlite" else func.strpos(column, marker)
+    key = func.substr(column, position + 1)
+    if dialect == "postgresql":
+        key = key.collate("C")
+    return key.label("public_id")
+
+
+def iter_referenced_public_ids(db: Session, folder: str, batch_size: int = 1000) -> Iterator[str]:
+    """
+    The iter_referenced_public_ids function streams the public ids used by image_url and qr_code_url
+    of all posts, sorted and without duplicates. Sorting is done by the database in byte order,
+    so it matches the order of the storage listing.
+
+    :param db: Session: Pass the database session to the function
+    :param folder: str: Cloudinary folder of the assets
+    :param batch_size: int: Number of rows fetched at once
+    :return: An iterator of public ids
+    :doc-author: Trelent
+    """
+    dialect = db.get_bind().dialect.name
+    queries = [
+        db.query(_public_id_column(column, folder, dialect)).filter(column.contains(f"/{folder}/")).statement
+        for column in (Post.image_url, Post.qr_code_url)
+    ]
+    statement = union(*queries).order_by(literal_column("public_id"))
+    rows = db.execute(statement, execution_options={"yield_per": batch_size, "stream_results": True})
+    previous = None
+    for (public_id,) in rows:
+        # transformed posts reference the asset without the file extension
+        if "." in public_id.rsplit("/", 1)[-1]:
+            public_id = public_id.rsplit(".", 1)[0]
+        if public_id != previous:
+            yield public_id
+            previous = public_id
+
+
+def find_orphans(
+    storage: Iterator[tuple[str, datetime]],
+    referenced: Iterator[str],
+    created_before: datetime
+) -> Iterator[str]:
+    """
+    The find_orphans function merges two sorted streams and yields the assets nobody references.
+    Only one item of each stream is held in memory. Assets created after created_before are skipped,
+    they may belong to an upload whose post is not committed yet.
+
+    :param storage: Iterator[tuple[str, datetime]]: Assets sorted by public id
+    :param referenced: Iterator[str]: Referenced public ids, sorted
+    :param created_before: datetime: Only assets older than this are reported
+    :return: An iterator of orphaned public ids
+    :doc-author: Trelent
+    """
+    reference = next(referenced, None)
+    last_asset = None
+    for public_id, created_at in storage:
+        if last_asset is not None and public_id < last_asset:
+            raise RuntimeError("Storage listing is not sorted by public id, aborting")
+        last_asset = public_id
+        while reference is not None and reference < public_id:
+            previous, reference = reference, next(referenced, None)
+            if reference is not None and reference < previous:
+                raise RuntimeError("Referenced public ids are not sorted, aborting")
+        if public_id != reference and created_at < created_before:
+            yield public_id
+
+
+def collect_garbage(
+    db: Session,
+    dry_run: bool = True,
+    grace_period: timedelta = timedelta(hours=24),
+    rate: float = 2.0,
+    on_orphan: Callable[[str], None] | None = None,
+    service: cloudinary = cloudinary
+) -> dict:
+    """
+    The collect_garbage function deletes the assets of settings.cloudinary_folder_name that no post references.
+    Orphans are deleted in bulk calls of CloudinaryStorage.DELETE_BATCH_SIZE assets, at most rate calls per second.
+
+    :param db: Session: Pass the database session to the function
+    :param dry_run: bool: Only report the orphans without deleting them
+    :param grace_period: timedelta: Assets younger than this are never deleted
+    :param rate: float: Maximum number of delete calls per second
+    :param on_orphan: Callable[[str], None] | None: Called with every orphaned public id, used for the report
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: A report with the number of orphaned and deleted assets
+    :doc-author: Trelent
+    """
+    folder = settings.cloudinary_folder_name
+    created_before = datetime.now(timezone.utc) - grace_period
+    orphans = find_orphans(
+        iter_storage_assets(folder, service=service),
+        iter_referenced_public_ids(db, folder),
+        created_before
+    )
+    report = {"orphans": 0, "deleted": 0}
+    batch = []
+    last_call = 0.0
+
+    def flush():
+        nonlocal batch, last_call
+        wait = last_call + 1 / rate - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        service.api.delete_resources(batch)
+        last_call = time.monotonic()
+        report["deleted"] += len(batch)
+        batch = []
+
+    for public_id in orphans:
+        report["orphans"] += 1
+        if on_orphan:
+            on_orphan(public_id)
+        if dry_run:
+            continue
+        batch.append(public_id)
+        if len(batch) == CloudinaryStorage.DELETE_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete cloudinary assets that no post references.")
+    parser.add_argument("--dry-run", action="store_true", help="only list the orphaned assets")
+    parser.add_argument("--grace-hours", type=float, default=24, help="never delete assets younger than this")
+    parser.add_argument("--rate", type=float, default=2.0, help="maximum number of delete calls per second")
+    args = parser.parse_args()
+
+    cloudinary.config(
+        cloud_name=settings.cloudinary_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+    db = SessionLocal()
+    try:
+        report = collect_garbage(db, args.dry_run, timedelta(hours=args.grace_hours), args.rate, on_orphan=print)
+    finally:
+        db.close()
+    if args.dry_run:
+        print(f"{report['orphans']} orphaned assets would be deleted")
+    else:
+        print(f"{report['orphans']} orphaned assets, {report['deleted']} deleted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.services.jobs import enqueue_job, job_handler
+from src.services.storage import Storage, storage
+
+
+AVATARS_FOLDER = "contacts"
+DELETE_ASSETS_JOB = "delete_assets"
+# number of delete jobs handled together
+DELETE_BATCH_SIZE = 100
+
+
+def get_public_id_from_url(url: str | None) -> str | None:
+    """
+    The get_public_id_from_url function extracts the public id from the url of one of our assets.
+    Transformation and version segments of cloudinary urls are skipped, the file extension is removed.
+
+    :param url: str | None: Url of the asset
+    :return: The public id, or None if the url doesn't point to one of our folders
+    :doc-author: Trelent
+    """
+    if url and url.startswith(settings.local_storage_url.rstrip("/") + "/"):
+        public_id = url[len(settings.local_storage_url.rstrip("/")) + 1:].split("?")[0]
+        return public_id.rsplit(".", 1)[0] if "." in public_id.rsplit("/", 1)[-1] else public_id
+    if not url or "/upload/" not in url:
+        return None
+    parts = url.split("?")[0].split("/upload/", 1)[1].split("/")
+    for i, part in enumerate(parts):
+        if part in (settings.cloudinary_folder_name, AVATARS_FOLDER) and i < len(parts) - 1:
+            public_id = "/".join(parts[i:])
+            return public_id.rsplit(".", 1)[0] if "." in parts[-1] else public_id
+    return None
+
+
+def schedule_asset_removal(db: Session, public_ids: list[str | None]) -> None:
+    """
+    The schedule_asset_removal function adds a job that removes the assets from the storage.
+    The job is only added to the session, so it is committed together with the change
+    that made the assets unused.
+
+    :param db: Session: Pass the database session to the function
+    :param public_ids: list[str | None]: Public ids of the assets, None values are ignored
+    :return: None
+    :doc-author: Trelent
+    """
+    public_ids = [public_id for public_id in public_ids if public_id]
+    if public_ids:
+        enqueue_job(db, DELETE_ASSETS_JOB, {"public_ids": public_ids}, commit=False)
+
+
+@job_handler(DELETE_ASSETS_JOB, batch_size=DELETE_BATCH_SIZE)
+async def delete_assets(payloads: list[dict], backend: Storage | None = None) -> None:
+    """
+    The delete_assets function removes the assets of a batch of jobs, with bulk delete calls on cloudinary.
+    Assets that are already gone don't fail the job.
+
+    :param payloads: list[dict]: Payloads of the claimed jobs
+    :param backend: Storage | None: The storage, defaults to the configured one
+    :return: None
+    :doc-author: Trelent
+    """
+    public_ids = [public_id for payload in payloads for public_id in payload["public_ids"]]
+    await run_in_threadpool((backend or storage).delete, public_ids)
@@ -164,6 +164,40 @@ class Auth:
         token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return token
     
+    def create_upload_token(self, data: dict, expires_delta: float):
+        """
+        The create_upload_token function creates a short-lived token describing a direct upload.
+        It is given to the client together with the signed upload parameters and sent back when the upload is complete.
+
+        :param self: Represent the instance of the class
+        :param data: dict: The user, public id and post fields of the upload
+        :param expires_delta: float: Number of seconds the token is valid
+        :return: A string that contains the encoded upload token
+        :doc-author: Trelent
+        """
+        to_encode = data.copy()
+        expire = datetime.utcnow() + timedelta(seconds=expires_delta)
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "upload_token"})
+        return jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+
+    def decode_upload_token(self, token: str) -> dict:
+        """
+        The decode_upload_token function returns the claims of a token created by create_upload_token.
+        Expired tokens and tokens of another scope raise a 401 error.
+
+        :param self: Represent the instance of the class
+        :param token: str: The upload token
+        :return: The claims of the token
+        :doc-author: Trelent
+        """
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid upload token')
+        if payload.get('scope') != 'upload_token':
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
+        return payload
+
     async def get_email_from_token(self, token: str):
         """
         The get_email_from_token function takes a token as an argument and returns the email address associated with that token.
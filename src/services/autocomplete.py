@@ -0,0 +1,276 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import Iterable
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.base import NO_VALUE
+
+from src.database.models import Hashtag, Post, User, post_hashtags
+
+
+# the completions of a prefix are kept once more than this many values start with it
+SCAN_LIMIT = 1000
+MAX_COMPLETIONS = 20
+
+
+def _rank(entry: tuple[int, str, int]) -> tuple:
+    return -entry[2], entry[1].casefold(), entry[0]
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index of names, for typeahead.
+
+    Names are kept in a list sorted by their case folded form, the names starting with a prefix
+    are a slice found with two binary searches and the most popular ones are picked with a heap.
+    Prefixes shared by more than scan_limit names, which would need a long scan, keep their
+    completions in a cache, which is updated in place when names are added.
+    Entries are (id, name, weight) tuples, heavier entries come first.
+    """
+
+    def __init__(self, limit: int = MAX_COMPLETIONS, scan_limit: int = SCAN_LIMIT):
+        self.limit = limit
+        self.scan_limit = scan_limit
+        self._keys: list[str] = []
+        self._entries: list[tuple[int, str, int]] = []
+        self._cache: dict[str, list[tuple[int, str, int]]] = {}
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """
+        The clear function empties the index, it is loaded again on next use.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._keys = []
+        self._entries = []
+        self._cache = {}
+        self.loaded = False
+
+    def load(self, entries: Iterable[tuple[int, str, int]]) -> None:
+        """
+        The load function replaces the content of the index.
+
+        :param entries: Iterable[tuple[int, str, int]]: Id, name and weight of every entry
+        :return: None
+        :doc-author: Trelent
+        """
+        items = sorted((name.casefold(), entry_id, name, weight) for entry_id, name, weight in entries if name)
+        self._keys = [key for key, _, _, _ in items]
+        self._entries = [(entry_id, name, weight) for _, entry_id, name, weight in items]
+        self._cache = {}
+        self.loaded = True
+
+    def _top(self, prefix: str) -> list[tuple[int, str, int]]:
+        cached = self._cache.get(prefix)
+        if cached is not None:
+            return cached
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + "\U0010ffff", start)
+        top = self._top_of_range(start, end)
+        if end - start > self.scan_limit:
+            self._cache[prefix] = top
+        return top
+
+    def _top_of_range(self, start: int, end: int) -> list[tuple[int, str, int]]:
+        # nlargest keeps the alphabetical order of entries with the same weight
+        return heapq.nlargest(self.limit, (self._entries[i] for i in range(start, end)), key=itemgetter(2))
+
+    def complete(self, prefix: str, limit: int) -> list[tuple[int, str, int]]:
+        """
+        The complete function returns the heaviest entries whose name starts with the prefix, ignoring case.
+
+        :param prefix: str: Start of the name
+        :param limit: int: Maximum number of entries, up to the limit of the index
+        :return: A list of (id, name, weight) tuples, heaviest first, then in alphabetical order
+        :doc-author: Trelent
+        """
+        prefix = prefix.casefold()
+        if not prefix:
+            return []
+        return self._top(prefix)[:limit]
+
+    def add(self, entry_id: int, name: str, weight: int = 0) -> None:
+        """
+        The add function puts a new entry into the index.
+
+        :param entry_id: int: Id of the entry
+        :param name: str: Name of the entry
+        :param weight: int: Popularity of the entry
+        :return: None
+        :doc-author: Trelent
+        """
+        if not self.loaded or not name:
+            return
+        key = name.casefold()
+        entry = (entry_id, name, weight)
+        index = bisect_right(self._keys, key)
+        self._keys.insert(index, key)
+        self._entries.insert(index, entry)
+        for end in range(1, len(key) + 1):
+            cached = self._cache.get(key[:end])
+            if cached is not None:
+                insort(cached, entry, key=_rank)
+                del cached[self.limit:]
+
+    def remove(self, entry_id: int, name: str) -> None:
+        """
+        The remove function drops an entry from the index.
+
+        :param entry_id: int: Id of the entry
+        :param name: str: Name of the entry
+        :return: None
+        :doc-author: Trelent
+        """
+        if not self.loaded or not name:
+            return
+        key = name.casefold()
+        for index in range(bisect_left(self._keys, key), bisect_right(self._keys, key)):
+            if self._entries[index][0] == entry_id:
+                del self._keys[index]
+                del self._entries[index]
+                break
+        # a cache that held the entry misses its next best completion, it is computed again
+        for end in range(1, len(key) + 1):
+            cached = self._cache.get(key[:end])
+            if cached is not None and any(cached_id == entry_id for cached_id, _, _ in cached):
+                del self._cache[key[:end]]
+
+    def _reweigh(self, entry_id: int, name: str, weight_of) -> None:
+        if not self.loaded or not name:
+            return
+        key = name.casefold()
+        for index in range(bisect_left(self._keys, key), bisect_right(self._keys, key)):
+            old = self._entries[index]
+            if old[0] == entry_id:
+                break
+        else:
+            return
+        entry = (entry_id, old[1], weight_of(old[2]))
+        self._entries[index] = entry
+        for end in range(1, len(key) + 1):
+            cached = self._cache.get(key[:end])
+            if cached is None:
+                continue
+            position = next((i for i, (cached_id, _, _) in enumerate(cached) if cached_id == entry_id), None)
+            if position is not None:
+                if entry[2] < old[2] and len(cached) == self.limit:
+                    # an entry left out of the cache may now rank higher, it is computed again
+                    del self._cache[key[:end]]
+                    continue
+                del cached[position]
+            insort(cached, entry, key=_rank)
+            del cached[self.limit:]
+
+    def set_weight(self, entry_id: int, name: str, weight: int) -> None:
+        """
+        The set_weight function changes the popularity of an entry.
+        Cached completions are updated in place unless the entry got lighter.
+
+        :param entry_id: int: Id of the entry
+        :param name: str: Name of the entry
+        :param weight: int: New popularity of the entry
+        :return: None
+        :doc-author: Trelent
+        """
+        self._reweigh(entry_id, name, lambda _: weight)
+
+    def add_weight(self, entry_id: int, name: str, delta: int) -> None:
+        """
+        The add_weight function adds delta to the popularity of an entry, see set_weight.
+
+        :param entry_id: int: Id of the entry
+        :param name: str: Name of the entry
+        :param delta: int: Change of the popularity, negative to decrease it
+        :return: None
+        :doc-author: Trelent
+        """
+        self._reweigh(entry_id, name, lambda weight: weight + delta)
+
+
+tag_completions = PrefixIndex()
+user_completions = PrefixIndex()
+
+
+def load_completions(db: Session) -> None:
+    """
+    The load_completions function fills the hashtag and username indexes from the database.
+    Hashtags are weighted by their number of posts and users by their number of followers.
+    Banned users are left out.
+
+    :param db: Session: Pass the database session to the function
+    :return: None
+    :doc-author: Trelent
+    """
+    tag_completions.load(db.query(Hashtag.id, Hashtag.name, func.count(post_hashtags.c.post_id)).outerjoin(
+        post_hashtags, post_hashtags.c.hashtag_id == Hashtag.id
+    ).group_by(Hashtag.id, Hashtag.name))
+    user_completions.load(db.query(User.id, User.username, User.followers_count).filter(User.is_active.isnot(False)))
+
+
+def _loaded_hashtags(post: Post) -> list[Hashtag]:
+    # the hashtags of a deleted post can't be loaded anymore, they are only counted when already loaded
+    hashtags = inspect(post).attrs.hashtags.loaded_value
+    return [] if hashtags is NO_VALUE else list(hashtags)
+
+
+def _changed(obj, *attributes: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_completion_changes(session: Session, flush_context) -> None:
+    # the indexes are only changed once the transaction is committed
+    changes = session.info.setdefault("completion_changes", [])
+    # hashtags are added before the posts using them count
+    post_changes = []
+    for obj in session.new:
+        if isinstance(obj, Hashtag):
+            changes.append((tag_completions.add, obj.id, obj.name, 0))
+        elif isinstance(obj, User) and obj.is_active is not False:
+            changes.append((user_completions.add, obj.id, obj.username, obj.followers_count or 0))
+        elif isinstance(obj, Post):
+            post_changes.extend((tag_completions.add_weight, tag.id, tag.name, 1) for tag in _loaded_hashtags(obj))
+    changes.extend(post_changes)
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj, "username", "is_active"):
+            history = inspect(obj).attrs.username.history
+            old_username = history.deleted[0] if history.deleted else obj.username
+            changes.append((user_completions.remove, obj.id, old_username))
+            if obj.is_active is not False:
+                changes.append((user_completions.add, obj.id, obj.username, obj.followers_count or 0))
+    for obj in session.deleted:
+        if isinstance(obj, Hashtag):
+            changes.append((tag_completions.remove, obj.id, obj.name))
+        elif isinstance(obj, User):
+            changes.append((user_completions.remove, obj.id, obj.username))
+        elif isinstance(obj, Post):
+            changes.extend((tag_completions.add_weight, tag.id, tag.name, -1) for tag in _loaded_hashtags(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def apply_completion_changes(session: Session) -> None:
+    """
+    The apply_completion_changes function updates the hashtag and username indexes with the
+    hashtags and users created, renamed, banned or deleted by the committed transaction,
+    and the number of posts of the hashtags of the created and deleted posts.
+    Changes made with Query.update and Query.delete are not seen, follower counts are set by the follows repository.
+
+    :param session: Session: The committed session
+    :return: None
+    :doc-author: Trelent
+    """
+    for change, *args in session.info.pop("completion_changes", []):
+        change(*args)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_completion_changes(session: Session) -> None:
+    session.info.pop("completion_changes", None)
@@ -0,0 +1,139 @@
+import hmac
+import time
+import uuid
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.utils
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import auth_service
+from src.utils.image_variants import get_eager_transformations
+
+
+# cloudinary names of the formats of IMAGE_SIGNATURES, the only ones accepted by uploads through the API
+ALLOWED_FORMATS = ("jpg", "png", "gif", "bmp", "tiff", "webp")
+
+
+def create_upload_params(user: User, description: str, hashtags: list[str], service: cloudinary = cloudinary) -> dict:
+    """
+    The create_upload_params function returns everything a client needs to upload an image straight to cloudinary:
+    the upload url, the signed form parameters and a token that identifies the upload when it is completed.
+    The signature fixes the public id, the eager transformations and the same size and format limits
+    as uploads through the API, so the client can't change them.
+
+    :param user: User: The author of the future post
+    :param description: str: Description of the future post
+    :param hashtags: list[str]: Names of the tags of the future post
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: A dictionary with upload_url, params, upload_token and expires_in
+        Raises 501 if the images are not stored on cloudinary
+    :doc-author: Trelent
+    """
+    if settings.storage_backend != "cloudinary":
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="Direct uploads need the cloudinary storage")
+    public_id = f'{settings.cloudinary_folder_name}/{uuid.uuid4()}'
+    params = {
+        "public_id": public_id,
+        "timestamp": int(time.time()),
+        "eager": service.utils.build_eager(get_eager_transformations()),
+        "eager_async": "true",
+        "allowed_formats": ",".join(ALLOWED_FORMATS),
+        "max_file_size": settings.max_upload_bytes,
+    }
+    params["signature"] = service.utils.api_sign_request(params, settings.cloudinary_api_secret)
+    params["api_key"] = settings.cloudinary_api_key
+    upload_token = auth_service.create_upload_token(
+        {"sub": user.email, "public_id": public_id, "description": description, "hashtags": hashtags},
+        settings.direct_upload_ttl
+    )
+    return {
+        "upload_url": service.utils.cloudinary_api_url("upload", cloud_name=settings.cloudinary_name),
+        "params": params,
+        "upload_token": upload_token,
+        "expires_in": settings.direct_upload_ttl,
+    }
+
+
+def verify_upload(upload_token: str, public_id: str, version: int, signature: str, user: User,
+                  service: cloudinary = cloudinary) -> dict:
+    """
+    The verify_upload function checks that a completed direct upload is the one announced by the token
+    and that its result was signed by cloudinary.
+
+    :param upload_token: str: Token returned by create_upload_params
+    :param public_id: str: Public id from the cloudinary upload response
+    :param version: int: Version from the cloudinary upload response
+    :param signature: str: Signature from the cloudinary upload response
+    :param user: User: The user completing the upload
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: The claims of the upload token
+    :doc-author: Trelent
+    """
+    claims = auth_service.decode_upload_token(upload_token)
+    if claims["sub"] != user.email:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    if claims["public_id"] != public_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload doesn't match the token")
+    expected = service.utils.api_sign_request(
+        {"public_id": public_id, "version": version}, settings.cloudinary_api_secret
+    )
+    if not hmac.compare_digest(signature.encode(), expected.encode()):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid upload signature")
+    return claims
+
+
+def fetch_upload_resource(public_id: str, version: int, service: cloudinary = cloudinary) -> dict:
+    """
+    The fetch_upload_resource function reads the stored image of a direct upload from the cloudinary admin api,
+    so its metadata comes from cloudinary and not from the client. Images above settings.max_upload_bytes
+    or in another format than ALLOWED_FORMATS are refused, they are removed by the orphaned asset collector.
+
+    :param public_id: str: Public id of the image
+    :param version: int: Version from the signed upload response
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: The resource, with its format, width, height and bytes
+    :doc-author: Trelent
+    """
+    try:
+        resource = service.api.resource(
+            public_id,
+            cloud_name=settings.cloudinary_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret
+        )
+    except service.exceptions.NotFound:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload not found")
+    if resource.get("version") != version:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload doesn't match the token")
+    if resource.get("bytes", 0) > settings.max_upload_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+    if resource.get("format") not in ALLOWED_FORMATS:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+    return resource
+
+
+def build_upload_url(public_id: str, version: int, image_format: str | None, service: cloudinary = cloudinary) -> str:
+    """
+    The build_upload_url function builds the delivery url of an uploaded image.
+    The url sent by the client is not signed by cloudinary, so it is rebuilt from the signed fields.
+
+    :param public_id: str: Public id of the image
+    :param version: int: Version of the image
+    :param image_format: str | None: File format of the image
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: The https url of the image
+    :doc-author: Trelent
+    """
+    url, _ = service.utils.cloudinary_url(
+        public_id,
+        version=version,
+        format=image_format,
+        cloud_name=settings.cloudinary_name,
+        secure=True
+    )
+    return url
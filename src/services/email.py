@@ -1,51 +1,103 @@
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
+from sqlalchemy.orm import Session
 
 from src.services.auth import auth_service
+from src.services.jobs import enqueue_job, job_handler
+from src.services.smtp_pool import SMTPPool
 from src.conf.config import settings
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Desired Name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+SEND_EMAIL_JOB = "send_email"
+MAIL_FROM_NAME = "Desired Name"
+
+# the template is compiled once, only the per-user values are rendered for each message
+templates = Environment(
+    loader=FileSystemLoader(Path(__file__).parent / 'templates'),
+    autoescape=select_autoescape(["html"])
+)
+confirmation_template = templates.get_template("email_template.html")
+
+smtp_pool = SMTPPool(
+    hostname=settings.mail_server,
+    port=settings.mail_port,
+    username=settings.mail_username,
+    password=settings.mail_password,
+    use_tls=settings.mail_use_tls,
+    size=settings.mail_pool_size
 )
 
 
+def build_confirmation_email(email: EmailStr, username: str, host: str) -> EmailMessage:
+    """
+    The build_confirmation_email function renders the confirmation email of the user.
+
+    :param email: EmailStr: Specify the email address of the recipient
+    :param username: str: Pass the username to the email template
+    :param host: str: Pass the hostname of this server to the email template
+    :return: The message ready to be sent
+    :doc-author: Trelent
+    """
+    token_verification = auth_service.create_email_token({"sub": email})
+    message = EmailMessage()
+    message["Subject"] = "Confirm your email "
+    message["From"] = formataddr((MAIL_FROM_NAME, settings.mail_from))
+    message["To"] = email
+    message.set_content(
+        confirmation_template.render(host=host, username=username, token=token_verification),
+        subtype="html"
+    )
+    return message
+
+
 async def send_email(email: EmailStr, username: str, host: str):
     """
     The send_email function sends an email to the user with a link to confirm their email address.
             The function takes in three parameters:
                 1) An EmailStr object that contains the user's email address.
-                2) A string containing the username of the user who is registering for an account.  This will be used in a template message sent to them via FastMail API.
-                3) A string containing the hostname of this server, which will be used as part of a URL that is sent to them via FastMail API.
+                2) A string containing the username of the user who is registering for an account.  This will be used in a template message sent to them.
+                3) A string containing the hostname of this server, which will be used as part of a URL that is sent to them.
     
     :param email: EmailStr: Specify the email address of the recipient
     :param username: str: Pass the username to the email template
     :param host: str: Pass the hostname of this server to the email template
     :return: A coroutine object
+        Raises aiosmtplib.SMTPException if the message can't be sent
+    :doc-author: Trelent
+    """
+    await smtp_pool.send(build_confirmation_email(email, username, host))
+
+
+def schedule_email(db: Session, email: EmailStr, username: str, host: str) -> None:
+    """
+    The schedule_email function adds a job that sends the confirmation email.
+    Unlike a background task, the job survives a restart of the application and is retried if sending fails.
+
+    :param db: Session: Pass the database session to the function
+    :param email: EmailStr: Specify the email address of the recipient
+    :param username: str: Pass the username to the email template
+    :param host: str: Pass the hostname of this server to the email template
+    :return: None
+    :doc-author: Trelent
+    """
+    enqueue_job(db, SEND_EMAIL_JOB, {"email": email, "username": username, "host": str(host)})
+
+
+@job_handler(SEND_EMAIL_JOB, batch_size=settings.mail_batch_size)
+async def send_email_job(payloads: list[dict]) -> list[Exception | None]:
+    """
+    The send_email_job function sends the confirmation emails of a batch of claimed jobs
+    over the pooled SMTP connections. Only the jobs whose email could not be sent are retried.
+
+    :param payloads: list[dict]: Payloads of the claimed jobs
+    :return: The error of each job, None if its email was sent
     :doc-author: Trelent
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    messages = [
+        build_confirmation_email(payload["email"], payload["username"], payload["host"])
+        for payload in payloads
+    ]
+    return await smtp_pool.send_many(messages)
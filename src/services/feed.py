@@ -0,0 +1,147 @@
+from bisect import bisect_left
+from collections import deque
+
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Post
+
+
+def post_summary(post: Post) -> dict:
+    """
+    The post_summary function returns the fields of a post shown in the feed.
+
+    :param post: Post: The post
+    :return: A dictionary with the fields of the feed item
+    :doc-author: Trelent
+    """
+    return {
+        "id": post.id,
+        "description": post.description,
+        "image_url": post.image_url,
+        "variants": post.variants,
+        "blurhash": post.blurhash,
+        "width": post.width,
+        "height": post.height,
+        "author_id": post.author_id,
+        "created_dt": post.created_dt,
+    }
+
+
+class FeedCache:
+    """
+    In-memory ring buffer with the summaries of the newest posts, oldest first.
+
+    The buffer holds every post with an id of at least floor, so a page whose posts are all newer
+    than floor is answered without a query. Once the buffer is full, adding a post drops the oldest
+    one and moves floor up. Deleted posts are removed from the buffer, which stays complete.
+    Until load is called the buffer is empty and every page is read from the database.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: deque[dict] = deque(maxlen=size)
+        self._ids: deque[int] = deque(maxlen=size)
+        self.floor: int | None = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self) -> None:
+        """
+        The clear function empties the buffer, pages are read from the database until the next load.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._items.clear()
+        self._ids.clear()
+        self.floor = None
+
+    def load(self, db: Session) -> None:
+        """
+        The load function fills the buffer with the newest posts of the database.
+
+        :param db: Session: Pass the database session to the function
+        :return: None
+        :doc-author: Trelent
+        """
+        posts = db.query(Post).order_by(Post.id.desc()).limit(self.size).all()
+        self._items.clear()
+        self._ids.clear()
+        for post in reversed(posts):
+            self._items.append(post_summary(post))
+            self._ids.append(post.id)
+        # fewer posts than the buffer can hold means the buffer has all of them
+        self.floor = posts[-1].id if len(posts) == self.size else 0
+
+    def add(self, post: Post) -> None:
+        """
+        The add function puts a new or edited post into the buffer.
+
+        :param post: Post: The post
+        :return: None
+        :doc-author: Trelent
+        """
+        if self.floor is None or post.id < self.floor:
+            return
+        summary = post_summary(post)
+        if not self._ids or post.id > self._ids[-1]:
+            self._append(summary)
+            return
+        index = bisect_left(self._ids, post.id)
+        if index < len(self._ids) and self._ids[index] == post.id:
+            self._items[index] = summary
+            return
+        # a post committed after a newer one, rare enough for a linear insert
+        if len(self._ids) == self.size:
+            self._drop_oldest()
+            index -= 1
+            if index < 0:
+                return
+        self._items.insert(index, summary)
+        self._ids.insert(index, post.id)
+
+    def _append(self, summary: dict) -> None:
+        if len(self._ids) == self.size:
+            self._drop_oldest()
+        self._items.append(summary)
+        self._ids.append(summary["id"])
+
+    def _drop_oldest(self) -> None:
+        self._items.popleft()
+        self._ids.popleft()
+        self.floor = self._ids[0] if self._ids else self.floor
+
+    def remove(self, post_id: int) -> None:
+        """
+        The remove function drops a deleted post from the buffer.
+
+        :param post_id: int: Id of the post
+        :return: None
+        :doc-author: Trelent
+        """
+        index = bisect_left(self._ids, post_id)
+        if index < len(self._ids) and self._ids[index] == post_id:
+            del self._items[index]
+            del self._ids[index]
+
+    def page(self, before: int | None, limit: int) -> list[dict] | None:
+        """
+        The page function returns the newest posts with an id lower than before.
+
+        :param before: int | None: Id of the last post of the previous page, None for the first page
+        :param limit: int: Maximum number of posts
+        :return: The summaries, newest first, or None if the buffer doesn't hold the whole page
+        :doc-author: Trelent
+        """
+        if self.floor is None:
+            return None
+        end = len(self._ids) if before is None else bisect_left(self._ids, before)
+        start = max(end - limit, 0)
+        if end - start < limit and self.floor > 0:
+            return None
+        return [self._items[i] for i in range(end - 1, start - 1, -1)]
+
+
+feed_cache = FeedCache(settings.feed_cache_size)
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Job, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[list[dict]], Awaitable[list[Exception | None] | None]]
+
+_handlers: dict[str, tuple[JobHandler, int]] = {}
+
+
+def job_handler(kind: str, batch_size: int = 1):
+    """
+    The job_handler decorator registers the coroutine that runs the jobs of the given kind.
+    The handler receives the list of payloads of the claimed jobs. With batch_size above 1
+    the worker claims up to batch_size pending jobs of the kind at once and passes them together.
+    If the handler raises, every job of the batch is retried. A handler can also return a list
+    with the error of each payload (None for success), then only the failed jobs are retried.
+
+    :param kind: str: Name of the job kind
+    :param batch_size: int: Maximum number of jobs handled by one call
+    :return: The decorator
+    :doc-author: Trelent
+    """
+    def decorator(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = (handler, batch_size)
+        return handler
+    return decorator
+
+
+def enqueue_job(db: Session, kind: str, payload: dict, delay: float = 0, max_attempts: int = 5,
+                commit: bool = True) -> Job:
+    """
+    The enqueue_job function stores a new job in the jobs table.
+    With commit=False the job is only added to the session, so it is committed together
+    with the changes that caused it.
+
+    :param db: Session: Pass the database session to the function
+    :param kind: str: Name of the job kind
+    :param payload: dict: JSON serializable arguments of the job
+    :param delay: float: Number of seconds to wait before the job can run
+    :param max_attempts: int: Number of attempts before the job is marked as failed
+    :param commit: bool: Commit the session
+    :return: The new job
+    :doc-author: Trelent
+    """
+    job = Job(
+        kind=kind,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    if commit:
+        db.commit()
+    return job
+
+
+def _runnable(now: datetime):
+    return or_(
+        and_(Job.status == JobStatus.pending, Job.run_at <= now),
+        # the worker that claimed the job died before finishing it
+        and_(Job.status == JobStatus.running, Job.locked_until < now),
+    )
+
+
+class JobWorker:
+    """
+    Pool of asyncio tasks that run the jobs stored in the jobs table.
+
+    A job is claimed by setting a lease (locked_by and locked_until) with a conditional update,
+    so two workers never run the same job. On PostgreSQL the candidates are selected with
+    FOR UPDATE SKIP LOCKED, so concurrent workers don't wait for each other. If a worker dies,
+    the job becomes runnable again when its lease expires. Failed jobs are retried with
+    exponential backoff until max_attempts is reached.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker = SessionLocal,
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        lease: float = 300,
+        retry_delay: float = 5.0
+    ):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.stats = {"done": 0, "retried": 0, "failed": 0, "wait_seconds": 0.0, "run_seconds": 0.0}
+        self._tasks = []
+
+    def claim_jobs(self) -> list[dict]:
+        """
+        The claim_jobs function leases the next runnable job and, if its handler takes batches,
+        more runnable jobs of the same kind.
+
+        :return: A list of claimed jobs as dictionaries, empty if there is nothing to run
+        :doc-author: Trelent
+        """
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        db = self.session_factory()
+        try:
+            first = db.query(Job.id, Job.kind).filter(_runnable(now)).order_by(Job.run_at, Job.id) \
+                .with_for_update(skip_locked=True).first()
+            if first is None:
+                return []
+            _, batch_size = _handlers.get(first.kind, (None, 1))
+            ids = [first.id]
+            if batch_size > 1:
+                ids += [row.id for row in db.query(Job.id).filter(
+                    _runnable(now), Job.kind == first.kind, Job.id != first.id
+                ).order_by(Job.run_at, Job.id).with_for_update(skip_locked=True).limit(batch_size - 1)]
+            db.query(Job).filter(Job.id.in_(ids), _runnable(now)).update({
+                Job.status: JobStatus.running,
+                Job.locked_by: token,
+                Job.locked_until: now + timedelta(seconds=self.lease),
+                Job.attempts: Job.attempts + 1,
+                Job.started_at: now,
+            }, synchronize_session=False)
+            db.commit()
+            jobs = db.query(Job).filter(Job.locked_by == token, Job.status == JobStatus.running).all()
+            return [
+                {"id": job.id, "kind": job.kind, "payload": job.payload, "attempts": job.attempts,
+                 "max_attempts": job.max_attempts, "run_at": job.run_at}
+                for job in jobs
+            ]
+        finally:
+            db.close()
+
+    def finish_jobs(self, jobs: list[dict], error: Exception | None = None) -> None:
+        """
+        The finish_jobs function marks claimed jobs as done, or schedules a retry when the handler failed.
+
+        :param jobs: list[dict]: Jobs returned by claim_jobs
+        :param error: Exception | None: Error raised by the handler
+        :return: None
+        :doc-author: Trelent
+        """
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            for job in jobs:
+                values = {Job.locked_by: None, Job.locked_until: None}
+                if error is None:
+                    values.update({Job.status: JobStatus.done, Job.finished_at: now})
+                    self.stats["done"] += 1
+                elif job["attempts"] < job["max_attempts"]:
+                    delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                    values.update({Job.status: JobStatus.pending, Job.run_at: now + timedelta(seconds=delay),
+                                   Job.last_error: repr(error)})
+                    self.stats["retried"] += 1
+                else:
+                    values.update({Job.status: JobStatus.failed, Job.finished_at: now, Job.last_error: repr(error)})
+                    self.stats["failed"] += 1
+                db.query(Job).filter(Job.id == job["id"]).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def run_once(self) -> bool:
+        """
+        The run_once function claims and runs one job, or one batch of jobs.
+
+        :return: True if a job was run, False if the queue was empty
+        :doc-author: Trelent
+        """
+        jobs = await run_in_threadpool(self.claim_jobs)
+        if not jobs:
+            return False
+        kind = jobs[0]["kind"]
+        started = datetime.utcnow()
+        self.stats["wait_seconds"] += sum((started - job["run_at"]).total_seconds() for job in jobs)
+        over_limit = [job for job in jobs if job["attempts"] > job["max_attempts"]]
+        jobs = [job for job in jobs if job["attempts"] <= job["max_attempts"]]
+        if over_limit:
+            await run_in_threadpool(self.finish_jobs, over_limit, RuntimeError("lease expired too many times"))
+        if not jobs:
+            return True
+        errors = [None] * len(jobs)
+        try:
+            if kind not in _handlers:
+                raise LookupError(f"No handler for job kind '{kind}'")
+            handler, _ = _handlers[kind]
+            results = await handler([job["payload"] for job in jobs])
+            if results is not None:
+                errors = list(results)
+        except Exception as err:
+            logger.warning("Job %s (%s) failed: %r", [job["id"] for job in jobs], kind, err)
+            errors = [err] * len(jobs)
+        self.stats["run_seconds"] += (datetime.utcnow() - started).total_seconds()
+        succeeded = [job for job, error in zip(jobs, errors) if error is None]
+        if succeeded:
+            await run_in_threadpool(self.finish_jobs, succeeded)
+        for job, error in zip(jobs, errors):
+            if error is not None:
+                await run_in_threadpool(self.finish_jobs, [job], error)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not await self.run_once():
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker error")
+                await asyncio.sleep(self.poll_interval)
+
+    async def start(self) -> None:
+        """
+        The start function starts the worker tasks.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the worker tasks. Jobs that were running become runnable again
+        when their lease expires.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_metrics(self, db: Session) -> dict:
+        """
+        The get_metrics function returns the queue depth by kind and status, and the worker statistics.
+
+        :param db: Session: Pass the database session to the function
+        :return: A dictionary with the queue depth, the number of processed jobs and average latencies
+        :doc-author: Trelent
+        """
+        depth = {}
+        rows = db.query(Job.kind, Job.status, func.count(Job.id)).filter(
+            Job.status.in_([JobStatus.pending, JobStatus.running, JobStatus.failed])
+        ).group_by(Job.kind, Job.status)
+        for kind, status, count in rows:
+            depth.setdefault(kind, {})[status.value] = count
+        oldest = db.query(func.min(Job.run_at)).filter(Job.status == JobStatus.pending).scalar()
+        runs = self.stats["done"] + self.stats["retried"] + self.stats["failed"]
+        return {
+            "depth": depth,
+            "oldest_pending_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            "done": self.stats["done"],
+            "retried": self.stats["retried"],
+            "failed": self.stats["failed"],
+            "average_wait_seconds": self.stats["wait_seconds"] / runs if runs else 0.0,
+            "average_run_seconds": self.stats["run_seconds"] / runs if runs else 0.0,
+        }
+
+
+job_worker = JobWorker(concurrency=settings.job_worker_concurrency, poll_interval=settings.job_poll_interval)
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+import httpx
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from src.conf.config import settings
+from src.utils.image_metadata import SIGNATURE_LENGTH, sniff_image_format
+
+
+# downloads of an entry whose file keeps disappearing before it can be acquired
+MAX_ACQUIRE_ATTEMPTS = 3
+
+
+@dataclass
+class CachedFile:
+    path: Path
+    size: int
+    media_type: str
+    etag: str | None = None
+
+
+class MediaCache:
+    """
+    Size bounded cache on the local disk for files fetched from an upstream server, such as cloudinary.
+
+    Entries are kept in least recently used order and the oldest ones are removed once the cache
+    holds more than max_bytes. Concurrent requests for a file that is not cached yet wait for the
+    same download, so a burst of requests for a new image costs one upstream request.
+    After a restart the cache is rebuilt from the files on disk, oldest modification time first.
+
+    The index lives in the memory of the process, so the directory is meant to be owned by a single
+    worker: with several workers every one of them should get its own MEDIA_CACHE_DIR, otherwise they
+    evict each other's files, the size bound holds per worker instead of for the directory and a file
+    can disappear while it is sent. Entries being sent are pinned: an evicted entry keeps its file
+    until the last response reading it releases it. An entry whose file is gone is downloaded again.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        upstream_url: str,
+        max_bytes: int,
+        max_file_bytes: int,
+        transport: httpx.AsyncBaseTransport | None = None
+    ):
+        self.root = Path(root)
+        self.upstream_url = upstream_url.rstrip("/")
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.transport = transport
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "errors": 0}
+        self._entries: OrderedDict[str, CachedFile] = OrderedDict()
+        self._pending: dict[str, asyncio.Task] = {}
+        # number of responses reading the file of an entry, and the pinned entries already evicted
+        self._readers: dict[str, int] = {}
+        self._evicted: set[str] = set()
+        self._client: httpx.AsyncClient | None = None
+
+    def _file_path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.root / digest[:2] / digest
+
+    @staticmethod
+    def _media_type(head: bytes, default: str = "application/octet-stream") -> str:
+        image_format = sniff_image_format(head)
+        return f"image/{image_format.lower()}" if image_format else default
+
+    def load(self) -> None:
+        """
+        The load function fills the cache with the files left on disk by a previous run.
+        The files don't record their upstream path, so they are indexed by the name of the file
+        and found again through _file_path.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._entries.clear()
+        self.size = 0
+        if not self.root.is_dir():
+            return
+        files = []
+        for path in self.root.glob("*/*"):
+            if path.suffix == ".tmp":
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                files.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime_ns):
+            try:
+                with open(path, "rb") as file:
+                    media_type = self._media_type(file.read(SIGNATURE_LENGTH))
+            except FileNotFoundError:
+                continue
+            self._entries[path.name] = CachedFile(path, stat.st_size, media_type)
+            self.size += stat.st_size
+        self._evict()
+
+    def _evict(self) -> None:
+        # the newest entry is kept even if it is larger than the whole cache
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry.size
+            if self._readers.get(entry.path.name):
+                self._evicted.add(entry.path.name)
+            else:
+                entry.path.unlink(missing_ok=True)
+            self.stats["evictions"] += 1
+
+    def _forget(self, name: str, entry: CachedFile) -> None:
+        if self._entries.get(name) is entry:
+            del self._entries[name]
+            self.size -= entry.size
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=self.transport, timeout=30)
+        return self._client
+
+    async def _download(self, key: str) -> CachedFile:
+        path = self._file_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async with self._get_client().stream("GET", f"{self.upstream_url}/{key}") as response:
+                    if response.status_code == status.HTTP_404_NOT_FOUND:
+                        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+                    if response.status_code != status.HTTP_200_OK:
+                        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Upstream error")
+                    upstream_type = response.headers.get("content-type", "application/octet-stream")
+                    async for data in response.aiter_bytes():
+                        size += len(data)
+                        if size > self.max_file_bytes:
+                            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY,
+                                                detail="Upstream file is too large")
+                        if len(head) < SIGNATURE_LENGTH:
+                            head += data[:SIGNATURE_LENGTH - len(head)]
+                        digest.update(data)
+                        await run_in_threadpool(out.write, data)
+            os.replace(tmp, path)
+        except httpx.HTTPError:
+            os.unlink(tmp)
+            self.stats["errors"] += 1
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Upstream error")
+        except BaseException:
+            os.unlink(tmp)
+            self.stats["errors"] += 1
+            raise
+
+        entry = CachedFile(path, size, self._media_type(head, upstream_type), f'"{digest.hexdigest()}"')
+        previous = self._entries.pop(path.name, None)
+        if previous is not None:
+            self.size -= previous.size
+        self._entries[path.name] = entry
+        self.size += size
+        self._evict()
+        return entry
+
+    async def _get_entry(self, key: str, name: str) -> CachedFile:
+        entry = self._entries.get(name)
+        if entry is not None:
+            self._entries.move_to_end(name)
+            self.stats["hits"] += 1
+            return entry
+        task = self._pending.get(name)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._download(key))
+            self._pending[name] = task
+            task.add_done_callback(lambda _: self._pending.pop(name, None))
+        else:
+            self.stats["coalesced"] += 1
+        # a client that disconnects must not cancel the download the others are waiting for
+        return await asyncio.shield(task)
+
+    async def acquire(self, key: str) -> CachedFile:
+        """
+        The acquire function returns the cached file of an upstream path, downloading it on a miss.
+        The entry is pinned, its file is not removed before release is called, even if it is evicted.
+        An entry whose file was removed behind the back of the cache is downloaded again.
+
+        :param key: str: Path of the file on the upstream server
+        :return: The cached file, to pass to release once it has been read
+            Raises 404 if the upstream server doesn't have the file and 502 if the download fails
+        :doc-author: Trelent
+        """
+        name = self._file_path(key).name
+        for _ in range(MAX_ACQUIRE_ATTEMPTS):
+            entry = await self._get_entry(key, name)
+            self._readers[name] = self._readers.get(name, 0) + 1
+            try:
+                if entry.etag is None:
+                    entry.etag = await run_in_threadpool(self._hash, entry.path)
+                elif not await run_in_threadpool(entry.path.is_file):
+                    raise FileNotFoundError(entry.path)
+                return entry
+            except FileNotFoundError:
+                self.release(entry)
+                self._forget(name, entry)
+            except BaseException:
+                self.release(entry)
+                raise
+        self.stats["errors"] += 1
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Cached file keeps disappearing")
+
+    def release(self, entry: CachedFile) -> None:
+        """
+        The release function unpins an entry returned by acquire.
+        The file of an entry evicted in the meantime is removed once no response reads it anymore.
+
+        :param entry: CachedFile: The acquired entry
+        :return: None
+        :doc-author: Trelent
+        """
+        name = entry.path.name
+        readers = self._readers.pop(name) - 1
+        if readers:
+            self._readers[name] = readers
+        elif name in self._evicted:
+            self._evicted.discard(name)
+            # the file may have been downloaded again since
+            if name not in self._entries:
+                entry.path.unlink(missing_ok=True)
+
+    async def get(self, key: str) -> CachedFile:
+        """
+        The get function returns the cached file of an upstream path, downloading it on a miss.
+        The file may be evicted as soon as the function returns, use acquire to read it.
+
+        :param key: str: Path of the file on the upstream server
+        :return: The cached file
+            Raises 404 if the upstream server doesn't have the file and 502 if the download fails
+        :doc-author: Trelent
+        """
+        entry = await self.acquire(key)
+        self.release(entry)
+        return entry
+
+    @staticmethod
+    def _hash(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+        return f'"{digest.hexdigest()}"'
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_metrics(self) -> dict:
+        """
+        The get_metrics function returns the hit ratio and the size of the cache.
+
+        :return: A dictionary with the cache statistics
+        :doc-author: Trelent
+        """
+        requests = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": self.stats["hits"] / requests if requests else 0.0,
+        }
+
+
+media_cache = MediaCache(
+    settings.media_cache_dir,
+    f"https://res.cloudinary.com/{settings.cloudinary_name}",
+    settings.media_cache_max_bytes,
+    settings.max_upload_bytes
+)
+
+
+def get_media_cache() -> MediaCache:
+    """
+    The get_media_cache function is a dependency returning the media cache.
+
+    :return: The media cache
+    :doc-author: Trelent
+    """
+    return media_cache
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import extract, func, insert, literal, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Post, PostRanking, Rating
+
+
+logger = logging.getLogger(__name__)
+
+MAX_RATING = 5
+# hours added to the age of a post, so the newest posts don't get huge hot scores
+HOT_AGE_OFFSET = 2
+
+
+def _age_hours(dialect: str, now: datetime):
+    created_dt = func.coalesce(Post.created_dt, literal(now))
+    if dialect == "postgresql":
+        return extract("epoch", literal(now) - created_dt) / 3600
+    return (func.julianday(literal(now)) - func.julianday(created_dt)) * 24
+
+
+def refresh_rankings(db: Session, now: datetime | None = None) -> int:
+    """
+    The refresh_rankings function recomputes the scores of all rated posts with one query and
+    replaces the content of post_rankings in a single transaction.
+
+    The bayesian score is the average rating of the post after adding settings.ranking_prior_votes
+    votes of the average rating of all posts, so a post with a single 5 star vote doesn't beat a post
+    with hundreds of good ratings. The hot score is the number of votes weighted by that score,
+    divided by the square of the age of the post in hours, so it decays as the post gets older.
+
+    :param db: Session: Pass the database session to the function
+    :param now: datetime | None: The current time, defaults to now
+    :return: The number of ranked posts
+    :doc-author: Trelent
+    """
+    now = now or datetime.utcnow()
+    mean = db.query(func.avg(Rating.rating)).scalar() or 0.0
+    prior = settings.ranking_prior_votes
+    stats = select(
+        Rating.image_id.label("post_id"),
+        func.count().label("votes"),
+        func.sum(Rating.rating).label("total"),
+    ).group_by(Rating.image_id).subquery()
+    bayesian_score = (prior * mean + stats.c.total) / (prior + stats.c.votes)
+    age = _age_hours(db.get_bind().dialect.name, now) + HOT_AGE_OFFSET
+    ranked = select(
+        stats.c.post_id,
+        stats.c.votes,
+        stats.c.total * 1.0 / stats.c.votes,
+        bayesian_score,
+        stats.c.votes * bayesian_score / MAX_RATING / (age * age),
+    ).join(Post, Post.id == stats.c.post_id)
+
+    db.query(PostRanking).delete()
+    result = db.execute(insert(PostRanking).from_select(
+        ["post_id", "rating_count", "average_rating", "bayesian_score", "hot_score"], ranked
+    ))
+    db.commit()
+    return result.rowcount
+
+
+class RankingRefresher:
+    """
+    Background task that recomputes post_rankings when the application starts and then every interval seconds.
+    """
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal, interval: float = 300):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._task = None
+
+    def refresh(self) -> None:
+        db = self.session_factory()
+        try:
+            refresh_rankings(db)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await run_in_threadpool(self.refresh)
+            except Exception:
+                logger.exception("Refreshing the post rankings failed")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """
+        The start function starts the task that refreshes the rankings.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the task that refreshes the rankings.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+ranking_refresher = RankingRefresher(interval=settings.ranking_refresh_interval)
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from itertools import chain
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Rating, post_hashtags
+
+
+logger = logging.getLogger(__name__)
+
+MAX_RATING = 5
+# only the newest posts of a hashtag are candidates, a very common hashtag says little about a post anyway
+MAX_POSTS_PER_TAG = 5000
+
+
+@dataclass
+class TagMatrix:
+    """
+    Sparse post x hashtag matrix, stored both by rows (CSR) and by columns (CSC).
+
+    Posts are rows, ordered by id, and hashtags are columns. The tags of the post in row r are
+    row_tags[row_indptr[r]:row_indptr[r + 1]], the rows of the posts with the hashtag in column c
+    are col_rows[col_indptr[c]:col_indptr[c + 1]], oldest first. Every hashtag has an idf weight,
+    so rare shared hashtags count more than common ones, and every post its average rating.
+    """
+
+    post_ids: np.ndarray
+    tag_ids: np.ndarray
+    row_indptr: np.ndarray
+    row_tags: np.ndarray
+    col_indptr: np.ndarray
+    col_rows: np.ndarray
+    idf: np.ndarray
+    ratings: np.ndarray
+
+    @classmethod
+    def build(cls, pairs: np.ndarray, rated: np.ndarray) -> "TagMatrix":
+        """
+        The build function creates the matrix from (post_id, hashtag_id) pairs and (post_id, rating) pairs.
+
+        :param pairs: np.ndarray: Array of shape (n, 2) with the post id and hashtag id of every tag of a post
+        :param rated: np.ndarray: Array of shape (m, 2) with the post id and average rating of the rated posts
+        :return: The matrix
+        :doc-author: Trelent
+        """
+        pairs = pairs.reshape(-1, 2).astype(np.int64)
+        # both ids packed in one integer sort and deduplicate much faster than rows
+        keys = np.unique(pairs[:, 0] << 32 | pairs[:, 1])
+        post_ids, rows = np.unique(keys >> 32, return_inverse=True)
+        tag_ids, cols = np.unique(keys & 0xFFFFFFFF, return_inverse=True)
+        order = np.lexsort((rows, cols))
+        col_rows = rows[order]
+        col_indptr = np.searchsorted(cols[order], np.arange(len(tag_ids) + 1))
+        row_indptr = np.searchsorted(rows, np.arange(len(post_ids) + 1))
+        idf = np.log((1 + len(post_ids)) / np.diff(col_indptr)) + 1
+
+        ratings = np.zeros(len(post_ids))
+        rated = rated.reshape(-1, 2)
+        positions = np.searchsorted(post_ids, rated[:, 0].astype(np.int64))
+        found = positions < len(post_ids)
+        found[found] = post_ids[positions[found]] == rated[found, 0]
+        ratings[positions[found]] = rated[found, 1]
+        return cls(post_ids, tag_ids, row_indptr, cols, col_indptr, col_rows, idf, ratings)
+
+    def __contains__(self, post_id: int) -> bool:
+        row = np.searchsorted(self.post_ids, post_id)
+        return bool(row < len(self.post_ids) and self.post_ids[row] == post_id)
+
+    def _columns(self, tag_ids: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(self.tag_ids, tag_ids)
+        positions = positions[positions < len(self.tag_ids)]
+        return positions[np.isin(self.tag_ids[positions], tag_ids)]
+
+    def related(self, post_id: int, tag_ids: list[int], limit: int, rating_weight: float) -> list[tuple[int, float]]:
+        """
+        The related function scores the posts sharing hashtags with a post. The score is the sum
+        of the idf weights of the shared hashtags, increased by up to rating_weight for the best rated posts.
+
+        :param post_id: int: Id of the post, it is left out of the result
+        :param tag_ids: list[int]: Ids of the hashtags of the post, used if the post isn't in the matrix yet
+        :param limit: int: Maximum number of posts
+        :param rating_weight: float: Share of the score given to the rating
+        :return: A list of (post_id, score) tuples, best first
+        :doc-author: Trelent
+        """
+        if post_id in self:
+            row = np.searchsorted(self.post_ids, post_id)
+            columns = self.row_tags[self.row_indptr[row]:self.row_indptr[row + 1]]
+        else:
+            row = -1
+            columns = self._columns(np.array(tag_ids, dtype=np.int64))
+        if not len(columns):
+            return []
+        candidates, weights = [], []
+        for column in columns:
+            start, end = self.col_indptr[column], self.col_indptr[column + 1]
+            start = max(start, end - MAX_POSTS_PER_TAG)
+            candidates.append(self.col_rows[start:end])
+            weights.append(np.full(end - start, self.idf[column]))
+        rows, inverse = np.unique(np.concatenate(candidates), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        scores *= 1 + rating_weight * self.ratings[rows] / MAX_RATING
+        scores[rows == row] = -1
+        count = min(limit, int((scores > 0).sum()))
+        if count == 0:
+            return []
+        # every post scoring as much as the last one kept, so that ties go to the newer posts
+        threshold = -np.partition(-scores, count - 1)[count - 1]
+        best = np.flatnonzero(scores >= threshold)
+        best = best[np.lexsort((-rows[best], -scores[best]))][:count]
+        return [(int(self.post_ids[rows[i]]), float(scores[i])) for i in best]
+
+
+def load_tag_matrix(db: Session) -> TagMatrix:
+    """
+    The load_tag_matrix function reads the hashtags and the average ratings of all posts.
+
+    :param db: Session: Pass the database session to the function
+    :return: The matrix
+    :doc-author: Trelent
+    """
+    # np.array of a list of rows is very slow, the values are streamed into a flat array instead
+    pairs = np.fromiter(chain.from_iterable(
+        db.execute(select(post_hashtags.c.post_id, post_hashtags.c.hashtag_id))
+    ), dtype=np.int64)
+    rated = np.fromiter(chain.from_iterable(
+        db.execute(select(Rating.image_id, func.avg(Rating.rating)).group_by(Rating.image_id))
+    ), dtype=np.float64)
+    return TagMatrix.build(pairs, rated)
+
+
+class RelatedPosts:
+    """
+    Holder of the tag matrix used to recommend related posts.
+
+    Queries only read the matrix, which is rebuilt from scratch every rebuild_interval seconds
+    by a background task and swapped in at once. Posts created since the last rebuild are found
+    from the ids of their hashtags, but only show up as candidates after the next one.
+    """
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal, rebuild_interval: float = 600):
+        self.session_factory = session_factory
+        self.rebuild_interval = rebuild_interval
+        self.matrix: TagMatrix | None = None
+        self._task = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.matrix is not None
+
+    def clear(self) -> None:
+        self.matrix = None
+
+    def load(self, db: Session) -> None:
+        """
+        The load function builds the matrix from the database.
+
+        :param db: Session: Pass the database session to the function
+        :return: None
+        :doc-author: Trelent
+        """
+        self.matrix = load_tag_matrix(db)
+
+    def rebuild(self) -> None:
+        db = self.session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await run_in_threadpool(self.rebuild)
+            except Exception:
+                logger.exception("Rebuilding the related posts matrix failed")
+
+    async def start(self) -> None:
+        """
+        The start function starts the task that rebuilds the matrix.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the task that rebuilds the matrix.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+related_posts = RelatedPosts(rebuild_interval=settings.related_rebuild_interval)
@@ -0,0 +1,202 @@
+import base64
+import json
+import re
+
+from fastapi import HTTPException, status
+from sqlalchemy import DDL, event, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Base, Comments, Post
+
+
+# Every post has one row in post_search with the text of its description, hashtags and comments.
+# Postgres keeps a weighted tsvector with a GIN index, SQLite an FTS5 table whose rowid is the post id.
+POSTGRES_DDL = (
+    "CREATE TABLE IF NOT EXISTS post_search ("
+    "post_id INTEGER PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_post_search_document ON post_search USING GIN (document)",
+)
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5("
+    "description, hashtags, comments, tokenize = 'unicode61 remove_diacritics 2')",
+)
+
+POSTGRES_REFRESH = """
+INSERT INTO post_search (post_id, document)
+SELECT p.id,
+    setweight(to_tsvector(CAST(:config AS regconfig), coalesce(p.description, '')), 'A') ||
+    setweight(to_tsvector(CAST(:config AS regconfig), coalesce((
+        SELECT string_agg(h.name, ' ') FROM post_hashtags ph JOIN hashtags h ON h.id = ph.hashtag_id
+        WHERE ph.post_id = p.id), '')), 'B') ||
+    setweight(to_tsvector(CAST(:config AS regconfig), coalesce((
+        SELECT string_agg(c.text, ' ') FROM comments c WHERE c.image_id = p.id), '')), 'C')
+FROM posts p
+"""
+SQLITE_REFRESH = """
+INSERT INTO post_search (rowid, description, hashtags, comments)
+SELECT p.id,
+    coalesce(p.description, ''),
+    coalesce((SELECT group_concat(h.name, ' ') FROM post_hashtags ph JOIN hashtags h ON h.id = ph.hashtag_id
+              WHERE ph.post_id = p.id), ''),
+    coalesce((SELECT group_concat(c.text, ' ') FROM comments c WHERE c.image_id = p.id), '')
+FROM posts p
+"""
+
+POSTGRES_SEARCH = """
+SELECT post_id, score FROM (
+    SELECT s.post_id, ts_rank_cd(s.document, q) AS score
+    FROM post_search s, plainto_tsquery(CAST(:config AS regconfig), :query) q
+    WHERE s.document @@ q
+) hits
+WHERE :after_score IS NULL OR score < :after_score OR (score = :after_score AND post_id < :after_id)
+ORDER BY score DESC, post_id DESC
+LIMIT :limit
+"""
+# bm25 is lower for better matches, the weights favour the description over hashtags over comments
+SQLITE_SEARCH = """
+SELECT post_id, score FROM (
+    SELECT rowid AS post_id, -bm25(post_search, 4.0, 2.0, 1.0) AS score
+    FROM post_search WHERE post_search MATCH :query
+)
+WHERE :after_score IS NULL OR score < :after_score OR (score = :after_score AND post_id < :after_id)
+ORDER BY score DESC, post_id DESC
+LIMIT :limit
+"""
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+for statement in POSTGRES_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "before_drop", DDL("DROP TABLE IF EXISTS post_search"))
+
+
+def refresh_search_documents(connection: Connection, post_ids: list[int] | None = None) -> None:
+    """
+    The refresh_search_documents function rebuilds the search documents of the posts from the database.
+    Documents of posts that no longer exist are removed.
+
+    :param connection: Connection: Connection of the current transaction
+    :param post_ids: list[int] | None: Ids of the posts, None rebuilds every document
+    :return: None
+    :doc-author: Trelent
+    """
+    postgres = connection.dialect.name == "postgresql"
+    key = "post_id" if postgres else "rowid"
+    refresh = POSTGRES_REFRESH if postgres else SQLITE_REFRESH
+    params = {"config": settings.search_config} if postgres else {}
+    if post_ids is None:
+        connection.execute(text("DELETE FROM post_search"))
+        connection.execute(text(refresh), params)
+        return
+    ids = ", ".join(str(int(post_id)) for post_id in post_ids)
+    connection.execute(text(f"DELETE FROM post_search WHERE {key} IN ({ids})"))
+    connection.execute(text(f"{refresh} WHERE p.id IN ({ids})"), params)
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    The ensure_search_index function creates the search table of a database created before it existed
+    and indexes all posts. Databases created with Base.metadata.create_all already have it.
+
+    :param engine: Engine: The database engine
+    :return: None
+    :doc-author: Trelent
+    """
+    with engine.begin() as connection:
+        if inspect(connection).has_table("post_search"):
+            return
+        statements = POSTGRES_DDL if connection.dialect.name == "postgresql" else SQLITE_DDL
+        for statement in statements:
+            connection.execute(text(statement))
+        refresh_search_documents(connection)
+
+
+def _changed(obj, *attributes: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+
+@event.listens_for(Session, "before_flush")
+def collect_deleted_documents(session: Session, flush_context, instances) -> None:
+    # the post of a deleted comment has to be read before the row is gone
+    post_ids = session.info.setdefault("search_post_ids", set())
+    for obj in session.deleted:
+        if isinstance(obj, Post):
+            post_ids.add(obj.id)
+        elif isinstance(obj, Comments):
+            post_ids.add(obj.image_id)
+
+
+@event.listens_for(Session, "after_flush")
+def sync_search_documents(session: Session, flush_context) -> None:
+    """
+    The sync_search_documents function updates the search documents of the posts whose description,
+    hashtags or comments were changed by the flush, in the same transaction.
+    Bulk updates and deletes with Query.update and Query.delete are not seen by the session and
+    don't update the documents, except deleted posts on Postgres, which are removed by the foreign key.
+
+    :param session: Session: The flushed session
+    :param flush_context: Internal state of the flush
+    :return: None
+    :doc-author: Trelent
+    """
+    post_ids = session.info.pop("search_post_ids", set())
+    for obj in session.new:
+        if isinstance(obj, Post):
+            post_ids.add(obj.id)
+        elif isinstance(obj, Comments):
+            post_ids.add(obj.image_id)
+    for obj in session.dirty:
+        if isinstance(obj, Post) and _changed(obj, "description", "hashtags"):
+            post_ids.add(obj.id)
+        elif isinstance(obj, Comments) and _changed(obj, "text", "image_id"):
+            post_ids.add(obj.image_id)
+            post_ids.update(inspect(obj).attrs.image_id.history.deleted)
+    post_ids.discard(None)
+    if post_ids:
+        refresh_search_documents(session.connection(), sorted(post_ids))
+
+
+def encode_cursor(score: float, post_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, post_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        score, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(post_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def search_post_ids(db: Session, query: str, limit: int, cursor: str | None = None) -> list[tuple[int, float]]:
+    """
+    The search_post_ids function finds the posts matching every word of the query, best matches first.
+    Matches in the description rank above matches in the hashtags, which rank above matches in the comments.
+
+    :param db: Session: Access the database
+    :param query: str: Words to look for
+    :param limit: int: Maximum number of posts
+    :param cursor: str | None: Cursor returned with the previous page
+    :return: A list of (post_id, score) tuples
+    :doc-author: Trelent
+    """
+    words = WORD_PATTERN.findall(query)
+    if not words:
+        return []
+    after_score, after_id = decode_cursor(cursor) if cursor else (None, None)
+    params = {"limit": limit, "after_score": after_score, "after_id": after_id}
+    if db.get_bind().dialect.name == "postgresql":
+        statement = POSTGRES_SEARCH
+        params.update(query=" ".join(words), config=settings.search_config)
+    else:
+        statement = SQLITE_SEARCH
+        # quoted words can't be read as FTS5 operators or column filters
+        params["query"] = " ".join(f'"{word}"' for word in words)
+    return [(post_id, score) for post_id, score in db.execute(text(statement), params)]
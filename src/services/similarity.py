@@ -0,0 +1,124 @@
+from itertools import combinations
+
+from sqlalchemy.orm import Session
+
+from src.database.models import Post
+
+
+class SimilarityIndex:
+    """
+    In-memory index of the perceptual hashes of all posts.
+
+    It uses multi-index hashing: every 64 bit hash is split into CHUNKS parts of 16 bits and
+    each part is stored in its own hash table. If two hashes differ in at most r bits, at least
+    one of their parts differs in at most r // CHUNKS bits, so a query only has to look up the
+    parts within that small radius and check the few candidates it finds. Unlike a BK-tree this
+    stays fast on 64 bit hashes, where the distances between unrelated images are all close to 32.
+    """
+
+    CHUNKS = 4
+    CHUNK_BITS = 16
+    MAX_DISTANCE = 12
+
+    def __init__(self):
+        self._hashes = {}
+        self._tables = [{} for _ in range(self.CHUNKS)]
+        mask_radius = self.MAX_DISTANCE // self.CHUNKS
+        self._flip_masks = [
+            [sum(1 << bit for bit in bits) for r in range(radius + 1) for bits in combinations(range(self.CHUNK_BITS), r)]
+            for radius in range(mask_radius + 1)
+        ]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _chunks(self, value: int) -> list[int]:
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (i * self.CHUNK_BITS)) & mask for i in range(self.CHUNKS)]
+
+    def add(self, post_id: int, phash: str | None) -> None:
+        """
+        The add function puts the hash of a post into the index, replacing the previous one.
+
+        :param post_id: int: Id of the post
+        :param phash: str | None: Hex hash of the image, posts without a hash are ignored
+        :return: None
+        :doc-author: Trelent
+        """
+        if phash is None:
+            return
+        self.remove(post_id)
+        value = int(phash, 16)
+        self._hashes[post_id] = value
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            table.setdefault(chunk, set()).add(post_id)
+
+    def remove(self, post_id: int) -> None:
+        """
+        The remove function drops a post from the index.
+
+        :param post_id: int: Id of the post
+        :return: None
+        :doc-author: Trelent
+        """
+        value = self._hashes.pop(post_id, None)
+        if value is None:
+            return
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            ids = table[chunk]
+            ids.discard(post_id)
+            if not ids:
+                del table[chunk]
+
+    def search(self, phash: str, max_distance: int) -> list[tuple[int, int]]:
+        """
+        The search function finds the posts whose hash is within max_distance bits of phash.
+
+        :param phash: str: Hex hash to look for
+        :param max_distance: int: Maximum hamming distance, up to MAX_DISTANCE
+        :return: A list of (post_id, distance) tuples sorted by distance
+        :doc-author: Trelent
+        """
+        if not 0 <= max_distance <= self.MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {self.MAX_DISTANCE}")
+        value = int(phash, 16)
+        masks = self._flip_masks[max_distance // self.CHUNKS]
+        hashes = self._hashes
+        found = {}
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            for mask in masks:
+                ids = table.get(chunk ^ mask)
+                if not ids:
+                    continue
+                for post_id in ids:
+                    distance = (hashes[post_id] ^ value).bit_count()
+                    if distance <= max_distance:
+                        found[post_id] = distance
+        return sorted(found.items(), key=lambda item: (item[1], item[0]))
+
+    def clear(self) -> None:
+        """
+        The clear function removes every hash from the index.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._hashes.clear()
+        for table in self._tables:
+            table.clear()
+
+    def load(self, db: Session) -> None:
+        """
+        The load function fills the index with the hashes of all posts in the database.
+
+        :param db: Session: Pass the database session to the function
+        :return: None
+        :doc-author: Trelent
+        """
+        self.clear()
+        rows = db.query(Post.id, Post.phash).filter(Post.phash.isnot(None)).yield_per(10000)
+        for post_id, phash in rows:
+            self.add(post_id, phash)
+
+
+similarity_index = SimilarityIndex()
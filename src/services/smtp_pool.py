@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from email.message import EmailMessage
+
+import aiosmtplib
+
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """
+    Small pool of authenticated SMTP connections.
+
+    At most size messages are sent at the same time, each over a connection taken from the pool.
+    Connections are opened lazily and put back after a successful send, so a burst of messages
+    costs size TLS handshakes instead of one per message. A pooled connection the server has
+    closed in the meantime is replaced and the message is sent again over the new one.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: str | None = None,
+        password: str | None = None,
+        use_tls: bool = True,
+        validate_certs: bool = True,
+        size: int = 3,
+        timeout: float = 30
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.validate_certs = validate_certs
+        self.size = size
+        self.timeout = timeout
+        self.stats = {"sent": 0, "failed": 0, "connections": 0, "send_seconds": 0.0}
+        self._idle: list[aiosmtplib.SMTP] = []
+        self._semaphore = asyncio.Semaphore(size)
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            validate_certs=self.validate_certs,
+            timeout=self.timeout
+        )
+        await client.connect()
+        if self.username:
+            await client.login(self.username, self.password)
+        self.stats["connections"] += 1
+        return client
+
+    @staticmethod
+    async def _disconnect(client: aiosmtplib.SMTP) -> None:
+        try:
+            await client.quit()
+        except aiosmtplib.SMTPException:
+            client.close()
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        The send function sends a message over a pooled connection.
+
+        :param message: EmailMessage: The message to send
+        :return: None
+            Raises aiosmtplib.SMTPException if the message can't be sent
+        :doc-author: Trelent
+        """
+        async with self._semaphore:
+            started = time.perf_counter()
+            client = self._idle.pop() if self._idle else None
+            try:
+                try:
+                    if client is None or not client.is_connected:
+                        client = await self._connect()
+                    await client.send_message(message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    # the server closed the pooled connection while it was idle
+                    client = await self._connect()
+                    await client.send_message(message)
+            except Exception:
+                self.stats["failed"] += 1
+                if client is not None:
+                    client.close()
+                raise
+            self._idle.append(client)
+            self.stats["sent"] += 1
+            self.stats["send_seconds"] += time.perf_counter() - started
+
+    async def send_many(self, messages: list[EmailMessage]) -> list[Exception | None]:
+        """
+        The send_many function sends the messages concurrently over the pooled connections.
+
+        :param messages: list[EmailMessage]: The messages to send
+        :return: The error of each message, None if it was sent
+        :doc-author: Trelent
+        """
+        async def send(message):
+            try:
+                await self.send(message)
+            except Exception as err:
+                logger.warning("Sending email to %s failed: %r", message["To"], err)
+                return err
+            return None
+
+        return list(await asyncio.gather(*(send(message) for message in messages)))
+
+    async def close(self) -> None:
+        """
+        The close function closes the idle connections of the pool.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        idle, self._idle = self._idle, []
+        for client in idle:
+            await self._disconnect(client)
+
+    def get_metrics(self) -> dict:
+        """
+        The get_metrics function returns the number of sent and failed messages,
+        the number of opened connections and the average send latency.
+
+        :return: A dictionary with the pool statistics
+        :doc-author: Trelent
+        """
+        return {
+            "sent": self.stats["sent"],
+            "failed": self.stats["failed"],
+            "connections": self.stats["connections"],
+            "idle_connections": len(self._idle),
+            "average_send_seconds": self.stats["send_seconds"] / self.stats["sent"] if self.stats["sent"] else 0.0,
+        }
@@ -0,0 +1,252 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import quote
+
+import cloudinary
+import cloudinary.api
+import cloudinary.uploader
+
+from src.conf.config import settings
+from src.utils.image_metadata import SIGNATURE_LENGTH, sniff_image_format
+from src.utils.image_variants import build_variant_urls, get_eager_transformations
+
+
+class Storage(ABC):
+    """
+    Interface of the place where images, qr codes and avatars are stored.
+
+    Assets are addressed by their public id, for example project_web/<uuid>, without a file extension.
+    """
+
+    @abstractmethod
+    def save(self, file: BinaryIO | bytes, public_id: str, transformation: dict | None = None,
+             variants: bool = False) -> str:
+        """
+        The save function stores the file under the public id, replacing a previous file with the same id.
+
+        :param file: BinaryIO | bytes: Content of the asset
+        :param public_id: str: Public id of the asset
+        :param transformation: dict | None: Transformation applied to the returned url, if the storage supports it
+        :param variants: bool: Prepare the resized variants of the image, if the storage supports it
+        :return: The url of the stored asset
+        :doc-author: Trelent
+        """
+
+    @abstractmethod
+    def url(self, public_id: str, **transformation) -> str:
+        """
+        The url function returns the url of a stored asset.
+
+        :param public_id: str: Public id of the asset
+        :param **transformation: Transformation applied to the url, if the storage supports it
+        :return: The url of the asset
+        :doc-author: Trelent
+        """
+
+    def variant_urls(self, public_id: str, base_transformation: dict | None = None) -> dict[str, str] | None:
+        """
+        The variant_urls function returns the urls of the resized variants of an image.
+
+        :param public_id: str: Public id of the image
+        :param base_transformation: dict | None: Transformation applied before resizing
+        :return: A dictionary with preset names as keys and urls as values, None if the storage can't resize
+        :doc-author: Trelent
+        """
+        return None
+
+    @abstractmethod
+    def delete(self, public_ids: list[str]) -> None:
+        """
+        The delete function removes assets. Assets that don't exist are ignored.
+
+        :param public_ids: list[str]: Public ids of the assets
+        :return: None
+        :doc-author: Trelent
+        """
+
+
+class CloudinaryStorage(Storage):
+    """
+    Storage backed by cloudinary. Resized variants and transformations are generated by cloudinary.
+    """
+
+    # cloudinary accepts up to 100 public ids in one delete call
+    DELETE_BATCH_SIZE = 100
+
+    def __init__(self, service: cloudinary = cloudinary):
+        self.service = service
+
+    def configure(self) -> None:
+        self.service.config(
+            cloud_name=settings.cloudinary_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret,
+            secure=True
+        )
+
+    def save(self, file: BinaryIO | bytes, public_id: str, transformation: dict | None = None,
+             variants: bool = False) -> str:
+        self.configure()
+        options = {"eager": get_eager_transformations(), "eager_async": True} if variants else {}
+        result = self.service.uploader.upload(file, public_id=public_id, overwrite=True, **options)
+        if transformation:
+            return self.url(public_id, version=result.get("version"), **transformation)
+        return result["secure_url"]
+
+    def url(self, public_id: str, **transformation) -> str:
+        self.configure()
+        return self.service.CloudinaryImage(public_id).build_url(**transformation)
+
+    def variant_urls(self, public_id: str, base_transformation: dict | None = None) -> dict[str, str] | None:
+        self.configure()
+        return build_variant_urls(public_id, base_transformation, service=self.service)
+
+    def delete(self, public_ids: list[str]) -> None:
+        self.configure()
+        for i in range(0, len(public_ids), self.DELETE_BATCH_SIZE):
+            self.service.api.delete_resources(public_ids[i:i + self.DELETE_BATCH_SIZE])
+
+
+class LocalStorage(Storage):
+    """
+    Storage on the local disk, for self-hosted deployments and tests.
+
+    Files are spread over two levels of directories named after the sha256 of the public id,
+    so no directory grows too large. The file keeps the extension of its detected format
+    and is served by the /media route. Transformations are not supported, the original is returned.
+    """
+
+    ETAG_CACHE_SIZE = 10000
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self._etags = {}
+
+    def directory(self, public_id: str) -> Path:
+        digest = hashlib.sha256(public_id.encode()).hexdigest()
+        return self.root / digest[:2] / digest[2:4]
+
+    def find(self, public_id: str) -> Path | None:
+        """
+        The find function returns the path of the stored file of an asset.
+
+        :param public_id: str: Public id of the asset
+        :return: The path of the file, or None if the asset doesn't exist
+        :doc-author: Trelent
+        """
+        directory = self.directory(public_id)
+        if not directory.is_dir():
+            return None
+        name = quote(public_id, safe="")
+        for path in directory.iterdir():
+            if path.stem == name and path.is_file():
+                return path
+        return None
+
+    def resolve(self, key: str) -> Path | None:
+        """
+        The resolve function returns the file of the url path of an asset, like project_web/<uuid>.png.
+
+        :param key: str: Public id of the asset followed by its extension
+        :return: The path of the file, or None if it doesn't exist
+        :doc-author: Trelent
+        """
+        if "." not in key:
+            return None
+        public_id, extension = key.rsplit(".", 1)
+        path = self.directory(public_id) / f"{quote(public_id, safe='')}.{quote(extension, safe='')}"
+        return path if path.is_file() else None
+
+    def save(self, file: BinaryIO | bytes, public_id: str, transformation: dict | None = None,
+             variants: bool = False) -> str:
+        if isinstance(file, bytes):
+            file = io.BytesIO(file)
+        file.seek(0)
+        image_format = sniff_image_format(file.read(SIGNATURE_LENGTH))
+        file.seek(0)
+        extension = {"JPEG": "jpg"}.get(image_format, (image_format or "bin").lower())
+
+        directory = self.directory(public_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        old = self.find(public_id)
+        path = directory / f"{quote(public_id, safe='')}.{extension}"
+        # write to a temporary file first, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(file, out)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        finally:
+            file.seek(0)
+        if old is not None and old != path:
+            old.unlink(missing_ok=True)
+        return f"{self.base_url}/{public_id}.{extension}"
+
+    def url(self, public_id: str, **transformation) -> str:
+        path = self.find(public_id)
+        extension = path.suffix if path else ""
+        return f"{self.base_url}/{public_id}{extension}"
+
+    def delete(self, public_ids: list[str]) -> None:
+        for public_id in public_ids:
+            path = self.find(public_id)
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    def etag(self, path: Path) -> str:
+        """
+        The etag function returns a strong etag for the file, the sha256 of its content.
+        The hash is computed once per version of the file and cached.
+
+        :param path: Path: The stored file
+        :return: The quoted etag
+        :doc-author: Trelent
+        """
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as file:
+                for block in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(block)
+            etag = f'"{digest.hexdigest()}"'
+            if len(self._etags) >= self.ETAG_CACHE_SIZE:
+                self._etags.clear()
+            self._etags[key] = etag
+        return etag
+
+
+def create_storage() -> Storage:
+    """
+    The create_storage function creates the storage selected by settings.storage_backend.
+
+    :return: The storage
+    :doc-author: Trelent
+    """
+    if settings.storage_backend == "local":
+        return LocalStorage(settings.local_storage_dir, settings.local_storage_url)
+    return CloudinaryStorage()
+
+
+storage = create_storage()
+
+
+def get_storage() -> Storage:
+    """
+    The get_storage function is a dependency returning the configured storage.
+
+    :return: The storage
+    :doc-author: Trelent
+    """
+    return storage
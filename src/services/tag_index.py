@@ -0,0 +1,213 @@
+import re
+from typing import Iterable
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.models import Hashtag, Post, post_hashtags
+from src.utils.bitmap import Bitmap
+
+
+TOKEN_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+OPERATORS = {"AND", "OR", "NOT"}
+# longer queries are refused, every term costs a pass over a bitmap
+MAX_TERMS = 32
+
+
+def _invalid(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid tag query: {detail}")
+
+
+class _Parser:
+    """
+    Recursive descent parser of tag queries, with NOT binding tighter than AND, and AND tighter than OR.
+    Adjacent terms are joined with AND, so "sunset beach NOT night" is "sunset AND beach AND NOT night".
+    The result is a tree of ("tag", name), ("not", node), ("and", [nodes]) and ("or", [nodes]) tuples.
+    """
+
+    def __init__(self, query: str):
+        self.tokens = TOKEN_PATTERN.findall(query)
+        self.position = 0
+        if not self.tokens:
+            raise _invalid("Empty query")
+        if sum(token not in OPERATORS and token not in "()" for token in self.tokens) > MAX_TERMS:
+            raise _invalid(f"Too many tags, the limit is {MAX_TERMS}")
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _take(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise _invalid("Unexpected end of query")
+        self.position += 1
+        return token
+
+    def parse(self) -> tuple:
+        node = self._or()
+        if self._peek() is not None:
+            raise _invalid(f"Unexpected {self._peek()!r}")
+        return node
+
+    def _or(self) -> tuple:
+        nodes = [self._and()]
+        while self._peek() == "OR":
+            self._take()
+            nodes.append(self._and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def _and(self) -> tuple:
+        nodes = [self._not()]
+        while self._peek() not in (None, "OR", ")"):
+            if self._peek() == "AND":
+                self._take()
+            nodes.append(self._not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def _not(self) -> tuple:
+        if self._peek() == "NOT":
+            self._take()
+            return "not", self._not()
+        token = self._take()
+        if token == "(":
+            node = self._or()
+            if self._take() != ")":
+                raise _invalid("Missing ')'")
+            return node
+        if token in OPERATORS or token == ")":
+            raise _invalid(f"Unexpected {token!r}")
+        return "tag", token
+
+
+def parse_tag_query(query: str) -> tuple:
+    """
+    The parse_tag_query function reads a query like "sunset AND (beach OR sea) NOT night".
+    Operators are upper case, any other word is the name of a tag.
+
+    :param query: str: The query
+    :return: The syntax tree of the query
+    :doc-author: Trelent
+    """
+    return _Parser(query).parse()
+
+
+class TagIndex:
+    """
+    In-memory index with a compressed bitmap of post ids per hashtag, and one of all posts for NOT.
+
+    AND, OR and NOT of tags are set operations on the bitmaps, so a query never touches post_hashtags.
+    The index is loaded from the database on first use and kept up to date when posts are created
+    or deleted, hashtags of existing posts don't change.
+    """
+
+    def __init__(self):
+        self._tags: dict[str, Bitmap] = {}
+        self._posts = Bitmap()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._posts)
+
+    def clear(self) -> None:
+        """
+        The clear function empties the index, it is loaded again on next use.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._tags = {}
+        self._posts = Bitmap()
+        self.loaded = False
+
+    def load(self, db: Session) -> None:
+        """
+        The load function builds the bitmaps of all tags from the database.
+
+        :param db: Session: Pass the database session to the function
+        :return: None
+        :doc-author: Trelent
+        """
+        # plain rows without a join are much faster to read than ORM queries on a large table
+        posts_by_tag = {}
+        rows = db.execute(select(post_hashtags.c.hashtag_id, post_hashtags.c.post_id)).yield_per(10_000)
+        for hashtag_id, post_id in rows:
+            posts_by_tag.setdefault(hashtag_id, []).append(post_id)
+        tags = {}
+        for hashtag_id, name in db.execute(select(Hashtag.id, Hashtag.name)):
+            if hashtag_id in posts_by_tag:
+                bitmap = Bitmap(posts_by_tag.pop(hashtag_id))
+                tags[name] = tags[name] | bitmap if name in tags else bitmap
+        self._tags = tags
+        self._posts = Bitmap(db.execute(select(Post.id)).scalars())
+        self.loaded = True
+
+    def add(self, post_id: int, tag_names: Iterable[str]) -> None:
+        """
+        The add function puts a new post into the bitmaps of its tags.
+
+        :param post_id: int: Id of the post
+        :param tag_names: Iterable[str]: Names of the tags of the post
+        :return: None
+        :doc-author: Trelent
+        """
+        if not self.loaded:
+            return
+        self._posts.add(post_id)
+        for name in tag_names:
+            self._tags.setdefault(name, Bitmap()).add(post_id)
+
+    def remove(self, post_id: int, tag_names: Iterable[str]) -> None:
+        """
+        The remove function drops a deleted post from the bitmaps of its tags.
+
+        :param post_id: int: Id of the post
+        :param tag_names: Iterable[str]: Names of the tags of the post
+        :return: None
+        :doc-author: Trelent
+        """
+        if not self.loaded:
+            return
+        self._posts.discard(post_id)
+        for name in tag_names:
+            bitmap = self._tags.get(name)
+            if bitmap is not None:
+                bitmap.discard(post_id)
+                if not bitmap:
+                    del self._tags[name]
+
+    def query(self, query: str) -> Bitmap:
+        """
+        The query function finds the posts matching a tag query, see parse_tag_query.
+
+        :param query: str: The query
+        :return: The bitmap of the ids of the matching posts
+        :doc-author: Trelent
+        """
+        return self._evaluate(parse_tag_query(query))
+
+    def _evaluate(self, node: tuple) -> Bitmap:
+        kind, value = node
+        if kind == "tag":
+            return self._tags.get(value, Bitmap())
+        if kind == "not":
+            return self._posts - self._evaluate(value)
+        if kind == "or":
+            result = Bitmap()
+            for child in value:
+                result = result | self._evaluate(child)
+            return result
+        # "a AND NOT b" subtracts b from a instead of intersecting with the complement of b
+        included = sorted((self._evaluate(child) for child in value if child[0] != "not"), key=len)
+        excluded = [self._evaluate(child[1]) for child in value if child[0] == "not"]
+        result = included[0] if included else self._posts
+        for bitmap in included[1:]:
+            if not result:
+                break
+            result = result & bitmap
+        for bitmap in excluded:
+            result = result - bitmap
+        return result
+
+
+tag_index = TagIndex()
@@ -0,0 +1,118 @@
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Follow, Post, TimelineEntry, User
+from src.services.jobs import enqueue_job, job_handler
+
+
+FAN_OUT_JOB = "fan_out_posts"
+# number of fan-out jobs handled together, posts of the same author share one pass over the followers
+FAN_OUT_BATCH_SIZE = 50
+
+
+def uses_fan_out_on_write(followers_count: int) -> bool:
+    """
+    The uses_fan_out_on_write function tells if the posts of an author are copied to the timelines of
+    their followers. Authors with more than settings.timeline_fan_out_max_followers followers would cost
+    too many writes per post, their posts are read from the posts table when a timeline is loaded instead.
+
+    :param followers_count: int: Number of followers of the author
+    :return: True if the posts are fanned out on write
+    :doc-author: Trelent
+    """
+    return followers_count <= settings.timeline_fan_out_max_followers
+
+
+def schedule_fan_out(db: Session, post: Post) -> None:
+    """
+    The schedule_fan_out function adds a job that copies a new post to the timelines of the followers of its author.
+    The job is only added to the session, so it is committed together with the post, which must be flushed.
+    The choice is recorded in post.fanned_out, the home timelines read the post from the posts table
+    when it is not fanned out, whatever the number of followers of the author becomes later.
+
+    :param db: Session: Pass the database session to the function
+    :param post: Post: The new post
+    :return: None
+    :doc-author: Trelent
+    """
+    followers_count = db.query(User.followers_count).filter(User.id == post.author_id).scalar() or 0
+    post.fanned_out = uses_fan_out_on_write(followers_count)
+    if followers_count and post.fanned_out:
+        enqueue_job(db, FAN_OUT_JOB, {"post_id": post.id, "author_id": post.author_id}, commit=False)
+
+
+def trim_timelines(db: Session, user_ids: list[int]) -> None:
+    """
+    The trim_timelines function keeps the newest settings.timeline_size entries of the timelines of the users.
+
+    :param db: Session: Pass the database session to the function
+    :param user_ids: list[int]: Owners of the timelines
+    :return: None
+    :doc-author: Trelent
+    """
+    ranked = select(
+        TimelineEntry.user_id,
+        TimelineEntry.post_id,
+        func.row_number().over(partition_by=TimelineEntry.user_id, order_by=TimelineEntry.post_id.desc()).label("rank")
+    ).where(TimelineEntry.user_id.in_(user_ids)).subquery()
+    overflow = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.rank > settings.timeline_size)
+    db.query(TimelineEntry).filter(
+        tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(overflow)
+    ).delete(synchronize_session=False)
+
+
+def fan_out(payloads: list[dict], session_factory: sessionmaker = SessionLocal) -> None:
+    """
+    The fan_out function copies posts to the timelines of the followers of their authors.
+    Followers are read in batches of settings.timeline_fan_out_batch, every batch is written and committed
+    at once. Entries already written by an interrupted run are replaced, so the job can be retried.
+
+    :param payloads: list[dict]: Post id and author id of every post
+    :param session_factory: sessionmaker: Creates the database session
+    :return: None
+    :doc-author: Trelent
+    """
+    posts_by_author = {}
+    for payload in payloads:
+        posts_by_author.setdefault(payload["author_id"], []).append(payload["post_id"])
+    db = session_factory()
+    try:
+        for author_id, post_ids in posts_by_author.items():
+            # the post may have been deleted while the job was waiting
+            post_ids = [post_id for (post_id,) in db.query(Post.id).filter(Post.id.in_(post_ids))]
+            last_follower_id = 0
+            while post_ids:
+                follower_ids = [follower_id for (follower_id,) in db.query(Follow.follower_id).filter(
+                    Follow.followee_id == author_id,
+                    Follow.follower_id > last_follower_id
+                ).order_by(Follow.follower_id).limit(settings.timeline_fan_out_batch)]
+                if not follower_ids:
+                    break
+                db.query(TimelineEntry).filter(
+                    TimelineEntry.user_id.in_(follower_ids),
+                    TimelineEntry.post_id.in_(post_ids)
+                ).delete(synchronize_session=False)
+                db.execute(insert(TimelineEntry), [
+                    {"user_id": follower_id, "post_id": post_id, "author_id": author_id}
+                    for follower_id in follower_ids for post_id in post_ids
+                ])
+                trim_timelines(db, follower_ids)
+                db.commit()
+                last_follower_id = follower_ids[-1]
+    finally:
+        db.close()
+
+
+@job_handler(FAN_OUT_JOB, batch_size=FAN_OUT_BATCH_SIZE)
+async def fan_out_posts(payloads: list[dict]) -> None:
+    """
+    The fan_out_posts function runs the fan-out of a batch of claimed jobs.
+
+    :param payloads: list[dict]: Payloads of the claimed jobs
+    :return: None
+    :doc-author: Trelent
+    """
+    await run_in_threadpool(fan_out, payloads)
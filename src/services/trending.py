@@ -0,0 +1,313 @@
+import asyncio
+import heapq
+import logging
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Iterable, Mapping
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.conf.config import settings
+from src.database.db import SessionLocal
+from src.database.models import Hashtag, Post, TagTrendBucket, post_hashtags
+
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+# window name -> size and number of its buckets
+WINDOWS = {
+    "1h": (timedelta(minutes=1), 60),
+    "24h": (HOUR, 24),
+    "7d": (HOUR, 24 * 7),
+}
+LONGEST_WINDOW = 24 * 7 * HOUR
+# the top tags are computed once for this many tags, smaller limits get a slice
+MAX_TOP = 100
+# posts are committed a moment after their created_dt, an hour is persisted once no post can still appear in it
+PERSIST_DELAY = timedelta(minutes=5)
+
+
+def floor_time(time: datetime, step: timedelta) -> datetime:
+    return datetime.min + (time - datetime.min) // step * step
+
+
+def database_now(db: Session) -> datetime:
+    """
+    The database_now function reads the clock of the database, which sets the created_dt of the posts.
+    It is in the time zone of the database, which may not be UTC.
+
+    :param db: Session: Pass the database session to the function
+    :return: The current time of the database, without time zone like the created_dt column
+    :doc-author: Trelent
+    """
+    return db.scalar(select(func.now())).replace(tzinfo=None)
+
+
+class SlidingWindowCounter:
+    """
+    Counts of tags in the newest `buckets` time buckets of the given size.
+
+    The ring keeps a Counter per bucket, oldest first, and the totals are the sum of the ring,
+    so adding tags and dropping an expired bucket cost as much as the tags they hold.
+    The top tags are taken from the totals with a heap and kept until the counts change.
+    """
+
+    def __init__(self, bucket: timedelta, buckets: int):
+        self.bucket = bucket
+        self.buckets = buckets
+        self._ring: deque[tuple[datetime, Counter]] = deque()
+        self._totals = Counter()
+        self._top: list[tuple[str, int]] | None = None
+
+    def _cutoff(self, now: datetime) -> datetime:
+        return floor_time(now, self.bucket) - (self.buckets - 1) * self.bucket
+
+    def advance(self, now: datetime) -> None:
+        """
+        The advance function drops the buckets that are out of the window at the given time.
+
+        :param now: datetime: The current time
+        :return: None
+        :doc-author: Trelent
+        """
+        cutoff = self._cutoff(now)
+        while self._ring and self._ring[0][0] < cutoff:
+            _, counter = self._ring.popleft()
+            self._totals.subtract(counter)
+            for name in counter:
+                if self._totals[name] <= 0:
+                    del self._totals[name]
+            self._top = None
+
+    def add(self, time: datetime, tags: Iterable[str] | Mapping[str, int], now: datetime) -> None:
+        """
+        The add function counts tags in the bucket of the given time, times out of the window are ignored.
+
+        :param time: datetime: Time of the tags
+        :param tags: Iterable[str] | Mapping[str, int]: Names of the tags, or counts by name
+        :param now: datetime: The current time
+        :return: None
+        :doc-author: Trelent
+        """
+        start = floor_time(time, self.bucket)
+        if start < self._cutoff(now):
+            return
+        # the bucket is almost always the newest one
+        index = len(self._ring)
+        while index and self._ring[index - 1][0] > start:
+            index -= 1
+        if index and self._ring[index - 1][0] == start:
+            counter = self._ring[index - 1][1]
+        else:
+            counter = Counter()
+            self._ring.insert(index, (start, counter))
+        counter.update(tags)
+        self._totals.update(tags)
+        self._top = None
+
+    def top(self, limit: int, now: datetime) -> list[tuple[str, int]]:
+        """
+        The top function returns the most counted tags of the window.
+
+        :param limit: int: Maximum number of tags, up to MAX_TOP
+        :param now: datetime: The current time
+        :return: A list of (name, count) tuples, most counted first
+        :doc-author: Trelent
+        """
+        self.advance(now)
+        if self._top is None:
+            self._top = heapq.nlargest(MAX_TOP, self._totals.items(), key=itemgetter(1))
+        return self._top[:limit]
+
+
+def persist_trend_buckets(db: Session, now: datetime) -> datetime:
+    """
+    The persist_trend_buckets function stores the number of posts per hashtag of every hour
+    that ended since the last call, counted from the posts table. Hours that left the longest
+    window are deleted. The rows don't depend on who writes them, so concurrent application
+    processes can all call it, the first one to insert an hour wins.
+
+    :param db: Session: Pass the database session to the function
+    :param now: datetime: The current time
+    :return: The end of the persisted hours
+    :doc-author: Trelent
+    """
+    end = floor_time(now - PERSIST_DELAY, HOUR)
+    last = db.query(func.max(TagTrendBucket.bucket_start)).scalar()
+    start = max(last + HOUR if last else end - LONGEST_WINDOW, end - LONGEST_WINDOW)
+    if start < end:
+        rows = db.query(Post.created_dt, post_hashtags.c.hashtag_id).join(
+            post_hashtags, post_hashtags.c.post_id == Post.id
+        ).filter(Post.created_dt >= start, Post.created_dt < end)
+        counts = Counter((floor_time(created_dt, HOUR), hashtag_id) for created_dt, hashtag_id in rows)
+        if counts:
+            try:
+                db.execute(insert(TagTrendBucket), [
+                    {"bucket_start": bucket_start, "hashtag_id": hashtag_id, "count": count}
+                    for (bucket_start, hashtag_id), count in counts.items()
+                ])
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+    db.query(TagTrendBucket).filter(TagTrendBucket.bucket_start < end - LONGEST_WINDOW).delete()
+    db.commit()
+    return end
+
+
+class TrendingTags:
+    """
+    Most used hashtags of new posts over the last hour, day and week.
+
+    Every window is a SlidingWindowCounter, the last hour has a bucket per minute and the others
+    a bucket per hour. Posts are counted when they are created; deleted posts keep counting until
+    their bucket expires. A background task periodically stores the hourly counts of the ended hours
+    in tag_trend_buckets, so a restart reads them instead of the posts of the whole week.
+    Posts are timed by the clock of the database, so the windows follow that clock too: its offset
+    from the clock of the application is measured when the counts are loaded and persisted.
+    """
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal, persist_interval: float = 300):
+        self.session_factory = session_factory
+        self.persist_interval = persist_interval
+        self._windows: dict[str, SlidingWindowCounter] = {}
+        self._clock_offset = timedelta(0)
+        self._task = None
+        self.clear()
+
+    def now(self) -> datetime:
+        """
+        The now function returns the current time of the database clock.
+
+        :return: The current time, comparable with the created_dt of the posts
+        :doc-author: Trelent
+        """
+        return datetime.utcnow() + self._clock_offset
+
+    def _sync_clock(self, now: datetime) -> None:
+        self._clock_offset = now - datetime.utcnow()
+
+    def clear(self) -> None:
+        """
+        The clear function resets the counts of every window.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._windows = {name: SlidingWindowCounter(*spec) for name, spec in WINDOWS.items()}
+
+    def add(self, time: datetime, tags: Iterable[str], now: datetime | None = None) -> None:
+        """
+        The add function counts the hashtags of a new post.
+
+        :param time: datetime: Creation time of the post
+        :param tags: Iterable[str]: Names of the hashtags of the post
+        :param now: datetime | None: The current time, defaults to the database clock
+        :return: None
+        :doc-author: Trelent
+        """
+        tags = list(tags)
+        if not tags or time is None:
+            return
+        now = now or self.now()
+        for window in self._windows.values():
+            window.add(time, tags, now)
+
+    def top(self, window: str, limit: int, now: datetime | None = None) -> list[dict]:
+        """
+        The top function returns the most used hashtags of a window.
+
+        :param window: str: Name of the window, one of WINDOWS
+        :param limit: int: Maximum number of hashtags, up to MAX_TOP
+        :param now: datetime | None: The current time, defaults to the database clock
+        :return: A list of dictionaries with the name and the count of the hashtags, most used first
+        :doc-author: Trelent
+        """
+        counts = self._windows[window].top(limit, now or self.now())
+        return [{"name": name, "count": count} for name, count in counts]
+
+    def load(self, db: Session, now: datetime | None = None) -> None:
+        """
+        The load function rebuilds the counts from the database: the hours already persisted
+        are read from tag_trend_buckets, the posts of the other ones from the posts table.
+
+        :param db: Session: Pass the database session to the function
+        :param now: datetime | None: The current time of the database clock, read from the database by default
+        :return: None
+        :doc-author: Trelent
+        """
+        now = now or database_now(db)
+        self._sync_clock(now)
+        persisted_until = persist_trend_buckets(db, now)
+        self.clear()
+        minutes = self._windows["1h"]
+        hourly = [self._windows["24h"], self._windows["7d"]]
+
+        buckets = {}
+        rows = db.query(TagTrendBucket.bucket_start, Hashtag.name, TagTrendBucket.count).join(
+            Hashtag, Hashtag.id == TagTrendBucket.hashtag_id
+        ).filter(TagTrendBucket.bucket_start >= now - LONGEST_WINDOW)
+        for bucket_start, name, count in rows:
+            buckets.setdefault(bucket_start, Counter())[name] += count
+        for bucket_start in sorted(buckets):
+            for window in hourly:
+                window.add(bucket_start, buckets[bucket_start], now)
+
+        # the minute buckets need the posts of the last hour even if it was persisted
+        since = min(persisted_until, now - HOUR)
+        rows = db.query(Post.created_dt, Hashtag.name).join(
+            post_hashtags, post_hashtags.c.post_id == Post.id
+        ).join(Hashtag, Hashtag.id == post_hashtags.c.hashtag_id).filter(
+            Post.created_dt >= since
+        ).order_by(Post.created_dt)
+        for created_dt, name in rows:
+            minutes.add(created_dt, (name,), now)
+            if created_dt >= persisted_until:
+                for window in hourly:
+                    window.add(created_dt, (name,), now)
+
+    def persist(self) -> None:
+        db = self.session_factory()
+        try:
+            now = database_now(db)
+            self._sync_clock(now)
+            persist_trend_buckets(db, now)
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            try:
+                await run_in_threadpool(self.persist)
+            except Exception:
+                logger.exception("Persisting the trending hashtags failed")
+
+    async def start(self) -> None:
+        """
+        The start function starts the task that persists the hourly counts.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        The stop function stops the task that persists the hourly counts.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+trending_tags = TrendingTags(persist_interval=settings.trending_persist_interval)
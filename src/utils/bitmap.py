@@ -0,0 +1,186 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator
+
+
+# containers with more values than this are stored as bitsets, like in roaring bitmaps
+ARRAY_MAX = 4096
+CONTAINER_BYTES = 65536 // 8
+
+
+def _array_to_bits(values: array) -> int:
+    buffer = bytearray(CONTAINER_BYTES)
+    for value in values:
+        buffer[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _bits_to_array(bits: int) -> array:
+    data = bits.to_bytes(CONTAINER_BYTES, "little")
+    return array("H", [i * 8 + j for i, byte in enumerate(data) if byte for j in range(8) if byte >> j & 1])
+
+
+def _bits_or_none(bits: int) -> int | None:
+    # results of operations stay bitsets, converting them to arrays costs more than it saves
+    return bits or None
+
+
+def _normalize(bits: int) -> int | array | None:
+    count = bits.bit_count()
+    if count == 0:
+        return None
+    return _bits_to_array(bits) if count <= ARRAY_MAX else bits
+
+
+def _from_set(values: set[int]) -> int | array | None:
+    if not values:
+        return None
+    values = array("H", sorted(values))
+    return values if len(values) <= ARRAY_MAX else _array_to_bits(values)
+
+
+def _filter(values: array, bits: int, keep: bool) -> array | None:
+    data = bits.to_bytes(CONTAINER_BYTES, "little")
+    result = array("H", [value for value in values if bool(data[value >> 3] >> (value & 7) & 1) == keep])
+    return result or None
+
+
+def _and(a, b):
+    if isinstance(a, array) and isinstance(b, array):
+        return _from_set(set(a).intersection(b))
+    if isinstance(a, array):
+        return _filter(a, b, True)
+    if isinstance(b, array):
+        return _filter(b, a, True)
+    return _bits_or_none(a & b)
+
+
+def _or(a, b):
+    if isinstance(a, array) and isinstance(b, array):
+        return _from_set(set(a).union(b))
+    return (a if isinstance(a, int) else _array_to_bits(a)) | (b if isinstance(b, int) else _array_to_bits(b))
+
+
+def _andnot(a, b):
+    if isinstance(a, array) and isinstance(b, array):
+        return _from_set(set(a).difference(b))
+    if isinstance(a, array):
+        return _filter(a, b, False)
+    return _bits_or_none(a & ~(b if isinstance(b, int) else _array_to_bits(b)))
+
+
+class Bitmap:
+    """
+    Compressed set of non-negative integers, in the style of roaring bitmaps.
+
+    Values are split by their upper bits into containers of 65536 values. A container with at most
+    ARRAY_MAX values is a sorted array of 16 bit integers, a fuller one is a 65536 bit integer,
+    so sparse and dense sets both stay small and set operations run container by container.
+    Bitsets produced by an operation are kept as they are, even when they hold few values.
+    """
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._containers: dict[int, int | array] = {}
+        groups = {}
+        for value in values:
+            groups.setdefault(value >> 16, set()).add(value & 0xFFFF)
+        for high, lows in groups.items():
+            self._containers[high] = _from_set(lows)
+
+    @classmethod
+    def _wrap(cls, containers: dict) -> "Bitmap":
+        bitmap = cls()
+        bitmap._containers = {high: container for high, container in containers.items() if container is not None}
+        return bitmap
+
+    def __len__(self):
+        return sum(len(c) if isinstance(c, array) else c.bit_count() for c in self._containers.values())
+
+    def __bool__(self):
+        return bool(self._containers)
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def add(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            self._containers[high] = array("H", [low])
+        elif isinstance(container, int):
+            self._containers[high] = container | 1 << low
+        else:
+            index = bisect_left(container, low)
+            if index == len(container) or container[index] != low:
+                container.insert(index, low)
+                if len(container) > ARRAY_MAX:
+                    self._containers[high] = _array_to_bits(container)
+
+    def discard(self, value: int) -> None:
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = _normalize(container & ~(1 << low)) if container >> low & 1 else container
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                del container[index]
+            container = container or None
+        if container is None:
+            del self._containers[high]
+        else:
+            self._containers[high] = container
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        return self._wrap({
+            high: _and(container, other._containers[high])
+            for high, container in self._containers.items() if high in other._containers
+        })
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        containers = {high: container if isinstance(container, int) else array("H", container)
+                      for high, container in self._containers.items()}
+        for high, container in other._containers.items():
+            containers[high] = _or(containers[high], container) if high in containers else container
+        return self._wrap(containers)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        return self._wrap({
+            high: _andnot(container, other._containers[high]) if high in other._containers else container
+            for high, container in self._containers.items()
+        })
+
+    def descending(self, before: int | None = None) -> Iterator[int]:
+        """
+        The descending function iterates over the values from the largest to the smallest.
+
+        :param before: int | None: Only return values lower than before
+        :return: An iterator over the values
+        :doc-author: Trelent
+        """
+        for high in sorted(self._containers, reverse=True):
+            base = high << 16
+            if before is not None and base >= before:
+                continue
+            limit = 65536 if before is None else min(before - base, 65536)
+            container = self._containers[high]
+            if isinstance(container, int):
+                bits = container & ((1 << limit) - 1)
+                while bits:
+                    top = bits.bit_length() - 1
+                    yield base + top
+                    bits ^= 1 << top
+            else:
+                for index in range(bisect_left(container, limit) - 1, -1, -1):
+                    yield base + container[index]
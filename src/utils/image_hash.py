@@ -0,0 +1,36 @@
+from typing import BinaryIO
+
+import numpy as np
+from fastapi import HTTPException, status
+from PIL import Image, UnidentifiedImageError
+
+
+HASH_SIZE = 8
+
+
+def compute_dhash(file: BinaryIO) -> str:
+    """
+    The compute_dhash function computes the 64 bit difference hash of an image.
+    The image is shrunk to 9x8 grayscale pixels and every bit tells whether a pixel is brighter
+    than its right neighbour, so resized or recompressed copies get the same or a very close hash.
+    Images that can't be decoded, such as truncated files, raise 415.
+    The file position is reset to the beginning afterwards.
+
+    :param file: BinaryIO: The uploaded file
+    :return: The hash as a 16 character hex string
+    :doc-author: Trelent
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            img.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))
+            img = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+            pixels = np.asarray(img, dtype=np.int16)
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+    finally:
+        file.seek(0)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return f"{value:016x}"
+
@@ -0,0 +1,122 @@
+from datetime import datetime
+from typing import BinaryIO
+
+from fastapi import HTTPException, status
+from PIL import Image, UnidentifiedImageError
+
+from src.conf.config import settings
+
+
+EXIF_IFD_POINTER = 0x8769
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# leading bytes of the image formats we accept, checked before anything else is done with an upload
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+SIGNATURE_LENGTH = 12
+
+
+def sniff_image_format(head: bytes) -> str | None:
+    """
+    The sniff_image_format function recognizes an image format from the first bytes of a file.
+
+    :param head: bytes: At least the first SIGNATURE_LENGTH bytes of the file
+    :return: The name of the format, or None if the bytes don't start a supported image
+    :doc-author: Trelent
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def validate_image_file(file: BinaryIO) -> None:
+    """
+    The validate_image_file function rejects uploads above settings.max_upload_bytes with 413
+    and files that don't start with a supported image signature with 415.
+    Only the first bytes are read, the file position is reset to the beginning afterwards.
+
+    :param file: BinaryIO: The uploaded file
+    :return: None
+    :doc-author: Trelent
+    """
+    file.seek(0, 2)
+    byte_size = file.tell()
+    file.seek(0)
+    head = file.read(SIGNATURE_LENGTH)
+    file.seek(0)
+    if byte_size > settings.max_upload_bytes:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large")
+    if sniff_image_format(head) is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+
+
+def _get_taken_at(exif_bytes: bytes | None) -> datetime | None:
+    """
+    The _get_taken_at function reads the capture date from raw exif data.
+    DateTimeOriginal is preferred, DateTime is used as a fallback.
+
+    :param exif_bytes: bytes | None: Raw exif block of the image
+    :return: The capture date or None if it is missing or malformed
+    :doc-author: Trelent
+    """
+    if not exif_bytes:
+        return None
+    exif = Image.Exif()
+    try:
+        exif.load(exif_bytes)
+        value = exif.get_ifd(EXIF_IFD_POINTER).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        if value:
+            return datetime.strptime(value.strip("\x00 "), EXIF_DATETIME_FORMAT)
+    except (ValueError, SyntaxError, OSError):
+        pass
+    return None
+
+
+def extract_image_metadata(file: BinaryIO) -> dict:
+    """
+    The extract_image_metadata function reads width, height, format, byte size and capture date of an image.
+    Only the header and the exif block are parsed, pixel data is never decoded.
+    Images that are not recognized or whose header is truncated raise 415, images above settings.max_image_pixels raise 413.
+    The file position is reset to the beginning afterwards.
+
+    :param file: BinaryIO: The uploaded file
+    :return: A dictionary with the width, height, image_format, byte_size and taken_at keys
+    :doc-author: Trelent
+    """
+    file.seek(0, 2)
+    byte_size = file.tell()
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            width, height = img.size
+            metadata = {
+                "width": width,
+                "height": height,
+                "image_format": img.format,
+                "byte_size": byte_size,
+                "taken_at": _get_taken_at(img.info.get("exif")),
+            }
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Image dimensions are too large")
+    finally:
+        file.seek(0)
+
+    if width * height > settings.max_image_pixels:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Image dimensions are too large")
+    return metadata
@@ -0,0 +1,99 @@
+from typing import BinaryIO
+
+import numpy as np
+from fastapi import HTTPException, status
+from PIL import Image, UnidentifiedImageError
+
+
+BASE83_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+# the hash only keeps a few cosine components, so a tiny image is enough
+SAMPLE_SIZE = 32
+
+
+def _encode_base83(value: int, length: int) -> str:
+    return "".join(
+        BASE83_CHARACTERS[(value // 83 ** (length - i)) % 83]
+        for i in range(1, length + 1)
+    )
+
+
+def _srgb_to_linear(pixels: np.ndarray) -> np.ndarray:
+    v = pixels / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode_blurhash(pixels: np.ndarray, components_x: int = 4, components_y: int = 3) -> str:
+    """
+    The encode_blurhash function encodes an RGB pixel array as a BlurHash string.
+    All cosine components are computed at once with a single tensor contraction.
+
+    :param pixels: np.ndarray: Array of shape (height, width, 3) with values from 0 to 255
+    :param components_x: int: Number of horizontal components, from 1 to 9
+    :param components_y: int: Number of vertical components, from 1 to 9
+    :return: The BlurHash string
+    :doc-author: Trelent
+    """
+    height, width, _ = pixels.shape
+    linear = _srgb_to_linear(pixels.astype(np.float64))
+
+    basis_x = np.cos(np.pi * np.arange(components_x)[:, None] * np.arange(width)[None, :] / width)
+    basis_y = np.cos(np.pi * np.arange(components_y)[:, None] * np.arange(height)[None, :] / height)
+    factors = np.einsum("jy,ix,yxc->jic", basis_y, basis_x, linear) / (width * height)
+    factors[1:, :, :] *= 2
+    factors[0, 1:, :] *= 2
+    factors = factors.reshape(-1, 3)
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode_base83((components_x - 1) + (components_y - 1) * 9, 1)
+
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum_value = (quantised_max + 1) / 166
+    else:
+        quantised_max = 0
+        maximum_value = 1
+    result += _encode_base83(quantised_max, 1)
+
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _encode_base83((r << 16) + (g << 8) + b, 4)
+
+    scaled = ac / maximum_value
+    quantised = np.clip(np.floor(np.sign(scaled) * np.abs(scaled) ** 0.5 * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _encode_base83(int(qr) * 19 * 19 + int(qg) * 19 + int(qb), 2)
+    return result
+
+
+def compute_blurhash(file: BinaryIO, components_x: int = 4, components_y: int = 3) -> str:
+    """
+    The compute_blurhash function computes the BlurHash placeholder of an uploaded image.
+    JPEG images are decoded at reduced scale with draft mode, then everything is downsampled
+    to SAMPLE_SIZE pixels before encoding. It is CPU bound, so callers on the event loop
+    should run it in a thread. Images that can't be decoded, such as truncated files, raise 415.
+    The file position is reset to the beginning afterwards.
+
+    :param file: BinaryIO: The uploaded file
+    :param components_x: int: Number of horizontal components
+    :param components_y: int: Number of vertical components
+    :return: The BlurHash string
+    :doc-author: Trelent
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            img.draft("RGB", (SAMPLE_SIZE, SAMPLE_SIZE))
+            img = img.convert("RGB")
+            img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+            pixels = np.asarray(img)
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Unsupported image format")
+    finally:
+        file.seek(0)
+    return encode_blurhash(pixels, components_x, components_y)
@@ -1,34 +1,122 @@
+import time
 import cloudinary
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 from src.utils.qr_code import get_qr_code_by_url
+from src.utils.image_variants import build_variant_urls
 from src.database.models import Post, User
+from src.services.feed import feed_cache
+from src.services.tag_index import tag_index
+from src.services.trending import trending_tags
+from src.services.timeline import schedule_fan_out
 from src.conf.config import settings
 
 
-async def transform_image(
-    image_id: int,
-    transform_params: dict,
-    description: str,
-    db: Session,
-    current_user: User,
-    service: cloudinary = cloudinary
-) -> Post:
+class PreviewCache:
     """
-    The transform_image function takes an image_id, transform_params, description and db as arguments.
-    It then queries the database for a Post with the given id. If no such post exists it raises a 404 error.
-    If the user is not authorized to access this post (i.e., if they are not its author) it raises a 403 error instead.
-    The function then configures cloudinary using settings from settings module and builds an url for transformed image using 
-    the public id of original image and transform params provided by user in request body (see docs/transformations). 
-    Then it gets qr code url for new
-    
+    Short-lived cache of transformation previews.
+
+    Entries are keyed by user, image and transformation parameters, so repeated
+    previews of the same slider position are answered without touching the database.
+    The cache also remembers which urls were previewed by which user, so a later
+    commit can only persist a version that was actually offered to that user.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._previews = {}
+        self._urls = {}
+
+    @staticmethod
+    def make_key(user_id: int, image_id: int, transform_params: dict) -> tuple:
+        """
+        The make_key function builds a hashable cache key for a preview.
+
+        :param user_id: int: Id of the user asking for the preview
+        :param image_id: int: Id of the source image
+        :param transform_params: dict: Transformation parameters of the preview
+        :return: A tuple usable as a dictionary key
+        :doc-author: Trelent
+        """
+        return user_id, image_id, tuple(sorted(transform_params.items()))
+
+    def get(self, key: tuple) -> str | None:
+        """
+        The get function returns the cached preview url for the key, or None if it is missing or expired.
+
+        :param key: tuple: Key built by make_key
+        :return: The cached url or None
+        :doc-author: Trelent
+        """
+        entry = self._previews.get(key)
+        if entry is None:
+            return None
+        expires_at, url = entry
+        if expires_at < time.monotonic():
+            self._previews.pop(key, None)
+            return None
+        return url
+
+    def put(self, key: tuple, url: str) -> None:
+        """
+        The put function stores a preview url and remembers it as committable for its user and image.
+
+        :param key: tuple: Key built by make_key
+        :param url: str: Url of the transformed image
+        :return: None
+        :doc-author: Trelent
+        """
+        expires_at = time.monotonic() + self.ttl
+        self._previews[key] = (expires_at, url)
+        self._urls[(key[0], key[1], url)] = (expires_at, dict(key[2]))
+        self._evict_expired()
+
+    def get_previewed_params(self, user_id: int, image_id: int, url: str) -> dict | None:
+        """
+        The get_previewed_params function returns the transformation parameters of a url
+        recently previewed by the user for the image.
+
+        :param user_id: int: Id of the user committing the preview
+        :param image_id: int: Id of the source image
+        :param url: str: Url of the chosen version
+        :return: The transformation parameters, or None if the preview is missing or expired
+        :doc-author: Trelent
+        """
+        entry = self._urls.get((user_id, image_id, url))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def clear(self) -> None:
+        """
+        The clear function drops all cached previews.
+
+        :return: None
+        :doc-author: Trelent
+        """
+        self._previews.clear()
+        self._urls.clear()
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._previews.items() if expires_at < now]:
+            del self._previews[key]
+        for key in [k for k, (expires_at, _) in self._urls.items() if expires_at < now]:
+            del self._urls[key]
+
+
+preview_cache = PreviewCache(ttl=settings.transformation_preview_ttl)
+
+
+def get_image_for_transformation(image_id: int, db: Session, current_user: User) -> Post:
+    """
+    The get_image_for_transformation function loads the source image of a transformation
+    and checks that the current user is its author.
+
     :param image_id: int: Specify the image that is to be transformed
-    :param transform_params: dict: Pass in the transformation parameters
-    :param description: str: Set the description of the new image
     :param db: Session: Access the database
     :param current_user: User: Get the user's id
-    :param service: cloudinary: Pass in the cloudinary library
-    :return: A new image with the transformation applied
+    :return: The source post
     :doc-author: Trelent
     """
     image: Post = db.query(Post).filter(
@@ -44,7 +132,38 @@ async def transform_image(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
+    return image
+
+
+def get_public_id(image: Post) -> str:
+    """
+    The get_public_id function returns the cloudinary public id of the image.
+
+    :param image: Post: The source image
+    :return: The public id of the image
+    :doc-author: Trelent
+    """
+    filename = image.image_url.split("/")[-1].split(".")[0]
+    return f'{settings.cloudinary_folder_name}/{filename}'
+
+
+def build_transformed_url(image: Post, transform_params: dict, service: cloudinary = cloudinary) -> str:
+    """
+    The build_transformed_url function builds the cloudinary url of the image with the transformation applied.
+    No request is sent to cloudinary, the transformation is applied on the fly when the url is fetched.
 
+    :param image: Post: The source image
+    :param transform_params: dict: Pass in the transformation parameters
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: The url of the transformed image
+        Raises 501 if the images are not stored on cloudinary
+    :doc-author: Trelent
+    """
+    if settings.storage_backend != "cloudinary":
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Transformations need the cloudinary storage"
+        )
     service.config(
         cloud_name=settings.cloudinary_name,
         api_key=settings.cloudinary_api_key,
@@ -52,24 +171,143 @@ async def transform_image(
         secure=True
     )
 
-    filename = image.image_url.split("/")[-1].split(".")[0]
-    public_id = f'{settings.cloudinary_folder_name}/{filename}'
-
-    url = service.CloudinaryImage(public_id=public_id).build_url(
+    return service.CloudinaryImage(public_id=get_public_id(image)).build_url(
         **transform_params
     )
 
+
+async def save_transformed_image(
+    image: Post,
+    url: str,
+    transform_params: dict,
+    description: str,
+    db: Session,
+    current_user: User,
+    service: cloudinary = cloudinary
+) -> Post:
+    """
+    The save_transformed_image function persists a transformed version of the image as a new post
+    and generates its qr code.
+
+    :param image: Post: The source image
+    :param url: str: Url of the transformed image
+    :param transform_params: dict: Transformation applied to the image, used for the resized variants
+    :param description: str: Set the description of the new image
+    :param db: Session: Access the database
+    :param current_user: User: Get the user's id
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: The new post
+    :doc-author: Trelent
+    """
     qr_code_url = await get_qr_code_by_url(url=url, service=service)
+    variants = build_variant_urls(get_public_id(image), transform_params, service=service)
 
     new_image = Post(
         description=description,
         author_id=current_user.id,
         image_url=url,
+        variants=variants,
         qr_code_url=qr_code_url,
         hashtags=image.hashtags
     )
 
     db.add(new_image)
+    db.flush()
+    schedule_fan_out(db, new_image)
     db.commit()
     db.refresh(new_image)
+    feed_cache.add(new_image)
+    tag_names = [tag.name for tag in new_image.hashtags]
+    tag_index.add(new_image.id, tag_names)
+    trending_tags.add(new_image.created_dt, tag_names)
     return new_image
+
+
+async def transform_image(
+    image_id: int,
+    transform_params: dict,
+    description: str,
+    db: Session,
+    current_user: User,
+    service: cloudinary = cloudinary
+) -> Post:
+    """
+    The transform_image function takes an image_id, transform_params, description and db as arguments.
+    It then queries the database for a Post with the given id. If no such post exists it raises a 404 error.
+    If the user is not authorized to access this post (i.e., if they are not its author) it raises a 403 error instead.
+    The function then configures cloudinary using settings from settings module and builds an url for transformed image using
+    the public id of original image and transform params provided by user in request body (see docs/transformations).
+    Then it gets qr code url for new
+
+    :param image_id: int: Specify the image that is to be transformed
+    :param transform_params: dict: Pass in the transformation parameters
+    :param description: str: Set the description of the new image
+    :param db: Session: Access the database
+    :param current_user: User: Get the user's id
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: A new image with the transformation applied
+    :doc-author: Trelent
+    """
+    image = get_image_for_transformation(image_id, db, current_user)
+    url = build_transformed_url(image, transform_params, service)
+    return await save_transformed_image(image, url, transform_params, description, db, current_user, service)
+
+
+async def preview_transform_image(
+    image_id: int,
+    transform_params: dict,
+    db: Session,
+    current_user: User,
+    service: cloudinary = cloudinary
+) -> dict:
+    """
+    The preview_transform_image function returns the url of the transformed image without
+    creating a post or a qr code. Previews are cached for a short time, so repeated calls
+    with the same parameters don't hit the database.
+
+    :param image_id: int: Specify the image that is to be transformed
+    :param transform_params: dict: Pass in the transformation parameters
+    :param db: Session: Access the database
+    :param current_user: User: Get the user's id
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: A dictionary with the image id and the url of the preview
+    :doc-author: Trelent
+    """
+    key = preview_cache.make_key(current_user.id, image_id, transform_params)
+    url = preview_cache.get(key)
+    if url is None:
+        image = get_image_for_transformation(image_id, db, current_user)
+        url = build_transformed_url(image, transform_params, service)
+        preview_cache.put(key, url)
+    return {"image_id": image_id, "image_url": url}
+
+
+async def commit_transformed_image(
+    image_id: int,
+    image_url: str,
+    description: str,
+    db: Session,
+    current_user: User,
+    service: cloudinary = cloudinary
+) -> Post:
+    """
+    The commit_transformed_image function persists a version previously returned by preview_transform_image.
+    If the url was not previewed by the current user or the preview has expired it raises a 404 error.
+
+    :param image_id: int: Specify the source image
+    :param image_url: str: Url of the chosen preview
+    :param description: str: Set the description of the new image
+    :param db: Session: Access the database
+    :param current_user: User: Get the user's id
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: The new post
+    :doc-author: Trelent
+    """
+    transform_params = preview_cache.get_previewed_params(current_user.id, image_id, image_url)
+    if transform_params is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Preview not found or expired"
+        )
+    image = get_image_for_transformation(image_id, db, current_user)
+    return await save_transformed_image(image, image_url, transform_params, description, db, current_user, service)
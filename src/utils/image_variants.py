@@ -0,0 +1,55 @@
+import cloudinary
+
+from src.conf.config import settings
+
+
+# applied on delivery, so browsers that support WebP/AVIF get them
+DELIVERY_PARAMS = {"fetch_format": "auto", "quality": "auto"}
+
+
+def _variant_chain(preset: dict, base_transformation: dict | None = None) -> list[dict]:
+    chain = [base_transformation] if base_transformation else []
+    return chain + [dict(preset), DELIVERY_PARAMS]
+
+
+def get_eager_transformations(presets: dict[str, dict] | None = None) -> list[dict]:
+    """
+    The get_eager_transformations function returns the list of transformations that cloudinary
+    should generate right after the upload, one for every size preset.
+    Cloudinary serves a derived image only for the exact transformation it was generated with,
+    so every entry is the same chain as the one of the variant url.
+
+    :param presets: dict[str, dict]: Size presets, defaults to settings.image_variant_presets
+    :return: A list of transformations for the eager upload option
+    :doc-author: Trelent
+    """
+    if presets is None:
+        presets = settings.image_variant_presets
+    return [{"transformation": _variant_chain(preset)} for preset in presets.values()]
+
+
+def build_variant_urls(
+    public_id: str,
+    base_transformation: dict | None = None,
+    presets: dict[str, dict] | None = None,
+    service: cloudinary = cloudinary
+) -> dict[str, str]:
+    """
+    The build_variant_urls function builds the urls of the resized versions of the image.
+    If base_transformation is given (crop, effect, ...) the preset is chained after it.
+
+    :param public_id: str: Public id of the image on cloudinary
+    :param base_transformation: dict | None: Transformation applied before resizing
+    :param presets: dict[str, dict]: Size presets, defaults to settings.image_variant_presets
+    :param service: cloudinary: Pass in the cloudinary library
+    :return: A dictionary with preset names as keys and urls as values
+    :doc-author: Trelent
+    """
+    if presets is None:
+        presets = settings.image_variant_presets
+    variants = {}
+    for name, preset in presets.items():
+        variants[name] = service.CloudinaryImage(public_id).build_url(
+            transformation=_variant_chain(preset, base_transformation)
+        )
+    return variants
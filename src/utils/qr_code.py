@@ -3,16 +3,18 @@ import uuid
 import qrcode
 import cloudinary
 import cloudinary.uploader
+from fastapi.concurrency import run_in_threadpool
 
 from src.conf.config import settings
+from src.services.storage import CloudinaryStorage, storage
 
 
-async def get_qr_code_by_url(url: str, service: cloudinary=cloudinary) -> str:
+async def get_qr_code_by_url(url: str, service: cloudinary=None) -> str:
     """
     The get_qr_code_by_url function takes a url as an argument and returns the URL of a QR code image.
     
     :param url: str: Specify the url that will be encoded in the qr code
-    :param service: cloudinary: Specify the cloudinary service that will be used to upload the image
+    :param service: cloudinary: Specify the cloudinary service that will be used to upload the image, defaults to the configured storage
     :return: The url of a qr code image
     :doc-author: Trelent
     """
@@ -31,22 +33,12 @@ async def get_qr_code_by_url(url: str, service: cloudinary=cloudinary) -> str:
     img.save(b, 'png')
     img_bytes = b.getvalue()
 
-    service.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
+    backend = CloudinaryStorage(service) if service is not None else storage
     public_id = f'{settings.cloudinary_folder_name}/qrcode/{uuid.uuid4()}'
 
-    service.uploader.upload(
-        img_bytes,
-        public_id=public_id,
-        overwrite=True
-    )
+    await run_in_threadpool(backend.save, img_bytes, public_id)
 
-    src_url = service.CloudinaryImage(public_id).build_url()
+    src_url = backend.url(public_id)
 
     return src_url
 
@@ -0,0 +1,53 @@
+from fastapi import HTTPException, status
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# room for the multipart boundaries and the other form fields of an upload
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware that rejects request bodies above max_body_size with 413.
+
+    A declared Content-Length above the limit is refused before the body is read. Bodies without
+    a Content-Length, or with a wrong one, are counted while they stream in and the request fails
+    as soon as the limit is crossed, so an oversized upload is never spooled to disk as a whole.
+    Paths listed in path_limits use their own limit instead of max_body_size.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, path_limits: dict[str, int] | None = None):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_body_size = self.path_limits.get(scope["path"], self.max_body_size)
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_body_size:
+            response = JSONResponse(
+                {"detail": "Request body is too large"},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail="Request body is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -116,14 +116,14 @@ def mock_get_qr_code_by_url(mocker):
 
 @pytest.fixture()
 def mock_cloudinary_uploader(mocker):
-    mocker.patch("src.routes.users.cloudinary.uploader")
+    mocker.patch("src.services.storage.cloudinary.uploader")
 
 
 @pytest.fixture()
 def mock_cloudinary_build_url(mocker):
     mock = Mock(return_value="avatar_url")
     mocker.patch(
-        "src.routes.users.cloudinary.CloudinaryImage.build_url",
+        "src.services.storage.cloudinary.CloudinaryImage.build_url",
         side_effect=mock
     )
 
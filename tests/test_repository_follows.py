@@ -0,0 +1,133 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Job, Post, TimelineEntry, User
+from src.repository.follows import follow_user, get_home_timeline, unfollow_user
+from src.services.timeline import FAN_OUT_JOB, fan_out, schedule_fan_out
+from tests.conftest import TestingSessionLocal
+
+
+def create_user(session: Session, name: str, followers_count: int = 0) -> User:
+    user = User(username=name, email=f"{name}@example.com", password="password", followers_count=followers_count)
+    session.add(user)
+    session.commit()
+    return user
+
+
+def create_post(session: Session, author: User) -> Post:
+    post = Post(description=f"post of {author.username}", image_url="http://test_url.com", author_id=author.id)
+    session.add(post)
+    session.flush()
+    schedule_fan_out(session, post)
+    session.commit()
+    return post
+
+
+def run_fan_out(session: Session) -> None:
+    jobs = session.query(Job).filter(Job.kind == FAN_OUT_JOB).all()
+    fan_out([job.payload for job in jobs], session_factory=TestingSessionLocal)
+    for job in jobs:
+        session.delete(job)
+    session.commit()
+    session.expire_all()
+
+
+def timeline_ids(page: dict) -> list[int]:
+    return [item["id"] for item in page["items"]]
+
+
+@pytest.mark.asyncio
+async def test_fan_out_on_write(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "timeline_size", 3)
+    reader = create_user(session, "reader")
+    author = create_user(session, "author")
+    old_post = create_post(session, author)
+
+    result = await follow_user(author.id, reader, session)
+    assert result == {"user_id": author.id, "followers_count": 1}
+    assert (await follow_user(author.id, reader, session))["followers_count"] == 1
+    with pytest.raises(Exception):
+        await follow_user(reader.id, reader, session)
+
+    posts = [create_post(session, author) for _ in range(3)]
+    assert session.query(Job).filter(Job.kind == FAN_OUT_JOB).count() == 3
+    run_fan_out(session)
+    entries = session.query(TimelineEntry.post_id).filter(TimelineEntry.user_id == reader.id)
+    assert sorted(post_id for (post_id,) in entries) == [post.id for post in posts]
+
+    page = await get_home_timeline(reader, None, 2, session)
+    assert timeline_ids(page) == [posts[2].id, posts[1].id]
+    page = await get_home_timeline(reader, page["next_cursor"], 2, session)
+    assert timeline_ids(page) == [posts[0].id]
+    assert old_post.id not in timeline_ids(page)
+
+    result = await unfollow_user(author.id, reader, session)
+    assert result["followers_count"] == 0
+    assert session.query(TimelineEntry).filter(TimelineEntry.user_id == reader.id).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_fan_out_on_read(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "timeline_fan_out_max_followers", 100)
+    reader = create_user(session, "reader2")
+    celebrity = create_user(session, "celebrity", followers_count=1000)
+    friend = create_user(session, "friend")
+    await follow_user(celebrity.id, reader, session)
+    await follow_user(friend.id, reader, session)
+
+    celebrity_post = create_post(session, celebrity)
+    friend_post = create_post(session, friend)
+    own_post = create_post(session, reader)
+    assert [job.payload["author_id"] for job in session.query(Job).filter(Job.kind == FAN_OUT_JOB)] == [friend.id]
+    run_fan_out(session)
+
+    page = await get_home_timeline(reader, None, 10, session)
+    assert timeline_ids(page) == [own_post.id, friend_post.id, celebrity_post.id]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_fan_out_is_decided_per_post(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "timeline_fan_out_max_followers", 1)
+    reader = create_user(session, "reader3")
+    other_reader = create_user(session, "other_reader3")
+    author = create_user(session, "rising_author")
+    await follow_user(author.id, reader, session)
+    fanned_out_post = create_post(session, author)
+    await follow_user(author.id, other_reader, session)
+    pulled_post = create_post(session, author)
+    assert (fanned_out_post.fanned_out, pulled_post.fanned_out) == (True, False)
+    run_fan_out(session)
+
+    # the author falls back under the limit, the post published above it is still read from the posts table
+    await unfollow_user(author.id, other_reader, session)
+    page = await get_home_timeline(reader, None, 10, session)
+    assert timeline_ids(page) == [pulled_post.id, fanned_out_post.id]
+
+    # a new follower gets the fanned out posts copied and reads the others
+    await follow_user(author.id, other_reader, session)
+    entries = session.query(TimelineEntry.post_id).filter(TimelineEntry.user_id == other_reader.id)
+    assert [post_id for (post_id,) in entries] == [fanned_out_post.id]
+    page = await get_home_timeline(other_reader, None, 10, session)
+    assert timeline_ids(page) == [pulled_post.id, fanned_out_post.id]
+
+
+def test_timeline_routes(client, session, get_token):
+    author = create_user(session, "route_author")
+    author_id, post_id = author.id, create_post(session, author).id
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.post(f"/api/users/{author_id}/follow", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"user_id": author_id, "followers_count": 1}
+    assert client.post("/api/users/9999/follow", headers=headers).status_code == 404
+
+    response = client.get("/api/images/timeline", headers=headers)
+    assert response.status_code == 200
+    assert post_id in timeline_ids(response.json())
+
+    response = client.delete(f"/api/users/{author_id}/follow", headers=headers)
+    assert response.json()["followers_count"] == 0
+    response = client.get("/api/images/timeline", headers=headers)
+    assert post_id not in timeline_ids(response.json())
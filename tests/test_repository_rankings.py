@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database.models import Post, PostRanking, Rating, User
+from src.repository.ratings import get_leaderboard
+from src.services.rankings import refresh_rankings
+
+
+NOW = datetime(2024, 5, 1, 12)
+
+
+def create_post(session: Session, ratings: list[int], age: timedelta = timedelta(hours=1)) -> Post:
+    post = Post(description="Ranked", image_url="http://test_url.com", author_id=1, created_dt=NOW - age)
+    session.add(post)
+    session.flush()
+    raters = session.query(User).order_by(User.id).limit(len(ratings)).all()
+    session.add_all([Rating(rating=value, user_id=user.id, image_id=post.id) for value, user in zip(ratings, raters)])
+    session.commit()
+    return post
+
+
+def result_ids(page: dict) -> list[int]:
+    return [item["id"] for item in page["items"]]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def raters(session: Session):
+    session.add_all([User(username=f"rater{i}", email=f"rater{i}@example.com", password="password") for i in range(10)])
+    session.commit()
+
+
+@pytest.fixture(autouse=True)
+def clean_ratings(session: Session):
+    yield
+    session.query(PostRanking).delete()
+    session.query(Rating).delete()
+    session.query(Post).delete()
+    session.commit()
+
+
+@pytest.mark.asyncio
+async def test_top_uses_bayesian_average(session: Session):
+    single_vote = create_post(session, [5])
+    many_good_votes = create_post(session, [4] * 10)
+    many_bad_votes = create_post(session, [1] * 10)
+    create_post(session, [])
+
+    assert refresh_rankings(session, NOW) == 3
+    page = await get_leaderboard("top", 10, None, session)
+    assert result_ids(page) == [many_good_votes.id, single_vote.id, many_bad_votes.id]
+    assert [item["average_rating"] for item in page["items"]] == [4, 5, 1]
+    assert [item["rating_count"] for item in page["items"]] == [10, 1, 10]
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_hot_decays_with_age(session: Session):
+    old = create_post(session, [5] * 10, age=timedelta(days=2))
+    new = create_post(session, [4] * 3)
+    newer_single_vote = create_post(session, [5], age=timedelta(minutes=5))
+
+    refresh_rankings(session, NOW)
+    page = await get_leaderboard("hot", 10, None, session)
+    assert result_ids(page) == [new.id, newer_single_vote.id, old.id]
+    assert page["items"][0]["score"] > page["items"][1]["score"] > page["items"][2]["score"] > 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_replaces_rankings(session: Session):
+    post = create_post(session, [2])
+    refresh_rankings(session, NOW)
+    session.query(Rating).delete()
+    session.commit()
+
+    assert refresh_rankings(session, NOW) == 0
+    assert (await get_leaderboard("top", 10, None, session))["items"] == []
+    assert session.get(PostRanking, post.id) is None
+
+
+@pytest.mark.asyncio
+async def test_leaderboard_pagination(session: Session):
+    # equal scores are paged by id
+    posts = [create_post(session, [3, 4]) for _ in range(5)]
+    refresh_rankings(session, NOW)
+
+    first = await get_leaderboard("top", 2, None, session)
+    second = await get_leaderboard("top", 2, first["next_cursor"], session)
+    third = await get_leaderboard("top", 2, second["next_cursor"], session)
+    ids = result_ids(first) + result_ids(second) + result_ids(third)
+    assert ids == sorted((post.id for post in posts), reverse=True)
+    assert third["next_cursor"] is None
+
+
+def test_leaderboard_route(client, session, get_token):
+    post_id = create_post(session, [5, 5, 4]).id
+    refresh_rankings(session)
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.get("/api/ratings/leaderboard?kind=hot", headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["id"] for item in response.json()["items"]] == [post_id]
+    assert response.json()["items"][0]["rating_count"] == 3
+
+    response = client.get("/api/ratings/leaderboard?kind=worst", headers=headers)
+    assert response.status_code == 422
+    response = client.get("/api/ratings/leaderboard?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
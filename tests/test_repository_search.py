@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database.models import Comments, Hashtag, Post
+from src.repository.images import search_images
+
+
+def create_post(session: Session, description: str, tags: list[str] = (), comments: list[str] = ()) -> Post:
+    post = Post(description=description, image_url="http://test_url.com", author_id=1,
+                hashtags=[Hashtag(name=name) for name in tags])
+    session.add(post)
+    session.flush()
+    session.add_all([Comments(text=comment, image_id=post.id, user_id=1) for comment in comments])
+    session.commit()
+    return post
+
+
+def result_ids(page: dict) -> list[int]:
+    return [item["id"] for item in page["items"]]
+
+
+@pytest.mark.asyncio
+async def test_search_fields_and_ranking(session: Session):
+    in_description = create_post(session, "Sunset over the harbour")
+    in_hashtags = create_post(session, "Evening walk", tags=["sunset"])
+    in_comments = create_post(session, "Boats", comments=["what a sunset!"])
+    create_post(session, "Mountains")
+
+    page = await search_images("sunset", 10, None, session)
+    assert result_ids(page) == [in_description.id, in_hashtags.id, in_comments.id]
+    assert page["items"][0]["score"] > page["items"][1]["score"] > page["items"][2]["score"]
+    assert page["next_cursor"] is None
+
+    assert result_ids(await search_images("SUNSET harbour", 10, None, session)) == [in_description.id]
+    assert result_ids(await search_images("sunset mountains", 10, None, session)) == []
+    assert result_ids(await search_images("* OR -", 10, None, session)) == []
+
+
+@pytest.mark.asyncio
+async def test_search_stays_in_sync(session: Session):
+    post = create_post(session, "Old lighthouse", comments=["foggy morning"])
+
+    post.description = "New lighthouse"
+    session.commit()
+    assert result_ids(await search_images("new lighthouse", 10, None, session)) == [post.id]
+    assert result_ids(await search_images("old", 10, None, session)) == []
+
+    comment = session.query(Comments).filter(Comments.image_id == post.id).first()
+    assert result_ids(await search_images("foggy", 10, None, session)) == [post.id]
+    session.delete(comment)
+    session.commit()
+    assert result_ids(await search_images("foggy", 10, None, session)) == []
+
+    post.hashtags.append(Hashtag(name="coast"))
+    session.commit()
+    assert result_ids(await search_images("coast", 10, None, session)) == [post.id]
+
+    session.delete(post)
+    session.commit()
+    assert result_ids(await search_images("lighthouse", 10, None, session)) == []
+
+
+@pytest.mark.asyncio
+async def test_search_pagination(session: Session):
+    posts = [create_post(session, "forest trail") for _ in range(5)]
+
+    first = await search_images("forest", 2, None, session)
+    second = await search_images("forest", 2, first["next_cursor"], session)
+    third = await search_images("forest", 2, second["next_cursor"], session)
+    ids = result_ids(first) + result_ids(second) + result_ids(third)
+    assert sorted(ids) == sorted(post.id for post in posts)
+    assert third["next_cursor"] is None
+
+
+def test_search_route(client, session, get_token):
+    post_id = create_post(session, "Route search kitten").id
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.get("/api/images/search?q=kitten", headers=headers)
+    assert response.status_code == 200, response.text
+    assert [item["id"] for item in response.json()["items"]] == [post_id]
+
+    response = client.get("/api/images/search?q=kitten&cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
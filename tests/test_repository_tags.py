@@ -2,7 +2,7 @@ import pytest
 from sqlalchemy.orm import Session
 
 from src.database.models import Hashtag
-from src.repository.tags import get_or_create_tag
+from src.repository.tags import get_or_create_tag, get_or_create_tags
 
 
 @pytest.mark.asyncio
@@ -25,3 +25,17 @@ async def test_get_or_create_tag(session: Session):
     assert existing_tag is not None
     assert existing_tag.id == tag.id
     assert existing_tag.name == tag.name
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_tags(session: Session):
+    existing = await get_or_create_tag(session, "existing_tag")
+
+    tags = await get_or_create_tags(session, ["new_tag", "existing_tag", "new_tag"])
+    session.commit()
+
+    assert list(tags) == ["new_tag", "existing_tag"]
+    assert tags["existing_tag"].id == existing.id
+    assert tags["new_tag"].id is not None
+    assert session.query(Hashtag).filter(Hashtag.name == "new_tag").count() == 1
+    assert await get_or_create_tags(session, []) == {}
@@ -141,3 +141,16 @@ def test_unban_user(client, session, second_user, get_token):
         User.id == banned_user_id
     ).first()
     assert banned_user.is_active == True
+
+
+def test_get_job_metrics(client, get_token):
+    token = get_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(
+        "/api/admin/jobs",
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert "depth" in data
+    assert "oldest_pending_seconds" in data
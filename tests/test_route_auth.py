@@ -1,17 +1,14 @@
-from unittest.mock import MagicMock
-from src.database.models import User
+from src.database.models import User, Job
 from src.services.auth import auth_service
 
 
-def test_create_user(client, user, session, monkeypatch):
+def test_create_user(client, user, session):
     existed_user = session.query(User).filter(
         User.email == user["email"]
     ).first()
     session.delete(existed_user)
     session.commit()
 
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -20,6 +17,8 @@ def test_create_user(client, user, session, monkeypatch):
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    job = session.query(Job).filter(Job.kind == "send_email").order_by(Job.id.desc()).first()
+    assert job.payload["email"] == user.get("email")
 
 
 def test_repeat_create_user(client, user):
@@ -175,9 +174,7 @@ def test_already_confirmed_email_request(client, user):
     assert data["message"] == "Your email is already confirmed"
 
 
-def test_email_request(client, user, monkeypatch, session):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_email_request(client, user, session):
     current_user: User = session.query(User).filter(
         User.email == user['email']
     ).first()
@@ -190,3 +187,4 @@ def test_email_request(client, user, monkeypatch, session):
     assert response.status_code == 200, response.text
     data = response.json()
     assert data["message"] == "Check your email for confirmation."
+    assert session.query(Job).filter(Job.kind == "send_email").count() == 2
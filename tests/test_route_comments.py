@@ -224,3 +224,33 @@ def test_delete_comment_not_found(client, get_token, session, user):
     assert response.status_code == 404, response.text
     data = response.json()
     assert data["detail"] == "Comment not found"
+
+
+def test_get_comments_batch(client, session):
+    from datetime import datetime, timedelta
+
+    posts = [Post(description="batch", image_url="http://test_url.com", author_id=1) for _ in range(3)]
+    session.add_all(posts)
+    session.commit()
+    start = datetime(2024, 1, 1)
+    session.add_all([
+        Comments(text=f"post {index} comment {i}", image_id=post.id, user_id=1, created_at=start + timedelta(minutes=i))
+        for index, post in enumerate(posts[:2])
+        for i in range(index + 2)
+    ])
+    session.commit()
+    ids = [post.id for post in posts]
+
+    response = client.get(f"/api/comments/batch?image_ids={ids[1]}&image_ids={ids[0]}&image_ids={ids[2]}"
+                          f"&image_ids={ids[1]}&per_image=2")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [item["image_id"] for item in data] == [ids[1], ids[0], ids[2]]
+    assert [comment["text"] for comment in data[0]["comments"]] == ["post 1 comment 2", "post 1 comment 1"]
+    assert [comment["text"] for comment in data[1]["comments"]] == ["post 0 comment 1", "post 0 comment 0"]
+    assert data[2]["comments"] == []
+
+    response = client.get("/api/comments/batch?" + "&".join(f"image_ids={i}" for i in range(1, 52)))
+    assert response.status_code == 400, response.text
+    response = client.get("/api/comments/batch")
+    assert response.status_code == 422, response.text
@@ -0,0 +1,215 @@
+import io
+from unittest.mock import AsyncMock
+
+import pytest
+from cloudinary.exceptions import NotFound
+from cloudinary.utils import api_sign_request
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src.conf.config import settings
+
+
+# stand-in for the cloudinary upload api, it checks the signature of the form like cloudinary does
+# and answers with a signed upload response
+def create_fake_storage():
+    storage = FastAPI()
+    storage.state.files = {}
+    storage.state.resources = {}
+
+    @storage.post("/v1_1/{cloud_name}/image/upload")
+    async def upload(request: Request, file: UploadFile = File(...), api_key: str = Form(...)):
+        form = await request.form()
+        params = {key: value for key, value in form.items() if key not in ("file", "api_key", "signature")}
+        if api_key != settings.cloudinary_api_key or \
+                form["signature"] != api_sign_request(params, settings.cloudinary_api_secret):
+            raise HTTPException(status_code=401, detail="Invalid Signature")
+        data = await file.read()
+        storage.state.files[params["public_id"]] = data
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+        version = 1700000000
+        resource = {"public_id": params["public_id"], "version": version, "format": "png",
+                    "width": width, "height": height, "bytes": len(data)}
+        storage.state.resources[params["public_id"]] = resource
+        return {
+            **resource,
+            "signature": api_sign_request({"public_id": params["public_id"], "version": version},
+                                          settings.cloudinary_api_secret),
+            "secure_url": "https://evil.example.com/not-our-image.png",
+        }
+
+    return storage
+
+
+@pytest.fixture()
+def storage(mocker):
+    storage = create_fake_storage()
+
+    # stand-in for the admin api, it answers with what the fake storage received
+    def resource(public_id, **options):
+        if public_id not in storage.state.resources:
+            raise NotFound(f"Resource not found - {public_id}")
+        return dict(storage.state.resources[public_id])
+
+    mocker.patch("cloudinary.api.resource", side_effect=resource)
+    return storage
+
+
+@pytest.fixture()
+def mock_qr_code(mocker):
+    mocker.patch("src.repository.images.get_qr_code_by_url", AsyncMock(return_value="qr_code_url"))
+
+
+def upload_to_storage(storage, upload):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), (0, 0, 255)).save(buffer, format="PNG")
+    path = upload["upload_url"].split("api.cloudinary.com", 1)[1]
+    response = TestClient(storage).post(
+        path,
+        data={key: str(value) for key, value in upload["params"].items()},
+        files={"file": ("photo.png", buffer.getvalue(), "image/png")}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_direct_upload(client, get_token, storage, mock_qr_code):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/direct-uploads",
+        json={"description": "direct", "hashtags": ["sky"]},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    upload = response.json()
+    assert upload["params"]["public_id"].startswith(f"{settings.cloudinary_folder_name}/")
+    assert upload["params"]["max_file_size"] == settings.max_upload_bytes
+    assert "png" in upload["params"]["allowed_formats"].split(",")
+
+    result = upload_to_storage(storage, upload)
+    response = client.post(
+        "/api/images/direct-uploads/complete",
+        json={"upload_token": upload["upload_token"], **result},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["description"] == "direct"
+    assert data["width"] == 40
+    assert data["byte_size"] == len(storage.state.files[result["public_id"]])
+    assert data["image_url"].startswith("https://res.cloudinary.com/")
+    assert result["public_id"] in data["image_url"]
+
+    response = client.post(
+        "/api/images/direct-uploads/complete",
+        json={"upload_token": upload["upload_token"], **result},
+        headers=headers
+    )
+    assert response.json()["id"] == data["id"]
+
+
+def test_tampered_params_are_rejected_by_storage(client, get_token, storage):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    upload = client.post("/api/images/direct-uploads", json={"description": "direct"}, headers=headers).json()
+    upload["params"]["public_id"] = "somewhere/else"
+    path = upload["upload_url"].split("api.cloudinary.com", 1)[1]
+    response = TestClient(storage).post(
+        path,
+        data={key: str(value) for key, value in upload["params"].items()},
+        files={"file": ("photo.png", b"data", "image/png")}
+    )
+    assert response.status_code == 401
+
+
+def test_forged_upload_response(client, get_token, storage):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    upload = client.post("/api/images/direct-uploads", json={"description": "direct"}, headers=headers).json()
+    result = upload_to_storage(storage, upload)
+
+    response = client.post(
+        "/api/images/direct-uploads/complete",
+        json={"upload_token": upload["upload_token"], **result, "signature": "0" * 40},
+        headers=headers
+    )
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Invalid upload signature"
+
+    response = client.post(
+        "/api/images/direct-uploads/complete",
+        json={"upload_token": upload["upload_token"], **result, "public_id": "project_web/other"},
+        headers=headers
+    )
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Upload doesn't match the token"
+
+
+def test_upload_metadata_comes_from_storage(client, get_token, storage, mock_qr_code):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    upload = client.post("/api/images/direct-uploads", json={"description": "direct"}, headers=headers).json()
+    result = upload_to_storage(storage, upload)
+
+    response = client.post(
+        "/api/images/direct-uploads/complete",
+        json={"upload_token": upload["upload_token"], **result, "width": 1, "bytes": 1, "format": "exe"},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["width"] == 40
+    assert response.json()["image_format"] == "png"
+    assert response.json()["byte_size"] == result["bytes"]
+
+
+def test_upload_over_the_limits(client, get_token, storage):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    upload = client.post("/api/images/direct-uploads", json={"description": "direct"}, headers=headers).json()
+    result = upload_to_storage(storage, upload)
+    body = {"upload_token": upload["upload_token"], **result}
+
+    storage.state.resources[result["public_id"]]["bytes"] = settings.max_upload_bytes + 1
+    response = client.post("/api/images/direct-uploads/complete", json=body, headers=headers)
+    assert response.status_code == 413, response.text
+
+    storage.state.resources[result["public_id"]].update(bytes=100, format="pdf")
+    response = client.post("/api/images/direct-uploads/complete", json=body, headers=headers)
+    assert response.status_code == 415, response.text
+
+    del storage.state.resources[result["public_id"]]
+    response = client.post("/api/images/direct-uploads/complete", json=body, headers=headers)
+    assert response.status_code == 400, response.text
+
+
+def test_concurrent_completions_create_one_post(client, session, get_token, storage, mock_qr_code, mocker):
+    from src.database.models import DirectUpload, Post
+    from src.repository import images
+    from tests.conftest import TestingSessionLocal
+
+    headers = {"Authorization": f"Bearer {get_token}"}
+    upload = client.post("/api/images/direct-uploads", json={"description": "direct"}, headers=headers).json()
+    result = upload_to_storage(storage, upload)
+    get_delivery_fields = images.get_delivery_fields
+    concurrent = {}
+
+    async def complete_concurrently(public_id, url):
+        # the other completion commits its post while this one is being prepared
+        db = TestingSessionLocal()
+        post = Post(description="direct", image_url=url, qr_code_url="qr_code_url", author_id=1)
+        db.add(post)
+        db.flush()
+        db.add(DirectUpload(public_id=public_id, post_id=post.id))
+        db.commit()
+        concurrent["id"] = post.id
+        db.close()
+        return await get_delivery_fields(public_id, url)
+
+    mocker.patch("src.repository.images.get_delivery_fields", side_effect=complete_concurrently)
+    posts = session.query(Post).count()
+    response = client.post(
+        "/api/images/direct-uploads/complete",
+        json={"upload_token": upload["upload_token"], **result},
+        headers=headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == concurrent["id"]
+    assert session.query(Post).count() == posts + 1
@@ -1,4 +1,10 @@
-from src.database.models import Post
+import asyncio
+import io
+from unittest.mock import AsyncMock
+
+from PIL import Image
+
+from src.database.models import Hashtag, Post, Job
 
 
 def test_crop_image_view(client, session, get_token, mock_get_qr_code_by_url):
@@ -102,3 +108,384 @@ def test_sepia(client, get_token, mock_get_qr_code_by_url):
     assert "author_id" in data
     assert "qr_code_url" in data
     assert "created_dt" in data
+
+
+def test_crop_image_preview(client, session, get_token, mock_get_qr_code_by_url):
+    token = get_token
+    headers = {"Authorization": f"Bearer {token}"}
+    transformation = {
+        "image_id": 1,
+        "width": 320,
+        "height": 240,
+        "description": "description"
+    }
+    posts_before = session.query(Post).count()
+
+    response = client.post(
+        "/api/images/transformation/crop?preview=true",
+        headers=headers,
+        json=transformation
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["image_id"] == transformation["image_id"]
+    assert "c_crop" in data["image_url"]
+    assert session.query(Post).count() == posts_before
+
+
+def test_commit_transformation(client, session, get_token, mock_get_qr_code_by_url):
+    token = get_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        "/api/images/transformation/grayscale?preview=true",
+        headers=headers,
+        json={"image_id": 1, "description": "description"}
+    )
+    preview_url = response.json()["image_url"]
+
+    response = client.post(
+        "/api/images/transformation/commit",
+        headers=headers,
+        json={"image_id": 1, "image_url": preview_url, "description": "chosen"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["image_url"] == preview_url
+    assert data["description"] == "chosen"
+    assert data["qr_code_url"] == "qr_code_url_responce"
+
+
+def test_commit_transformation_not_previewed(client, get_token):
+    token = get_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        "/api/images/transformation/commit",
+        headers=headers,
+        json={"image_id": 1, "image_url": "https://example.com/other.png", "description": "chosen"}
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Preview not found or expired"
+
+
+def test_get_similar_images(client, session, get_token):
+    from src.services.similarity import similarity_index
+
+    posts = [
+        Post(description="original", image_url="http://test_url.com/1", author_id=1, phash="f0f0f0f0f0f0f0f0"),
+        Post(description="repost", image_url="http://test_url.com/2", author_id=1, phash="f0f0f0f0f0f0f0f1"),
+        Post(description="other", image_url="http://test_url.com/3", author_id=1, phash="0f0f0f0f0f0f0f0f"),
+    ]
+    session.add_all(posts)
+    session.commit()
+    similarity_index.load(session)
+
+    token = get_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get(f"/api/images/{posts[0].id}/similar?max_distance=4", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data] == [posts[1].id]
+    assert data[0]["distance"] == 1
+
+    response = client.get("/api/images/9999/similar", headers=headers)
+    assert response.status_code == 404
+
+
+def test_delete_image_schedules_asset_removal(client, session, get_token):
+    original = Post(
+        description="original",
+        image_url="https://res.cloudinary.com/abc/image/upload/v1/project_web/11111111.png",
+        qr_code_url="https://res.cloudinary.com/abc/image/upload/v1/project_web/qrcode/22222222",
+        author_id=1
+    )
+    transformed = Post(
+        description="transformed",
+        image_url="https://res.cloudinary.com/abc/image/upload/e_sepia/v1/project_web/11111111",
+        qr_code_url="https://res.cloudinary.com/abc/image/upload/v1/project_web/qrcode/33333333",
+        author_id=1
+    )
+    session.add_all([original, transformed])
+    session.commit()
+    original_id, transformed_id = original.id, transformed.id
+
+    token = get_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.delete(f"/api/images/delete_image?image_id={transformed_id}", headers=headers)
+    assert response.status_code == 200
+    job = session.query(Job).filter(Job.kind == "delete_assets").order_by(Job.id.desc()).first()
+    assert job.payload == {"public_ids": ["project_web/qrcode/33333333"]}
+
+    response = client.delete(f"/api/images/delete_image?image_id={original_id}", headers=headers)
+    assert response.status_code == 200
+    job = session.query(Job).filter(Job.kind == "delete_assets").order_by(Job.id.desc()).first()
+    assert job.payload == {"public_ids": ["project_web/qrcode/22222222", "project_web/11111111"]}
+
+
+def test_upload_rejects_non_image(client, get_token, mocker):
+    upload = mocker.patch("src.services.storage.cloudinary.uploader.upload")
+    response = client.post(
+        "/api/images/upload",
+        params={"description": "not an image"},
+        data={"hashtags": "tag"},
+        files={"file": ("photo.jpg", b"MZ\x90\x00 this is an executable", "image/jpeg")},
+        headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 415, response.text
+    upload.assert_not_called()
+
+
+def test_upload_rejects_truncated_image(client, get_token, mocker):
+    upload = mocker.patch("src.services.storage.cloudinary.uploader.upload")
+    # the header is complete, only the pixel data is cut
+    image = io.BytesIO()
+    Image.effect_noise((640, 480), 64).convert("RGB").save(image, "jpeg")
+    response = client.post(
+        "/api/images/upload",
+        params={"description": "truncated"},
+        data={"hashtags": "tag"},
+        files={"file": ("photo.jpg", image.getvalue()[:len(image.getvalue()) // 2], "image/jpeg")},
+        headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 415, response.text
+    upload.assert_not_called()
+
+
+def test_upload_rejects_large_body(client, get_token, mocker):
+    upload = mocker.patch("src.services.storage.cloudinary.uploader.upload")
+    mocker.patch("src.utils.image_metadata.settings.max_upload_bytes", 1000)
+    response = client.post(
+        "/api/images/upload",
+        params={"description": "too large"},
+        data={"hashtags": "tag"},
+        files={"file": ("photo.png", b"\x89PNG\r\n\x1a\n" + b"0" * 2000, "image/png")},
+        headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 413, response.text
+    upload.assert_not_called()
+
+
+def make_png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_bulk_upload(client, session, get_token, mocker):
+    urls = iter(f"https://res.cloudinary.com/abc/image/upload/v1/project_web/bulk{i}.png" for i in range(10))
+    mocker.patch(
+        "src.services.storage.cloudinary.uploader.upload",
+        side_effect=lambda *args, **kwargs: {"secure_url": next(urls)}
+    )
+    mocker.patch("src.repository.images.get_qr_code_by_url", AsyncMock(return_value="qr_code_url"))
+    response = client.post(
+        "/api/images/upload/bulk",
+        data={"descriptions": ["red", "broken", "green"], "hashtags": ["album,red", "album", "album, green"]},
+        files=[
+            ("files", ("red.png", make_png("red"), "image/png")),
+            ("files", ("broken.png", b"not an image at all", "image/png")),
+            ("files", ("green.png", make_png("green"), "image/png")),
+        ],
+        headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert [result["status"] for result in data] == ["created", "failed", "created"]
+    assert data[1]["error"] == "Unsupported image format"
+    assert data[0]["post"]["description"] == "red"
+    assert data[2]["post"]["width"] == 16
+
+    red = session.query(Post).filter(Post.id == data[0]["post"]["id"]).first()
+    green = session.query(Post).filter(Post.id == data[2]["post"]["id"]).first()
+    assert sorted(tag.name for tag in red.hashtags) == ["album", "red"]
+    assert sorted(tag.name for tag in green.hashtags) == ["album", "green"]
+    album = [tag for tag in red.hashtags if tag.name == "album"][0]
+    assert album in green.hashtags
+
+
+def test_bulk_upload_concurrency(client, get_token, mocker):
+    in_flight = 0
+    max_in_flight = 0
+
+    async def store_image_file(file):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"image_url": "https://res.cloudinary.com/abc/image/upload/v1/project_web/x.png", "qr_code_url": "qr"}
+
+    mocker.patch("src.repository.images.store_image_file", side_effect=store_image_file)
+    mocker.patch("src.repository.images.settings.bulk_upload_concurrency", 2)
+    response = client.post(
+        "/api/images/upload/bulk",
+        data={"descriptions": [str(i) for i in range(5)]},
+        files=[("files", (f"{i}.png", b"data", "image/png")) for i in range(5)],
+        headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 200, response.text
+    assert all(result["status"] == "created" for result in response.json())
+    assert max_in_flight == 2
+
+
+def test_bulk_upload_needs_a_description_per_file(client, get_token):
+    response = client.post(
+        "/api/images/upload/bulk",
+        data={"descriptions": ["only one"]},
+        files=[("files", (f"{i}.png", b"data", "image/png")) for i in range(2)],
+        headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 400, response.text
+
+
+def test_get_feed(client, session, get_token):
+    from src.services.feed import feed_cache
+
+    posts = [Post(description=f"feed {i}", image_url=f"http://test_url.com/feed/{i}", author_id=1) for i in range(3)]
+    session.add_all(posts)
+    session.commit()
+    newest = [post.id for post in reversed(posts)]
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.get("/api/images/feed?limit=2", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data["items"]] == newest[:2]
+    response = client.get(f"/api/images/feed?limit=1&before={data['next_cursor']}", headers=headers)
+    assert [item["id"] for item in response.json()["items"]] == newest[2:]
+
+    feed_cache.load(session)
+    try:
+        response = client.delete(f"/api/images/delete_image?image_id={newest[0]}", headers=headers)
+        assert response.status_code == 200
+        response = client.get("/api/images/feed?limit=2", headers=headers)
+        assert [item["id"] for item in response.json()["items"]] == newest[1:]
+        assert response.json()["items"][0]["description"] == "feed 1"
+    finally:
+        feed_cache.clear()
+
+
+def test_get_images_by_tags(client, session, get_token):
+    from src.services.tag_index import tag_index
+
+    sunset, beach = Hashtag(name="tagquery_sunset"), Hashtag(name="tagquery_beach")
+    posts = [
+        Post(description="tags 0", image_url="http://test_url.com/tags/0", author_id=1, hashtags=[sunset, beach]),
+        Post(description="tags 1", image_url="http://test_url.com/tags/1", author_id=1, hashtags=[sunset]),
+        Post(description="tags 2", image_url="http://test_url.com/tags/2", author_id=1, hashtags=[sunset, beach]),
+    ]
+    session.add_all(posts)
+    session.commit()
+    post_ids = [post.id for post in posts]
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    try:
+        response = client.get("/api/images/by-tags?q=tagquery_sunset&limit=2", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 3
+        assert [item["id"] for item in data["items"]] == post_ids[:0:-1]
+        response = client.get(f"/api/images/by-tags?q=tagquery_sunset&limit=2&before={data['next_cursor']}",
+                              headers=headers)
+        assert [item["id"] for item in response.json()["items"]] == post_ids[:1]
+        assert response.json()["next_cursor"] is None
+
+        response = client.get("/api/images/by-tags?q=tagquery_sunset NOT tagquery_beach", headers=headers)
+        assert [item["id"] for item in response.json()["items"]] == [post_ids[1]]
+
+        response = client.delete(f"/api/images/delete_image?image_id={post_ids[2]}", headers=headers)
+        assert response.status_code == 200
+        response = client.get("/api/images/by-tags?q=tagquery_sunset AND tagquery_beach", headers=headers)
+        assert response.json()["count"] == 1
+        assert [item["id"] for item in response.json()["items"]] == post_ids[:1]
+
+        response = client.get("/api/images/by-tags?q=tagquery_sunset AND", headers=headers)
+        assert response.status_code == 400
+    finally:
+        tag_index.clear()
+
+
+def test_get_related_images(client, session, get_token):
+    from src.database.models import Rating
+    from src.services.related import related_posts
+
+    beach, sea, city = Hashtag(name="related_beach"), Hashtag(name="related_sea"), Hashtag(name="related_city")
+    posts = [
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[beach, sea]),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[beach, sea]),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[beach]),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[city]),
+    ]
+    session.add_all(posts)
+    session.commit()
+    post_ids = [post.id for post in posts]
+    session.add(Rating(rating=5, user_id=1, image_id=post_ids[2]))
+    session.commit()
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    try:
+        response = client.get(f"/api/images/{post_ids[0]}/related", headers=headers)
+        assert response.status_code == 200, response.text
+        assert [item["id"] for item in response.json()] == [post_ids[1], post_ids[2]]
+        assert response.json()[0]["score"] > response.json()[1]["score"]
+
+        # a post created after the matrix was built is looked up by its hashtags
+        new_post = Post(image_url="http://test_url.com", author_id=1, hashtags=[sea])
+        session.add(new_post)
+        session.commit()
+        response = client.get(f"/api/images/{new_post.id}/related?limit=1", headers=headers)
+        assert [item["id"] for item in response.json()] == [post_ids[1]]
+
+        response = client.get(f"/api/images/{post_ids[3]}/related", headers=headers)
+        assert response.json() == []
+        response = client.get("/api/images/999999/related", headers=headers)
+        assert response.status_code == 404
+    finally:
+        related_posts.clear()
+
+
+def test_get_image_detail(client, session, get_token):
+    from sqlalchemy import event
+    from src.database.models import Comments, Rating, User
+    from src.repository.images import get_image_detail
+    from tests.conftest import TestingSessionLocal, engine
+
+    post = Post(description="detail", image_url="http://test_url.com", author_id=1,
+                hashtags=[Hashtag(name="detail_a"), Hashtag(name="detail_b")])
+    session.add(post)
+    session.commit()
+    post_id = post.id
+    raters = [User(username=f"detail_rater{i}", email=f"detail_rater{i}@example.com", password="x") for i in range(3)]
+    session.add_all(raters)
+    session.commit()
+    session.add_all([Rating(rating=value, user_id=user.id, image_id=post_id) for value, user in zip([3, 4, 5], raters)])
+    session.add_all([Comments(text=f"comment {i}", image_id=post_id, user_id=1) for i in range(5)])
+    session.commit()
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.get(f"/api/images/{post_id}/detail?comments_limit=2", headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["id"] == post_id
+    assert data["author"]["id"] == 1
+    assert sorted(data["hashtags"]) == ["detail_a", "detail_b"]
+    assert data["rating"] == {"count": 3, "average": 4.0}
+    assert data["comment_count"] == 5
+    assert [comment["text"] for comment in data["comments"]] == ["comment 0", "comment 1"]
+
+    response = client.get("/api/images/999999/detail", headers=headers)
+    assert response.status_code == 404
+
+    # the number of queries doesn't grow with the hashtags, ratings and comments of the post
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    db = TestingSessionLocal()
+    try:
+        asyncio.run(get_image_detail(post_id, 100, db))
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert len(statements) == 4, statements
@@ -0,0 +1,110 @@
+import httpx
+import pytest
+
+from main import app
+from src.conf.config import settings
+from src.services.media_cache import MediaCache, get_media_cache
+from src.services.storage import LocalStorage, get_storage
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+
+
+@pytest.fixture()
+def local_storage(tmp_path):
+    storage = LocalStorage(str(tmp_path), "http://testserver/api/media")
+    storage.save(PNG, "project_web/abc")
+    app.dependency_overrides[get_storage] = lambda: storage
+    yield storage
+    app.dependency_overrides.pop(get_storage)
+
+
+def test_get_media(client, local_storage):
+    response = client.get("/api/media/project_web/abc.png")
+    assert response.status_code == 200, response.text
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == local_storage.etag(local_storage.find("project_web/abc"))
+
+
+def test_get_media_not_modified(client, local_storage):
+    etag = client.get("/api/media/project_web/abc.png").headers["etag"]
+    response = client.get("/api/media/project_web/abc.png", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_get_media_range(client, local_storage):
+    response = client.get("/api/media/project_web/abc.png", headers={"Range": "bytes=8-15"})
+    assert response.status_code == 206, response.text
+    assert response.content == PNG[8:16]
+    assert response.headers["content-range"] == f"bytes 8-15/{len(PNG)}"
+
+
+def test_get_media_suffix_range(client, local_storage):
+    response = client.get("/api/media/project_web/abc.png", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == PNG[-10:]
+
+
+def test_get_media_range_not_satisfiable(client, local_storage):
+    response = client.get("/api/media/project_web/abc.png", headers={"Range": f"bytes={len(PNG)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(PNG)}"
+
+
+def test_get_media_not_found(client, local_storage):
+    response = client.get("/api/media/project_web/missing.png")
+    assert response.status_code == 404
+
+
+@pytest.fixture()
+def cdn_cache(tmp_path, monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        return httpx.Response(200, content=PNG)
+
+    monkeypatch.setattr(settings, "media_proxy_enabled", True)
+    cache = MediaCache(str(tmp_path), "https://cdn.test/demo", 10000, 10000, transport=httpx.MockTransport(handler))
+    app.dependency_overrides[get_media_cache] = lambda: cache
+    yield requests
+    app.dependency_overrides.pop(get_media_cache)
+
+
+def test_get_cdn_media(client, cdn_cache):
+    response = client.get("/api/media/cdn/image/upload/v1/project_web/abc.png")
+    assert response.status_code == 200, response.text
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    response = client.get("/api/media/cdn/image/upload/v1/project_web/abc.png", headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == PNG[:8]
+    assert cdn_cache == ["/demo/image/upload/v1/project_web/abc.png"]
+    # every response released the entry it pinned
+    assert app.dependency_overrides[get_media_cache]()._readers == {}
+
+
+def test_get_cdn_media_removed_from_disk(client, cdn_cache, tmp_path):
+    client.get("/api/media/cdn/image/upload/v1/project_web/abc.png")
+    for path in tmp_path.glob("*/*"):
+        path.unlink()
+    response = client.get("/api/media/cdn/image/upload/v1/project_web/abc.png")
+    assert response.status_code == 200, response.text
+    assert response.content == PNG
+    assert len(cdn_cache) == 2
+
+
+def test_get_cdn_media_outside_uploads(client, cdn_cache):
+    response = client.get("/api/media/cdn/raw/upload/v1/secret.txt")
+    assert response.status_code == 404
+    assert cdn_cache == []
+
+
+def test_get_cdn_media_disabled(client, cdn_cache, monkeypatch):
+    monkeypatch.setattr(settings, "media_proxy_enabled", False)
+    response = client.get("/api/media/cdn/image/upload/v1/project_web/abc.png")
+    assert response.status_code == 404
+    assert cdn_cache == []
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+from src.database.models import Hashtag, Post, TagTrendBucket
+from src.services.trending import persist_trend_buckets, trending_tags
+
+
+def test_get_trending_tags(client, session, get_token):
+    now = datetime.utcnow()
+    cat, dog, bird = Hashtag(name="trend_cat"), Hashtag(name="trend_dog"), Hashtag(name="trend_bird")
+    session.add_all([
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[dog], created_dt=now - timedelta(days=2)),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[dog], created_dt=now - timedelta(days=2)),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[cat, dog], created_dt=now - timedelta(hours=3)),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[cat], created_dt=now - timedelta(minutes=1)),
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[bird], created_dt=now - timedelta(days=9)),
+    ])
+    session.commit()
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    try:
+        trending_tags.load(session, now)
+        # the hours that ended are persisted, the last one is read from the posts
+        buckets = {(bucket.hashtag_id, bucket.count) for bucket in session.query(TagTrendBucket)}
+        assert buckets == {(dog.id, 2), (cat.id, 1), (dog.id, 1)}
+        assert persist_trend_buckets(session, now) <= now
+
+        response = client.get("/api/tags/trending?window=1h", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == [{"name": "trend_cat", "count": 1}]
+        response = client.get("/api/tags/trending", headers=headers)
+        assert response.json() == [{"name": "trend_cat", "count": 2}, {"name": "trend_dog", "count": 1}]
+        response = client.get("/api/tags/trending?window=7d&limit=1", headers=headers)
+        assert response.json() == [{"name": "trend_dog", "count": 3}]
+
+        # a restart rebuilds the same counts from the persisted hours
+        trending_tags.load(session, now)
+        response = client.get("/api/tags/trending?window=7d", headers=headers)
+        assert response.json() == [{"name": "trend_dog", "count": 3}, {"name": "trend_cat", "count": 2}]
+
+        response = client.get("/api/tags/trending?window=1y", headers=headers)
+        assert response.status_code == 422
+    finally:
+        trending_tags.clear()
+
+
+def test_trending_tags_follow_the_database_clock(client, session, get_token):
+    # a database five hours behind UTC stores the posts in its own local time
+    now = datetime.utcnow() - timedelta(hours=5)
+    tag = Hashtag(name="trend_local")
+    session.add(Post(image_url="http://test_url.com", author_id=1, hashtags=[tag], created_dt=now - timedelta(minutes=1)))
+    session.commit()
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    try:
+        trending_tags.load(session, now)
+        response = client.get("/api/tags/trending?window=1h", headers=headers)
+        assert {"name": "trend_local", "count": 1} in response.json()
+    finally:
+        trending_tags.clear()
+        session.query(TagTrendBucket).delete()
+        session.commit()
+
+
+def test_autocomplete(client, session, get_token):
+    from src.database.models import User
+    from src.services.autocomplete import load_completions, tag_completions, user_completions
+
+    session.add_all([
+        Post(image_url="http://test_url.com", author_id=1, hashtags=[Hashtag(name="Complete_popular")]),
+        Hashtag(name="complete_rare"),
+        User(username="completer", email="completer@example.com", password="x", followers_count=3),
+        User(username="complete_banned", email="complete_banned@example.com", password="x", is_active=False),
+    ])
+    session.commit()
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    try:
+        load_completions(session)
+        response = client.get("/api/tags/autocomplete?q=COMPLETE", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == [{"name": "Complete_popular", "count": 1}, {"name": "complete_rare", "count": 0}]
+
+        # committed changes update the indexes
+        session.add(Hashtag(name="complete_new"))
+        user = session.query(User).filter(User.username == "completer").first()
+        user_id = user.id
+        user.username = "complete_renamed"
+        session.commit()
+        response = client.get("/api/tags/autocomplete?q=complete_&limit=5", headers=headers)
+        assert [tag["name"] for tag in response.json()] == ["Complete_popular", "complete_new", "complete_rare"]
+
+        response = client.get("/api/users/autocomplete?q=compl", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() == [{"id": user_id, "username": "complete_renamed", "followers_count": 3}]
+
+        session.add(Hashtag(name="complete_rolled_back"))
+        session.flush()
+        session.rollback()
+        response = client.get("/api/tags/autocomplete?q=complete_ro", headers=headers)
+        assert response.json() == []
+
+        # new posts and follows change the popularity
+        rare = session.query(Hashtag).filter(Hashtag.name == "complete_rare").first()
+        session.add_all([Post(image_url="http://test_url.com", author_id=1, hashtags=[rare]) for _ in range(2)])
+        session.commit()
+        response = client.get("/api/tags/autocomplete?q=complete_&limit=2", headers=headers)
+        assert response.json() == [{"name": "complete_rare", "count": 2}, {"name": "Complete_popular", "count": 1}]
+
+        response = client.post(f"/api/users/{user_id}/follow", headers=headers)
+        assert response.status_code == 200, response.text
+        response = client.get("/api/users/autocomplete?q=compl", headers=headers)
+        assert response.json()[0]["followers_count"] == 4
+    finally:
+        tag_completions.clear()
+        user_completions.clear()
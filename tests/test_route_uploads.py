@@ -0,0 +1,243 @@
+import hashlib
+import io
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from src.conf.config import settings
+from src.database.models import Post, UploadSession
+
+
+@pytest.fixture()
+def image_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture()
+def staging_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_staging_dir", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture()
+def mock_storage(mocker):
+    mocker.patch(
+        "src.services.storage.cloudinary.uploader.upload",
+        return_value={"secure_url": "https://res.cloudinary.com/abc/image/upload/v1/project_web/chunked.png"}
+    )
+    mocker.patch("src.repository.images.get_qr_code_by_url", AsyncMock(return_value="qr_code_url"))
+
+
+def put_chunk(client, headers, upload_id, offset, data, checksum=None):
+    return client.put(
+        f"/api/images/uploads/{upload_id}",
+        params={"offset": offset},
+        content=data,
+        headers={**headers, "X-Chunk-SHA256": checksum or hashlib.sha256(data).hexdigest()}
+    )
+
+
+def test_chunked_upload(client, session, get_token, image_bytes, staging_dir, mock_storage):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "chunked", "hashtags": ["big"], "total_size": len(image_bytes),
+              "sha256": hashlib.sha256(image_bytes).hexdigest()},
+        headers=headers
+    )
+    assert response.status_code == 201, response.text
+    upload_id = response.json()["id"]
+    middle = len(image_bytes) // 2
+
+    response = put_chunk(client, headers, upload_id, 0, image_bytes[:middle])
+    assert response.status_code == 200, response.text
+    assert response.json()["received"] == middle
+
+    response = put_chunk(client, headers, upload_id, 0, image_bytes[:middle])
+    assert response.status_code == 409, response.text
+    assert response.json()["detail"] == f"Expected offset {middle}"
+
+    response = put_chunk(client, headers, upload_id, middle, image_bytes[middle:], checksum="0" * 64)
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Checksum mismatch"
+
+    response = client.post(f"/api/images/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 409, response.text
+
+    response = client.get(f"/api/images/uploads/{upload_id}", headers=headers)
+    assert response.json()["received"] == middle
+
+    response = put_chunk(client, headers, upload_id, middle, image_bytes[middle:])
+    assert response.status_code == 200, response.text
+    assert (staging_dir / f"{upload_id}.part").read_bytes() == image_bytes
+
+    response = client.post(f"/api/images/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["width"] == 64
+    assert data["height"] == 48
+    assert not (staging_dir / f"{upload_id}.part").exists()
+
+    response = client.post(f"/api/images/uploads/{upload_id}/complete", headers=headers)
+    assert response.json()["id"] == data["id"]
+    assert session.query(Post).filter(Post.id == data["id"]).first().hashtags[0].name == "big"
+
+
+def test_chunk_larger_than_image(client, get_token, staging_dir):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "small", "total_size": 4, "sha256": "0" * 64},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+
+    response = put_chunk(client, headers, upload_id, 0, b"12345")
+    assert response.status_code == 413, response.text
+    assert (staging_dir / f"{upload_id}.part").read_bytes() == b""
+
+
+def test_expired_upload(client, session, get_token, staging_dir):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "expired", "total_size": 10, "sha256": "0" * 64},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+    session.query(UploadSession).filter(UploadSession.id == upload_id).update(
+        {UploadSession.expires_at: datetime.utcnow() - timedelta(seconds=1)}
+    )
+    session.commit()
+
+    response = client.get(f"/api/images/uploads/{upload_id}", headers=headers)
+    assert response.status_code == 410, response.text
+    assert not (staging_dir / f"{upload_id}.part").exists()
+
+
+def test_first_chunk_must_be_an_image(client, get_token, staging_dir):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "not an image", "total_size": 100, "sha256": "0" * 64},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+
+    response = put_chunk(client, headers, upload_id, 0, b"<?php echo 'hello'; ?>")
+    assert response.status_code == 415, response.text
+    assert (staging_dir / f"{upload_id}.part").read_bytes() == b""
+
+
+def test_upload_larger_than_limit(client, get_token, staging_dir):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "huge", "total_size": settings.max_upload_bytes + 1, "sha256": "0" * 64},
+        headers=headers
+    )
+    assert response.status_code == 413, response.text
+
+
+def test_concurrent_chunks_at_same_offset(client, session, get_token, image_bytes, staging_dir):
+    import asyncio
+    from src.database.models import User
+    from src.repository.uploads import write_chunk
+
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "race", "total_size": len(image_bytes), "sha256": "0" * 64},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+    user = session.query(User).filter(User.id == 1).first()
+    winner, loser = image_bytes[:20], b"\x89PNG\r\n\x1a\n" + b"x" * 12
+
+    async def body():
+        # the winner is accepted while the loser is still being received
+        response = put_chunk(client, headers, upload_id, 0, winner)
+        assert response.status_code == 200, response.text
+        yield loser
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(write_chunk(upload_id, 0, hashlib.sha256(loser).hexdigest(), body(), user, session))
+    assert error.value.status_code == 409
+    assert (staging_dir / f"{upload_id}.part").read_bytes() == winner
+    assert list(staging_dir.glob("*.chunk")) == []
+
+
+def test_failed_append_is_rolled_back(client, session, get_token, image_bytes, staging_dir, mocker):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "disk full", "total_size": len(image_bytes), "sha256": "0" * 64},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+    mocker.patch("src.repository.uploads.os.fsync", side_effect=OSError(28, "No space left on device"))
+    with pytest.raises(OSError):
+        put_chunk(client, headers, upload_id, 0, image_bytes[:20])
+    assert client.get(f"/api/images/uploads/{upload_id}", headers=headers).json()["received"] == 0
+    assert list(staging_dir.glob("*.chunk")) == []
+
+    mocker.stopall()
+    response = put_chunk(client, headers, upload_id, 0, image_bytes[:20])
+    assert response.status_code == 200, response.text
+    assert response.json()["received"] == 20
+    assert (staging_dir / f"{upload_id}.part").read_bytes() == image_bytes[:20]
+
+
+def test_image_checksum_mismatch(client, session, get_token, image_bytes, staging_dir, mock_storage):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "corrupted", "total_size": len(image_bytes), "sha256": "0" * 64},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+    response = put_chunk(client, headers, upload_id, 0, image_bytes)
+    assert response.status_code == 200, response.text
+    posts = session.query(Post).count()
+
+    response = client.post(f"/api/images/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "Image checksum mismatch"
+    assert session.query(Post).count() == posts
+    assert client.get(f"/api/images/uploads/{upload_id}", headers=headers).json()["received"] == 0
+    assert (staging_dir / f"{upload_id}.part").read_bytes() == b""
+
+
+def test_concurrent_completion_is_rolled_back(client, session, get_token, image_bytes, staging_dir, mocker):
+    headers = {"Authorization": f"Bearer {get_token}"}
+    response = client.post(
+        "/api/images/uploads",
+        json={"description": "linked", "total_size": len(image_bytes),
+              "sha256": hashlib.sha256(image_bytes).hexdigest()},
+        headers=headers
+    )
+    upload_id = response.json()["id"]
+    put_chunk(client, headers, upload_id, 0, image_bytes)
+    other = Post(description="other completion", image_url="http://test_url.com", author_id=1)
+    session.add(other)
+    session.commit()
+    other_id = other.id
+
+    async def store_while_completed_elsewhere(file):
+        session.query(UploadSession).filter(UploadSession.id == upload_id).update(
+            {UploadSession.post_id: other_id}, synchronize_session=False
+        )
+        session.commit()
+        return {"image_url": "http://test_url.com", "qr_code_url": "qr_code_url"}
+
+    mocker.patch("src.repository.uploads.store_image_file", side_effect=store_while_completed_elsewhere)
+    posts = session.query(Post).count()
+    response = client.post(f"/api/images/uploads/{upload_id}/complete", headers=headers)
+    assert response.status_code == 409, response.text
+    assert session.query(Post).count() == posts
+    assert session.query(UploadSession).filter(UploadSession.id == upload_id).first().post_id == other_id
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database.models import Post
+from src.services.asset_gc import collect_garbage, find_orphans, iter_referenced_public_ids
+
+
+OLD = "2020-01-01T00:00:00Z"
+
+
+class FakeSearch:
+    def __init__(self, pages):
+        self.pages = pages
+        self.cursor = None
+
+    def expression(self, value):
+        return self
+
+    def sort_by(self, field, direction):
+        return self
+
+    def max_results(self, value):
+        return self
+
+    def next_cursor(self, cursor):
+        self.cursor = cursor
+        return self
+
+    def execute(self):
+        index = int(self.cursor or 0)
+        page = {"resources": [{"public_id": public_id, "created_at": created_at}
+                              for public_id, created_at in self.pages[index]]}
+        if index + 1 < len(self.pages):
+            page["next_cursor"] = str(index + 1)
+        return page
+
+
+@pytest.fixture(scope="function")
+def posts(session: Session):
+    session.add_all([
+        Post(description="original", author_id=1,
+             image_url="https://res.cloudinary.com/abc/image/upload/v1/project_web/bbbb.png",
+             qr_code_url="https://res.cloudinary.com/abc/image/upload/v1/project_web/qrcode/q1"),
+        Post(description="transformed", author_id=1,
+             image_url="https://res.cloudinary.com/abc/image/upload/e_sepia/v1/project_web/bbbb",
+             qr_code_url="https://res.cloudinary.com/abc/image/upload/v1/project_web/qrcode/q2"),
+        Post(description="external", author_id=1, image_url="http://example.com/x.png"),
+    ])
+    session.commit()
+    yield
+    session.query(Post).delete()
+    session.commit()
+
+
+def test_iter_referenced_public_ids(session, posts):
+    result = list(iter_referenced_public_ids(session, "project_web", batch_size=1))
+    assert result == ["project_web/bbbb", "project_web/qrcode/q1", "project_web/qrcode/q2"]
+
+
+def test_find_orphans_skips_recent_assets():
+    now = datetime.now(timezone.utc)
+    storage = iter([("a", now - timedelta(days=2)), ("b", now - timedelta(days=2)), ("c", now)])
+    result = list(find_orphans(storage, iter(["b"]), now - timedelta(days=1)))
+    assert result == ["a"]
+
+
+def test_find_orphans_rejects_unsorted_listing():
+    now = datetime.now(timezone.utc)
+    storage = iter([("b", now), ("a", now)])
+    with pytest.raises(RuntimeError):
+        list(find_orphans(storage, iter([]), now))
+
+
+def test_collect_garbage(session, posts):
+    service = MagicMock()
+    pages = [
+        [("project_web/aaaa", OLD), ("project_web/bbbb", OLD)],
+        [("project_web/cccc", OLD), ("project_web/qrcode/q1", OLD)],
+        [("project_web/qrcode/q2", OLD), ("project_web/qrcode/q3", OLD)],
+    ]
+    service.Search.side_effect = lambda: FakeSearch(pages)
+    reported = []
+
+    report = collect_garbage(session, dry_run=True, on_orphan=reported.append, service=service)
+    assert report == {"orphans": 3, "deleted": 0}
+    assert reported == ["project_web/aaaa", "project_web/cccc", "project_web/qrcode/q3"]
+    service.api.delete_resources.assert_not_called()
+
+    report = collect_garbage(session, dry_run=False, rate=1000, service=service)
+    assert report == {"orphans": 3, "deleted": 3}
+    service.api.delete_resources.assert_called_once_with(
+        ["project_web/aaaa", "project_web/cccc", "project_web/qrcode/q3"]
+    )
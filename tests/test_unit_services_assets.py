@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import MagicMock
+import cloudinary
+from src.conf.config import settings
+from src.services.assets import delete_assets, get_public_id_from_url
+from src.services.storage import CloudinaryStorage
+
+
+class TestGetPublicIdFromUrl(unittest.TestCase):
+    def test_uploaded_image(self):
+        url = "https://res.cloudinary.com/abcdefghi/image/upload/v1234567890/project_web/a96e4ceb-54de-4e37-9520-0d0d3a3a31a6.jpg"
+        self.assertEqual(get_public_id_from_url(url), "project_web/a96e4ceb-54de-4e37-9520-0d0d3a3a31a6")
+
+    def test_transformed_image(self):
+        url = "https://res.cloudinary.com/abcdefghi/image/upload/c_crop,h_480,w_640/v1/project_web/a96e4ceb"
+        self.assertEqual(get_public_id_from_url(url), "project_web/a96e4ceb")
+
+    def test_qr_code(self):
+        url = "https://res.cloudinary.com/abcdefghi/image/upload/v1/project_web/qrcode/a96e4ceb"
+        self.assertEqual(get_public_id_from_url(url), "project_web/qrcode/a96e4ceb")
+
+    def test_avatar(self):
+        url = "https://res.cloudinary.com/abcdefghi/image/upload/c_fill,h_250,w_250/v1712/contacts/deadpool"
+        self.assertEqual(get_public_id_from_url(url), "contacts/deadpool")
+
+    def test_local_storage(self):
+        url = f"{settings.local_storage_url}/project_web/a96e4ceb.png"
+        self.assertEqual(get_public_id_from_url(url), "project_web/a96e4ceb")
+
+    def test_foreign_url(self):
+        self.assertIsNone(get_public_id_from_url("https://www.gravatar.com/avatar/123"))
+        self.assertIsNone(get_public_id_from_url(None))
+
+
+class TestDeleteAssets(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.service = MagicMock(spec=cloudinary)
+        self.storage = CloudinaryStorage(self.service)
+
+    async def test_deletes_batch_with_one_call(self):
+        payloads = [{"public_ids": ["a", "b"]}, {"public_ids": ["c"]}]
+        await delete_assets(payloads, backend=self.storage)
+        self.service.api.delete_resources.assert_called_once_with(["a", "b", "c"])
+
+    async def test_splits_large_batches(self):
+        payloads = [{"public_ids": [str(i) for i in range(150)]}]
+        await delete_assets(payloads, backend=self.storage)
+        self.assertEqual(self.service.api.delete_resources.call_count, 2)
+
+    async def test_failure_is_raised_for_retry(self):
+        self.service.api.delete_resources.side_effect = Exception("rate limited")
+        with self.assertRaises(Exception):
+            await delete_assets([{"public_ids": ["a"]}], backend=self.storage)
@@ -0,0 +1,78 @@
+import random
+import unittest
+
+from src.services.autocomplete import PrefixIndex
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex(limit=3, scan_limit=2)
+        self.index.load([(1, "Sunset", 5), (2, "sun", 9), (3, "sunrise", 5), (4, "summer", 7), (5, "beach", 1), (6, "", 3)])
+
+    def names(self, prefix, limit=3):
+        return [name for _, name, _ in self.index.complete(prefix, limit)]
+
+    def test_complete(self):
+        self.assertEqual(self.names("su"), ["sun", "summer", "sunrise"])
+        self.assertEqual(self.names("SUN"), ["sun", "sunrise", "Sunset"])
+        self.assertEqual(self.names("suns"), ["Sunset"])
+        self.assertEqual(self.names("sun", 1), ["sun"])
+        self.assertEqual(self.names("x"), [])
+        self.assertEqual(self.names(""), [])
+        self.assertEqual(len(self.index), 5)
+
+    def test_add_updates_cached_prefixes(self):
+        self.assertEqual(self.names("s"), ["sun", "summer", "sunrise"])
+        self.index.add(7, "Sunny", 8)
+        self.index.add(8, "sunday", 0)
+        self.assertEqual(self.names("s"), ["sun", "Sunny", "summer"])
+        self.assertEqual(self.names("sunda"), ["sunday"])
+
+    def test_remove(self):
+        self.assertEqual(self.names("s"), ["sun", "summer", "sunrise"])
+        self.index.remove(2, "sun")
+        self.index.remove(5, "beach")
+        self.assertEqual(self.names("s"), ["summer", "sunrise", "Sunset"])
+        self.assertEqual(self.names("b"), [])
+
+    def test_weights(self):
+        self.assertEqual(self.names("s"), ["sun", "summer", "sunrise"])
+        self.index.add_weight(3, "sunrise", 5)
+        self.assertEqual(self.names("s"), ["sunrise", "sun", "summer"])
+        self.index.set_weight(4, "summer", 0)
+        self.index.set_weight(1, "Sunset", 6)
+        self.assertEqual(self.names("s"), ["sunrise", "sun", "Sunset"])
+        self.assertEqual(self.names("sum"), ["summer"])
+        self.assertEqual(self.index.complete("summer", 1), [(4, "summer", 0)])
+
+    def test_not_loaded(self):
+        self.index.clear()
+        self.index.add(1, "sun", 1)
+        self.assertEqual(len(self.index), 0)
+
+    def test_matches_a_full_scan(self):
+        rnd = random.Random(0)
+        names = ["".join(rnd.choices("abc", k=rnd.randint(1, 6))) for _ in range(2000)]
+        entries = [(i, name, rnd.randrange(50)) for i, name in enumerate(names)]
+        index = PrefixIndex(limit=5, scan_limit=50)
+        index.load(entries[:1500])
+        for entry in entries[1500:]:
+            index.add(*entry)
+        for entry in entries[:100]:
+            index.remove(*entry[:2])
+        # warm the caches before the weights change
+        for prefix in ["a", "b", "c"]:
+            index.complete(prefix, 5)
+        remaining = entries[100:]
+        for i in range(0, len(remaining), 7):
+            entry_id, name, weight = remaining[i]
+            remaining[i] = (entry_id, name, rnd.randrange(50))
+            index.set_weight(entry_id, name, remaining[i][2])
+        for prefix in ["a", "ab", "bca", "c", "ccc"]:
+            expected = sorted((e for e in remaining if e[1].startswith(prefix)), key=lambda e: (-e[2], e[1], e[0]))[:5]
+            self.assertEqual([e[2] for e in index.complete(prefix, 5)], [e[2] for e in expected], prefix)
+            self.assertEqual(index.complete(prefix, 5), expected, prefix)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import MagicMock
+
+from src.database.models import Post
+from src.services.feed import FeedCache
+
+
+def make_post(post_id: int, description: str = "post") -> Post:
+    return Post(id=post_id, description=description, image_url=f"http://test_url.com/{post_id}", author_id=1)
+
+
+class TestFeedCache(unittest.TestCase):
+    def setUp(self):
+        self.feed = FeedCache(5)
+        self.db = MagicMock()
+
+    def load(self, post_ids):
+        posts = [make_post(post_id) for post_id in sorted(post_ids, reverse=True)]
+        self.db.query().order_by().limit().all.return_value = posts[:self.feed.size]
+        self.feed.load(self.db)
+
+    def ids(self, page):
+        return [item["id"] for item in page]
+
+    def test_not_loaded(self):
+        self.feed.add(make_post(1))
+        self.assertEqual(len(self.feed), 0)
+        self.assertIsNone(self.feed.page(None, 10))
+
+    def test_all_posts_fit(self):
+        self.load([1, 2, 3])
+        self.assertEqual(self.feed.floor, 0)
+        self.assertEqual(self.ids(self.feed.page(None, 2)), [3, 2])
+        self.assertEqual(self.ids(self.feed.page(2, 2)), [1])
+        self.assertEqual(self.feed.page(1, 2), [])
+
+    def test_full_buffer(self):
+        self.load(range(1, 11))
+        self.assertEqual(self.feed.floor, 6)
+        self.assertEqual(self.ids(self.feed.page(None, 3)), [10, 9, 8])
+        self.assertEqual(self.ids(self.feed.page(9, 3)), [8, 7, 6])
+        self.assertIsNone(self.feed.page(8, 3))
+        self.assertIsNone(self.feed.page(6, 3))
+
+    def test_add_drops_oldest(self):
+        self.load(range(1, 6))
+        self.feed.floor = 1
+        self.feed.add(make_post(6))
+        self.assertEqual(self.feed.floor, 2)
+        self.assertEqual(self.ids(self.feed.page(None, 5)), [6, 5, 4, 3, 2])
+        self.feed.add(make_post(1))
+        self.assertEqual(len(self.feed), 5)
+
+    def test_add_out_of_order(self):
+        self.load([1, 2, 4])
+        self.feed.add(make_post(3))
+        self.assertEqual(self.ids(self.feed.page(None, 10)), [4, 3, 2, 1])
+
+    def test_edit(self):
+        self.load([1, 2])
+        self.feed.add(make_post(1, "edited"))
+        self.assertEqual(self.feed.page(None, 10)[1]["description"], "edited")
+        self.assertEqual(len(self.feed), 2)
+
+    def test_remove(self):
+        self.load(range(1, 11))
+        self.feed.remove(9)
+        self.feed.remove(100)
+        self.assertEqual(self.ids(self.feed.page(None, 4)), [10, 8, 7, 6])
+        self.assertIsNone(self.feed.page(None, 5))
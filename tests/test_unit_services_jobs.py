@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from src.database.models import Job, JobStatus
+from src.services.jobs import JobWorker, enqueue_job, job_handler
+from tests.conftest import TestingSessionLocal
+
+
+calls = []
+
+
+@job_handler("test_single")
+async def single_handler(payloads):
+    calls.append(payloads)
+
+
+@job_handler("test_batch", batch_size=10)
+async def batch_handler(payloads):
+    calls.append(payloads)
+
+
+@job_handler("test_partial", batch_size=10)
+async def partial_handler(payloads):
+    return [None if payload["ok"] else ValueError("rejected") for payload in payloads]
+
+
+@job_handler("test_failing")
+async def failing_handler(payloads):
+    raise ConnectionError("smtp is down")
+
+
+@pytest.fixture(scope="function")
+def worker(session: Session):
+    calls.clear()
+    session.query(Job).delete()
+    session.commit()
+    yield JobWorker(session_factory=TestingSessionLocal, retry_delay=0)
+    session.query(Job).delete()
+    session.commit()
+
+
+@pytest.mark.asyncio
+async def test_run_job(session, worker):
+    job = enqueue_job(session, "test_single", {"value": 1})
+
+    assert await worker.run_once() is True
+    assert await worker.run_once() is False
+    assert calls == [[{"value": 1}]]
+    session.refresh(job)
+    assert job.status == JobStatus.done
+    assert job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_jobs_are_claimed_together(session, worker):
+    for value in range(3):
+        enqueue_job(session, "test_batch", {"value": value})
+    enqueue_job(session, "test_single", {"value": "other"})
+
+    await worker.run_once()
+    assert calls == [[{"value": 0}, {"value": 1}, {"value": 2}]]
+
+
+@pytest.mark.asyncio
+async def test_delayed_job_waits(session, worker):
+    enqueue_job(session, "test_single", {"value": 1}, delay=60)
+    assert await worker.run_once() is False
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_retried_then_failed(session, worker):
+    job = enqueue_job(session, "test_failing", {}, max_attempts=2)
+
+    await worker.run_once()
+    session.refresh(job)
+    assert job.status == JobStatus.pending
+    assert "smtp is down" in job.last_error
+
+    await worker.run_once()
+    session.refresh(job)
+    assert job.status == JobStatus.failed
+    assert job.attempts == 2
+    assert worker.stats["retried"] == 1
+    assert worker.stats["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_only_failed_jobs_of_batch_are_retried(session, worker):
+    sent = enqueue_job(session, "test_partial", {"ok": True})
+    rejected = enqueue_job(session, "test_partial", {"ok": False})
+
+    await worker.run_once()
+    session.refresh(sent)
+    session.refresh(rejected)
+    assert sent.status == JobStatus.done
+    assert rejected.status == JobStatus.pending
+    assert "rejected" in rejected.last_error
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_claimed_again(session, worker):
+    job = enqueue_job(session, "test_single", {"value": 1})
+    job.status = JobStatus.running
+    job.locked_by = "dead-worker"
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    session.commit()
+
+    assert await worker.run_once() is True
+    session.refresh(job)
+    assert job.status == JobStatus.done
+
+
+@pytest.mark.asyncio
+async def test_metrics(session, worker):
+    enqueue_job(session, "test_single", {"value": 1})
+    enqueue_job(session, "test_single", {"value": 2})
+    await worker.run_once()
+
+    metrics = worker.get_metrics(session)
+    assert metrics["depth"] == {"test_single": {"pending": 1}}
+    assert metrics["done"] == 1
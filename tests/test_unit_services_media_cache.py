@@ -0,0 +1,100 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import httpx
+from fastapi import HTTPException
+
+from src.services.media_cache import MediaCache
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 92
+
+
+class TestMediaCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.requests = []
+        self.status_code = 200
+
+        async def handler(request):
+            self.requests.append(request.url.path)
+            await asyncio.sleep(0.01)
+            return httpx.Response(self.status_code, content=PNG)
+
+        self.cache = self.create_cache(httpx.MockTransport(handler))
+
+    def create_cache(self, transport=None, max_bytes=1000):
+        return MediaCache(self.tmp.name, "https://cdn.test/demo", max_bytes, 500, transport=transport)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+        self.tmp.cleanup()
+
+    async def test_miss_then_hit(self):
+        entry = await self.cache.get("image/upload/v1/a.png")
+        self.assertEqual(entry.path.read_bytes(), PNG)
+        self.assertEqual(entry.media_type, "image/png")
+        self.assertEqual(self.requests, ["/demo/image/upload/v1/a.png"])
+        self.assertEqual(await self.cache.get("image/upload/v1/a.png"), entry)
+        self.assertEqual(len(self.requests), 1)
+        metrics = self.cache.get_metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"], metrics["hit_ratio"]), (1, 1, 0.5))
+
+    async def test_concurrent_misses_are_coalesced(self):
+        entries = await asyncio.gather(*[self.cache.get("image/upload/v1/a.png") for _ in range(5)])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len({entry.etag for entry in entries}), 1)
+        self.assertEqual(self.cache.get_metrics()["coalesced"], 4)
+
+    async def test_eviction(self):
+        for name in "abcdefghij":
+            await self.cache.get(f"image/upload/v1/{name}.png")
+        await self.cache.get("image/upload/v1/a.png")
+        await self.cache.get("image/upload/v1/k.png")
+        metrics = self.cache.get_metrics()
+        self.assertEqual((metrics["bytes"], metrics["evictions"]), (1000, 1))
+        self.assertTrue(self.cache._file_path("image/upload/v1/a.png").exists())
+        self.assertFalse(self.cache._file_path("image/upload/v1/b.png").exists())
+
+    async def test_acquired_entry_is_kept_until_released(self):
+        entry = await self.cache.acquire("image/upload/v1/a.png")
+        for name in "bcdefghijk":
+            await self.cache.get(f"image/upload/v1/{name}.png")
+        self.assertEqual(self.cache.get_metrics()["evictions"], 1)
+        self.assertEqual(entry.path.read_bytes(), PNG)
+        self.cache.release(entry)
+        self.assertFalse(entry.path.exists())
+
+    async def test_removed_file_is_downloaded_again(self):
+        # another worker sharing the directory evicted the file
+        entry = await self.cache.get("image/upload/v1/a.png")
+        entry.path.unlink()
+        entry = await self.cache.acquire("image/upload/v1/a.png")
+        self.assertEqual(entry.path.read_bytes(), PNG)
+        self.cache.release(entry)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual((self.cache.get_metrics()["entries"], self.cache.get_metrics()["bytes"]), (1, len(PNG)))
+
+    async def test_upstream_not_found(self):
+        self.status_code = 404
+        with self.assertRaises(HTTPException) as error:
+            await self.cache.get("image/upload/v1/missing.png")
+        self.assertEqual(error.exception.status_code, 404)
+        self.assertEqual(self.cache.get_metrics()["entries"], 0)
+        self.assertEqual([name for _, _, files in os.walk(self.tmp.name) for name in files], [])
+
+    async def test_upstream_error(self):
+        self.status_code = 500
+        with self.assertRaises(HTTPException) as error:
+            await self.cache.get("image/upload/v1/a.png")
+        self.assertEqual(error.exception.status_code, 502)
+
+    async def test_load(self):
+        entry = await self.cache.get("image/upload/v1/a.png")
+        cache = self.create_cache()
+        cache.load()
+        loaded = await cache.get("image/upload/v1/a.png")
+        self.assertEqual((loaded.path, loaded.etag, loaded.media_type), (entry.path, entry.etag, "image/png"))
+        self.assertEqual(len(self.requests), 1)
@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from src.services.related import TagMatrix
+
+
+class TestTagMatrix(unittest.TestCase):
+    def setUp(self):
+        # hashtag 10 is on four posts, 11 on three and 12 on one
+        pairs = np.array([(1, 10), (1, 11), (2, 10), (2, 11), (3, 10), (4, 12), (5, 11), (5, 10), (5, 10)])
+        self.matrix = TagMatrix.build(pairs, np.array([(5, 5.0), (99, 3.0)]))
+
+    def ids(self, post_id, tag_ids=(), limit=10, rating_weight=0.0):
+        return [related_id for related_id, _ in self.matrix.related(post_id, list(tag_ids), limit, rating_weight)]
+
+    def test_build(self):
+        self.assertEqual(self.matrix.post_ids.tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.matrix.tag_ids.tolist(), [10, 11, 12])
+        self.assertEqual(np.diff(self.matrix.row_indptr).tolist(), [2, 2, 1, 1, 2])
+        self.assertEqual(np.diff(self.matrix.col_indptr).tolist(), [4, 3, 1])
+        self.assertEqual(self.matrix.ratings.tolist(), [0, 0, 0, 0, 5])
+        self.assertIn(4, self.matrix)
+        self.assertNotIn(6, self.matrix)
+
+    def test_related(self):
+        # more shared tags first, newer posts first on equal scores
+        self.assertEqual(self.ids(1), [5, 2, 3])
+        self.assertEqual(self.ids(1, limit=2), [5, 2])
+        self.assertEqual(self.ids(4), [])
+        scores = dict(self.matrix.related(3, [], 10, 0.0))
+        self.assertAlmostEqual(scores[5], scores[1])
+
+    def test_rating(self):
+        self.assertEqual(self.ids(3), [5, 2, 1])
+        scores = dict(self.matrix.related(3, [], 10, 0.5))
+        self.assertAlmostEqual(scores[5], scores[1] * 1.5)
+
+    def test_post_not_in_matrix(self):
+        # the rare hashtag 12 counts more than 11
+        self.assertEqual(self.ids(6, [11, 12, 77]), [4, 5, 2, 1])
+        self.assertEqual(self.ids(6, [77]), [])
+
+    def test_empty(self):
+        matrix = TagMatrix.build(np.array([], dtype=np.int64), np.array([], dtype=np.float64))
+        self.assertEqual(matrix.related(1, [1], 10, 0.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
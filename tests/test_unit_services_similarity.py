@@ -0,0 +1,52 @@
+import io
+import random
+import unittest
+from PIL import Image
+from src.services.similarity import SimilarityIndex
+from src.utils.image_hash import compute_dhash
+
+
+class TestSimilarityIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SimilarityIndex()
+        self.random = random.Random(42)
+        self.hashes = {post_id: self.random.getrandbits(64) for post_id in range(1, 2001)}
+        for post_id, value in self.hashes.items():
+            self.index.add(post_id, f"{value:016x}")
+
+    def brute_force(self, value, max_distance):
+        return sorted(
+            ((post_id, (h ^ value).bit_count()) for post_id, h in self.hashes.items()
+             if (h ^ value).bit_count() <= max_distance),
+            key=lambda item: (item[1], item[0])
+        )
+
+    def test_search_matches_brute_force(self):
+        for post_id in (1, 500, 1500):
+            value = self.hashes[post_id]
+            for flips in (0, 3, 7, 11):
+                query = value
+                for bit in self.random.sample(range(64), flips):
+                    query ^= 1 << bit
+                for max_distance in (0, 4, 8, 12):
+                    self.assertEqual(
+                        self.index.search(f"{query:016x}", max_distance),
+                        self.brute_force(query, max_distance)
+                    )
+
+    def test_remove(self):
+        self.index.remove(1)
+        self.assertNotIn(1, [post_id for post_id, _ in self.index.search(f"{self.hashes[1]:016x}", 0)])
+        self.assertEqual(len(self.index), 1999)
+
+    def test_max_distance_limit(self):
+        with self.assertRaises(ValueError):
+            self.index.search("0" * 16, SimilarityIndex.MAX_DISTANCE + 1)
+
+    def test_dhash_of_resized_copy_is_close(self):
+        original = Image.open("tests/logo.png").convert("RGB")
+        b1, b2 = io.BytesIO(), io.BytesIO()
+        original.save(b1, "png")
+        original.resize((200, 200)).save(b2, "jpeg", quality=70)
+        first, second = int(compute_dhash(b1), 16), int(compute_dhash(b2), 16)
+        self.assertLessEqual((first ^ second).bit_count(), 6)
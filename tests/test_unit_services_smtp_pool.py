@@ -0,0 +1,102 @@
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+import src.services.email as email_service
+from src.services.smtp_pool import SMTPPool
+
+
+class Handler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("rejected"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture()
+def smtp_server():
+    handler = Handler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+@pytest.fixture()
+def pool(smtp_server):
+    controller, _ = smtp_server
+    return SMTPPool(hostname=controller.hostname, port=controller.port, use_tls=False, size=2)
+
+
+@pytest.mark.asyncio
+async def test_connections_are_reused(smtp_server, pool):
+    _, handler = smtp_server
+    messages = [email_service.build_confirmation_email(f"user{i}@example.com", f"user{i}", "http://test/")
+                for i in range(6)]
+
+    assert await pool.send_many(messages) == [None] * 6
+    assert len(handler.messages) == 6
+    assert pool.get_metrics()["connections"] <= 2
+    assert pool.get_metrics()["sent"] == 6
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_message_is_reported(smtp_server, pool):
+    _, handler = smtp_server
+    messages = [
+        email_service.build_confirmation_email("user@example.com", "user", "http://test/"),
+        email_service.build_confirmation_email("rejected@example.com", "rejected", "http://test/"),
+    ]
+
+    errors = await pool.send_many(messages)
+    assert errors[0] is None
+    assert errors[1] is not None
+    assert len(handler.messages) == 1
+    assert pool.get_metrics()["failed"] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_closed_connection_is_replaced(smtp_server, pool):
+    _, handler = smtp_server
+    message = email_service.build_confirmation_email("user@example.com", "user", "http://test/")
+    await pool.send(message)
+    pool._idle[0].close()
+
+    await pool.send(message)
+    assert len(handler.messages) == 2
+    assert pool.get_metrics()["connections"] == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_send_email_job(smtp_server, pool, monkeypatch):
+    _, handler = smtp_server
+    monkeypatch.setattr(email_service, "smtp_pool", pool)
+
+    errors = await email_service.send_email_job([
+        {"email": "user@example.com", "username": "user", "host": "http://test/"},
+        {"email": "rejected@example.com", "username": "rejected", "host": "http://test/"},
+    ])
+    assert errors[0] is None
+    assert errors[1] is not None
+    body = handler.messages[0].content.decode()
+    assert "Hi user," in body
+    assert "http://test/api/auth/confirmed_email/" in body
+    await pool.close()
@@ -0,0 +1,66 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.services.storage import LocalStorage, Storage
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 32
+
+
+class TestLocalStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.tmp.name, "http://testserver/api/media/")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_file(self):
+        url = self.storage.save(io.BytesIO(PNG), "project_web/abc")
+        self.assertEqual(url, "http://testserver/api/media/project_web/abc.png")
+        path = self.storage.find("project_web/abc")
+        self.assertEqual(path.read_bytes(), PNG)
+        self.assertEqual(path.parent.parent.parent, Path(self.tmp.name))
+        self.assertEqual(self.storage.resolve("project_web/abc.png"), path)
+
+    def test_save_bytes(self):
+        self.storage.save(JPEG, "avatars/user")
+        self.assertEqual(self.storage.url("avatars/user"), "http://testserver/api/media/avatars/user.jpg")
+
+    def test_overwrite_with_other_format(self):
+        self.storage.save(PNG, "project_web/abc")
+        self.storage.save(JPEG, "project_web/abc")
+        self.assertEqual(self.storage.find("project_web/abc").suffix, ".jpg")
+        self.assertIsNone(self.storage.resolve("project_web/abc.png"))
+        self.assertEqual(len(list(self.storage.directory("project_web/abc").iterdir())), 1)
+
+    def test_resolve_missing(self):
+        self.assertIsNone(self.storage.resolve("project_web/missing.png"))
+        self.assertIsNone(self.storage.resolve("project_web/abc"))
+
+    def test_delete(self):
+        self.storage.save(PNG, "project_web/abc")
+        self.storage.delete(["project_web/abc", "project_web/missing"])
+        self.assertIsNone(self.storage.find("project_web/abc"))
+
+    def test_etag(self):
+        self.storage.save(PNG, "project_web/abc")
+        path = self.storage.find("project_web/abc")
+        etag = self.storage.etag(path)
+        self.assertEqual(etag, self.storage.etag(path))
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        self.storage.save(PNG + b"\x01", "project_web/abc")
+        self.assertNotEqual(etag, self.storage.etag(path))
+
+
+class TestStorage(unittest.TestCase):
+    def test_incomplete_backend(self):
+        class UrlOnlyStorage(Storage):
+            def url(self, public_id: str, **transformation) -> str:
+                return f"http://testserver/{public_id}"
+
+        with self.assertRaises(TypeError):
+            UrlOnlyStorage()
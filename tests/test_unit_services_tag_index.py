@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock
+
+from fastapi import HTTPException
+
+from src.services.tag_index import TagIndex, parse_tag_query
+
+
+class TestParseTagQuery(unittest.TestCase):
+    def test_precedence(self):
+        self.assertEqual(parse_tag_query("a OR b c NOT d"), (
+            "or", [("tag", "a"), ("and", [("tag", "b"), ("tag", "c"), ("not", ("tag", "d"))])]
+        ))
+        self.assertEqual(parse_tag_query("(a OR b) AND c"), ("and", [("or", [("tag", "a"), ("tag", "b")]), ("tag", "c")]))
+        self.assertEqual(parse_tag_query("NOT NOT a"), ("not", ("not", ("tag", "a"))))
+
+    def test_invalid(self):
+        for query in ["", "a AND", "(a OR b", "a )", "OR a", "NOT", " ".join(["a"] * 33)]:
+            with self.assertRaises(HTTPException) as error:
+                parse_tag_query(query)
+            self.assertEqual(error.exception.status_code, 400)
+
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TagIndex()
+        self.db = MagicMock()
+        post_hashtags = MagicMock()
+        post_hashtags.yield_per.return_value = [(1, 1), (1, 2), (2, 1), (2, 3), (2, 4), (3, 2), (3, 4), (4, 4)]
+        hashtags = [(1, "sunset"), (2, "beach"), (3, "night"), (4, "sunset"), (5, "unused")]
+        post_ids = MagicMock()
+        post_ids.scalars.return_value = [1, 2, 3, 4, 5]
+        self.db.execute.side_effect = [post_hashtags, hashtags, post_ids]
+        self.index.load(self.db)
+
+    def ids(self, query):
+        return sorted(self.index.query(query).descending())
+
+    def test_query(self):
+        self.assertEqual(self.ids("sunset"), [1, 2, 4])
+        self.assertEqual(self.ids("sunset AND beach"), [1, 4])
+        self.assertEqual(self.ids("sunset beach NOT night"), [1])
+        self.assertEqual(self.ids("night OR beach"), [1, 2, 3, 4])
+        self.assertEqual(self.ids("NOT sunset"), [3, 5])
+        self.assertEqual(self.ids("NOT (sunset OR beach)"), [5])
+        self.assertEqual(self.ids("unknown OR night"), [2, 4])
+        self.assertEqual(self.ids("unknown beach"), [])
+
+    def test_add_and_remove(self):
+        self.index.add(6, ["sunset", "sea"])
+        self.assertEqual(self.ids("sunset NOT beach"), [2, 6])
+        self.assertEqual(self.ids("NOT sunset"), [3, 5])
+        self.index.remove(2, ["sunset", "night"])
+        self.assertEqual(self.ids("sunset NOT beach"), [6])
+        self.assertEqual(self.ids("NOT sunset"), [3, 5])
+        self.index.remove(6, ["sunset", "sea"])
+        self.assertEqual(self.ids("sea"), [])
+
+    def test_not_loaded(self):
+        self.index.clear()
+        self.index.add(1, ["sunset"])
+        self.assertFalse(self.index.loaded)
+        self.assertEqual(len(self.index), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from datetime import datetime, timedelta
+
+from src.services.trending import SlidingWindowCounter, TrendingTags
+
+
+NOW = datetime(2024, 5, 1, 12, 30)
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    def setUp(self):
+        self.counter = SlidingWindowCounter(timedelta(minutes=1), 60)
+
+    def test_top(self):
+        self.counter.add(NOW - timedelta(minutes=50), ["cat", "dog"], NOW)
+        self.counter.add(NOW - timedelta(minutes=10), ["cat"], NOW)
+        self.counter.add(NOW, {"bird": 3}, NOW)
+        self.assertEqual(self.counter.top(10, NOW), [("bird", 3), ("cat", 2), ("dog", 1)])
+        self.assertEqual(self.counter.top(1, NOW), [("bird", 3)])
+
+    def test_expired_buckets_are_dropped(self):
+        self.counter.add(NOW - timedelta(minutes=50), ["cat", "dog"], NOW)
+        self.counter.add(NOW - timedelta(minutes=10), ["cat"], NOW)
+        self.assertEqual(self.counter.top(10, NOW + timedelta(minutes=45)), [("cat", 1)])
+        self.assertEqual(self.counter.top(10, NOW + timedelta(hours=2)), [])
+
+    def test_out_of_window_and_out_of_order(self):
+        self.counter.add(NOW - timedelta(hours=2), ["old"], NOW)
+        self.counter.add(NOW, ["cat"], NOW)
+        self.counter.add(NOW - timedelta(minutes=5), ["dog"], NOW)
+        self.counter.add(NOW - timedelta(minutes=5, seconds=10), ["dog"], NOW)
+        self.assertEqual(self.counter.top(10, NOW), [("dog", 2), ("cat", 1)])
+        self.assertEqual(self.counter.top(10, NOW + timedelta(minutes=57)), [("cat", 1)])
+
+
+class TestTrendingTags(unittest.TestCase):
+    def test_windows(self):
+        trending = TrendingTags()
+        trending.add(NOW - timedelta(days=3), ["week"], NOW)
+        trending.add(NOW - timedelta(hours=5), ["day", "week"], NOW)
+        trending.add(NOW - timedelta(minutes=5), ["hour"], NOW)
+        trending.add(NOW, [], NOW)
+        self.assertEqual(trending.top("1h", 10, NOW), [{"name": "hour", "count": 1}])
+        self.assertEqual([tag["name"] for tag in trending.top("24h", 10, NOW)], ["day", "week", "hour"])
+        self.assertEqual(trending.top("7d", 1, NOW), [{"name": "week", "count": 2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
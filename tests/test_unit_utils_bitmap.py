@@ -0,0 +1,52 @@
+import random
+import unittest
+
+from src.utils.bitmap import ARRAY_MAX, Bitmap
+
+
+class TestBitmap(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(0)
+        # sparse and dense containers, and values spread over several containers
+        self.a = {rnd.randrange(200_000) for _ in range(50_000)} | set(range(10))
+        self.b = {rnd.randrange(200_000) for _ in range(300)} | set(range(5, 15))
+
+    def test_set_operations(self):
+        a, b = Bitmap(self.a), Bitmap(self.b)
+        self.assertEqual(len(a), len(self.a))
+        self.assertEqual(set(a.descending()), self.a)
+        self.assertEqual(set((a & b).descending()), self.a & self.b)
+        self.assertEqual(set((b & a).descending()), self.a & self.b)
+        self.assertEqual(set((a | b).descending()), self.a | self.b)
+        self.assertEqual(set((a - b).descending()), self.a - self.b)
+        self.assertEqual(set((b - a).descending()), self.b - self.a)
+        # operations return new bitmaps
+        self.assertEqual(len(a), len(self.a))
+        self.assertEqual(len(b), len(self.b))
+
+    def test_descending(self):
+        bitmap = Bitmap(self.a)
+        self.assertEqual(list(bitmap.descending()), sorted(self.a, reverse=True))
+        self.assertEqual(list(bitmap.descending(70_000)), sorted((v for v in self.a if v < 70_000), reverse=True))
+        self.assertEqual(list(bitmap.descending(0)), [])
+
+    def test_add_and_discard(self):
+        bitmap = Bitmap()
+        for value in range(ARRAY_MAX + 10):
+            bitmap.add(value * 2)
+        bitmap.add(4)
+        self.assertEqual(len(bitmap), ARRAY_MAX + 10)
+        self.assertIn(8, bitmap)
+        self.assertNotIn(9, bitmap)
+        for value in range(0, (ARRAY_MAX + 10) * 2, 4):
+            bitmap.discard(value)
+        bitmap.discard(3)
+        self.assertEqual(set(bitmap.descending()), set(range(2, (ARRAY_MAX + 10) * 2, 4)))
+        for value in list(bitmap.descending()):
+            bitmap.discard(value)
+        self.assertFalse(bitmap)
+        self.assertEqual(len(bitmap), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import io
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from fastapi import HTTPException, status
+from PIL import Image
+from src.utils.image_metadata import extract_image_metadata, sniff_image_format, validate_image_file
+
+
+class TestImageMetadata(unittest.TestCase):
+    def make_jpeg(self, size=(64, 32), taken_at=None):
+        exif = Image.Exif()
+        if taken_at:
+            exif[0x8769] = {0x9003: taken_at}
+        b = io.BytesIO()
+        Image.new("RGB", size, "red").save(b, "jpeg", exif=exif.tobytes())
+        b.seek(0)
+        return b
+
+    def test_extract_png_metadata(self):
+        with open("tests/logo.png", "rb") as file:
+            result = extract_image_metadata(file)
+            self.assertEqual(file.tell(), 0)
+        self.assertEqual(result["width"], 500)
+        self.assertEqual(result["height"], 500)
+        self.assertEqual(result["image_format"], "PNG")
+        self.assertGreater(result["byte_size"], 0)
+        self.assertIsNone(result["taken_at"])
+
+    def test_extract_jpeg_taken_at(self):
+        file = self.make_jpeg(taken_at="2023:07:14 18:30:05")
+        result = extract_image_metadata(file)
+        self.assertEqual((result["width"], result["height"]), (64, 32))
+        self.assertEqual(result["image_format"], "JPEG")
+        self.assertEqual(result["byte_size"], len(file.getvalue()))
+        self.assertEqual(result["taken_at"], datetime(2023, 7, 14, 18, 30, 5))
+
+    def test_does_not_decode_pixels(self):
+        file = self.make_jpeg()
+        with patch("PIL.ImageFile.ImageFile.load") as load:
+            extract_image_metadata(file)
+        load.assert_not_called()
+
+    def test_not_an_image(self):
+        with self.assertRaises(HTTPException) as context:
+            extract_image_metadata(io.BytesIO(b"definitely not an image"))
+        self.assertEqual(context.exception.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_too_many_pixels(self):
+        file = self.make_jpeg(size=(200, 200))
+        with patch("src.utils.image_metadata.settings.max_image_pixels", 100):
+            with self.assertRaises(HTTPException) as context:
+                extract_image_metadata(file)
+        self.assertEqual(context.exception.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+class TestValidateImageFile(unittest.TestCase):
+    def test_sniff_image_format(self):
+        for image_format in ("JPEG", "PNG", "GIF", "WEBP", "BMP", "TIFF"):
+            b = io.BytesIO()
+            Image.new("RGB", (8, 8), "blue").save(b, image_format)
+            self.assertEqual(sniff_image_format(b.getvalue()[:12]), image_format)
+        self.assertIsNone(sniff_image_format(b"<html><body>"))
+        self.assertIsNone(sniff_image_format(b""))
+
+    def test_valid_image(self):
+        with open("tests/logo.png", "rb") as file:
+            validate_image_file(file)
+            self.assertEqual(file.tell(), 0)
+
+    def test_not_an_image(self):
+        with self.assertRaises(HTTPException) as context:
+            validate_image_file(io.BytesIO(b"%PDF-1.7 not an image"))
+        self.assertEqual(context.exception.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_too_large(self):
+        with open("tests/logo.png", "rb") as file:
+            with patch("src.utils.image_metadata.settings.max_upload_bytes", 100):
+                with self.assertRaises(HTTPException) as context:
+                    validate_image_file(file)
+        self.assertEqual(context.exception.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
@@ -0,0 +1,41 @@
+import io
+import unittest
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image
+from src.utils.image_placeholder import encode_blurhash, compute_blurhash
+
+
+class TestImagePlaceholder(unittest.TestCase):
+    def test_encode_blurhash_solid_color(self):
+        pixels = np.full((8, 8, 3), 120)
+        self.assertEqual(encode_blurhash(pixels, 1, 1), "00D,4Y")
+
+    def test_encode_blurhash_length(self):
+        pixels = np.random.default_rng(1).integers(0, 256, size=(20, 30, 3))
+        result = encode_blurhash(pixels, 4, 3)
+        self.assertEqual(len(result), 4 + 2 * 4 * 3)
+        self.assertEqual(result, "L7HoLF%}%n={Lvt1XMRhyVNrMf#I")
+
+    def test_compute_blurhash(self):
+        b = io.BytesIO()
+        Image.new("RGB", (640, 480), (120, 120, 120)).save(b, "jpeg")
+        b.seek(0)
+        result = compute_blurhash(b, 1, 1)
+        self.assertEqual(len(result), 6)
+        self.assertEqual(b.tell(), 0)
+
+    def test_compute_blurhash_png(self):
+        with open("tests/logo.png", "rb") as file:
+            result = compute_blurhash(file)
+        self.assertEqual(len(result), 28)
+
+    def test_compute_blurhash_truncated(self):
+        b = io.BytesIO()
+        Image.effect_noise((640, 480), 64).convert("RGB").save(b, "jpeg")
+        with open("tests/logo.png", "rb") as file:
+            png = file.read()
+        for data in (b.getvalue()[:len(b.getvalue()) // 2], png[:len(png) // 2]):
+            with self.assertRaises(HTTPException) as error:
+                compute_blurhash(io.BytesIO(data))
+            self.assertEqual(error.exception.status_code, 415)
@@ -3,7 +3,7 @@ from unittest.mock import MagicMock
 from sqlalchemy.orm import Session
 import cloudinary
 from fastapi import HTTPException, status
-from src.utils.image_utils import transform_image
+from src.utils.image_utils import transform_image, preview_transform_image, preview_cache
 from src.database.models import User, Post
 
 
@@ -63,6 +63,7 @@ class TestImageUtils(unittest.IsolatedAsyncioTestCase):
         )
         description = "description"
         self.session.query().filter().first.return_value = image
+        self.session.query().filter().scalar.return_value = 0
         self.service.CloudinaryImage().build_url.return_value = responce_url
         result = await transform_image(
             image_id=image.id,
@@ -75,3 +76,28 @@ class TestImageUtils(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.description, description)
         self.assertEqual(result.author, user.id)
         self.assertEqual(result.image_url, responce_url)
+
+    async def test_preview_transform_image_is_cached(self):
+        test_url = "https://res.cloudinary.com/abcdefghi/image/upload/v1234567890/project_name/a96e4ceb-54de-4e37-9520-0d0d3a3a31a6"
+        responce_url = "https://res.cloudinary.com/abcdefghi/image/upload/e_sepia/project_name/a96e4ceb-54de-4e37-9520-0d0d3a3a31a6"
+        preview_cache.clear()
+        user = User(id=7)
+        image = Post(id=3, author_id=user.id, image_url=test_url)
+        self.session.query().filter().first.return_value = image
+        self.service.CloudinaryImage().build_url.return_value = responce_url
+        self.session.reset_mock()
+
+        for _ in range(3):
+            result = await preview_transform_image(
+                image_id=image.id,
+                transform_params={"effect": "sepia"},
+                db=self.session,
+                current_user=user,
+                service=self.service
+            )
+            self.assertEqual(result, {"image_id": image.id, "image_url": responce_url})
+
+        self.assertEqual(self.session.query.call_count, 1)
+        self.session.add.assert_not_called()
+        self.assertEqual(preview_cache.get_previewed_params(user.id, image.id, responce_url), {"effect": "sepia"})
+        self.assertIsNone(preview_cache.get_previewed_params(8, image.id, responce_url))
@@ -0,0 +1,51 @@
+import unittest
+from unittest.mock import MagicMock
+import cloudinary
+import cloudinary.utils
+from src.utils.image_variants import (
+    DELIVERY_PARAMS,
+    get_eager_transformations,
+    build_variant_urls
+)
+
+
+class TestImageVariants(unittest.TestCase):
+    def setUp(self):
+        self.service = MagicMock(spec=cloudinary)
+        self.presets = {
+            "thumb": {"width": 100, "height": 100, "crop": "fill"},
+            "large": {"width": 1000, "crop": "limit"},
+        }
+
+    def test_get_eager_transformations(self):
+        result = get_eager_transformations(self.presets)
+        self.assertEqual(result, [
+            {"transformation": [preset, DELIVERY_PARAMS]} for preset in self.presets.values()
+        ])
+
+    def test_eager_transformations_match_variant_urls(self):
+        cloud_name = cloudinary.config().cloud_name
+        cloudinary.config(cloud_name="demo")
+        try:
+            urls = build_variant_urls("project_web/image", presets=self.presets)
+        finally:
+            cloudinary.config(cloud_name=cloud_name)
+        eager = cloudinary.utils.build_eager(get_eager_transformations(self.presets)).split("|")
+        for transformation, url in zip(eager, urls.values()):
+            transformation_part = url.split("/image/upload/")[1].rsplit("/v1/", 1)[0]
+            self.assertEqual(transformation, transformation_part)
+
+    def test_build_variant_urls(self):
+        self.service.CloudinaryImage().build_url.return_value = "variant_url"
+        result = build_variant_urls("project_web/image", presets=self.presets, service=self.service)
+        self.assertEqual(result, {"thumb": "variant_url", "large": "variant_url"})
+        self.service.CloudinaryImage().build_url.assert_called_with(
+            transformation=[self.presets["large"], DELIVERY_PARAMS]
+        )
+
+    def test_build_variant_urls_chains_base_transformation(self):
+        base = {"effect": "sepia"}
+        build_variant_urls("project_web/image", base, presets=self.presets, service=self.service)
+        self.service.CloudinaryImage().build_url.assert_called_with(
+            transformation=[base, self.presets["large"], DELIVERY_PARAMS]
+        )
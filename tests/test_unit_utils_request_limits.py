@@ -0,0 +1,50 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.utils.request_limits import BodySizeLimitMiddleware
+
+
+app = FastAPI()
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=10)
+
+
+@app.post("/echo")
+async def echo(request: Request):
+    return {"size": len(await request.body())}
+
+
+client = TestClient(app)
+
+
+def test_small_body():
+    response = client.post("/echo", content=b"0123456789")
+    assert response.status_code == 200
+    assert response.json() == {"size": 10}
+
+
+def test_content_length_too_large():
+    response = client.post("/echo", content=b"0123456789A")
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Request body is too large"
+
+
+def test_streamed_body_too_large():
+    def body():
+        for _ in range(5):
+            yield b"0123"
+
+    response = client.post("/echo", content=body())
+    assert response.status_code == 413
+
+
+def test_path_limit():
+    limited = FastAPI()
+    limited.add_middleware(BodySizeLimitMiddleware, max_body_size=10, path_limits={"/bulk": 20})
+
+    @limited.post("/bulk")
+    async def bulk(request: Request):
+        return {"size": len(await request.body())}
+
+    response = TestClient(limited).post("/bulk", content=b"0" * 20)
+    assert response.status_code == 200
+    assert response.json() == {"size": 20}